@@ -72,6 +72,9 @@ setup(
             "scrapy>=2.6.0",
             "dnspython>=2.2.0",
             "cryptography>=3.4.0",
+        ],
+        "performance": [
+            "hyperscan>=0.4.0",
         ]
     },
     entry_points={
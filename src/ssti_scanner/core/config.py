@@ -18,6 +18,12 @@ import yaml
 from pydantic import BaseModel, Field, validator
 
 
+# Default number of response characters the engines scan for indicators.
+# Template output normally lands near the injection point, so this bounds
+# the cost on large pages; indicators past the limit are missed.
+DEFAULT_MAX_SCAN_BYTES = 32768
+
+
 class CrawlingConfig(BaseModel):
     """Configuration for web crawling behavior."""
     
@@ -49,6 +55,10 @@ class ScanningConfig(BaseModel):
         ]
     )
     max_payload_length: int = Field(default=1000, ge=10, le=10000)
+    max_scan_bytes: int = Field(
+        default=DEFAULT_MAX_SCAN_BYTES, ge=1024,
+        description="Only the first N characters of each response are scanned for indicators"
+    )
     blind_detection: bool = Field(default=True, description="Enable blind SSTI detection")
     time_based_detection: bool = Field(default=True, description="Enable time-based detection")
     out_of_band_detection: bool = Field(default=False, description="Enable OOB detection")
@@ -11,7 +11,7 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 import asyncio
 
 from ..engines.engine_factory import EngineFactory
-from ..engines.base_template_engine import BaseTemplateEngine, TemplateEngine
+from ..engines.base import BaseTemplateEngine, TemplateEngine
 
 
 class EngineManager:
@@ -12,7 +12,7 @@ import asyncio
 import aiohttp
 
 from ..engines.engine_factory import EngineFactory
-from ..engines.base_template_engine import BaseTemplateEngine, TemplateEngine
+from ..engines.base import BaseTemplateEngine, TemplateEngine
 
 
 class DetectionEngine:
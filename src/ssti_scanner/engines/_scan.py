@@ -0,0 +1,180 @@
+"""
+Scan tables shared by the template engine detectors.
+
+Indicator patterns are turned into scan tables once, at import.  Each
+entry is (id, literals, regex, pattern): the pattern matches if one of the
+literals is in the response and the regex, if any, matches too.  With
+Hyperscan installed, the entries of several tables can also be matched in
+one scan of the response.
+"""
+
+import itertools
+import re
+from typing import Any, List, Optional, Sequence, Set, Tuple
+
+try:
+    import hyperscan  # optional: pip install hyperscan
+except ImportError:
+    hyperscan = None
+
+
+# An escaped punctuation character stands for itself; anything else regex-like
+# (classes such as \d, quantifiers, groups) needs the regex engine
+_ESCAPED_PUNCTUATION = re.compile(r'\\(\W)')
+_REGEX_METACHARACTERS = frozenset('.^$*+?{}[]|()\\')
+
+# An escape sequence or an upper-case letter, for lower-casing patterns
+_ESCAPE_OR_UPPER = re.compile(r'\\.|[A-Z]')
+
+# The plain text a pattern starts with, one character or escape at a time
+_LITERAL_PREFIX = re.compile(r'(?:[^.^$*+?{}\[\]|()\\]|\\\W)*')
+_QUANTIFIERS = frozenset('*+?{')
+
+
+def _is_plain(pattern: str) -> bool:
+    return _REGEX_METACHARACTERS.isdisjoint(_ESCAPED_PUNCTUATION.sub('', pattern))
+
+
+def _fold_case(pattern: str) -> str:
+    """Lower-case a pattern's letters, leaving escapes such as \\D alone."""
+    return _ESCAPE_OR_UPPER.sub(lambda match: match.group(0) if len(match.group(0)) == 2 else match.group(0).lower(),
+                                pattern)
+
+
+def _literal_prefix(pattern: str) -> str:
+    """Text every match of the pattern starts with (may be empty)."""
+    prefix = _LITERAL_PREFIX.match(pattern).group(0)
+    if pattern[len(prefix):len(prefix) + 1] in _QUANTIFIERS and prefix:
+        # The last character is quantified, so it need not appear
+        prefix = prefix[:-2] if prefix[-2:-1] == '\\' else prefix[:-1]
+    return _ESCAPED_PUNCTUATION.sub(r'\1', prefix)
+
+
+class _LineSpan:
+    """
+    Linear-time stand-in for a compiled ``head.*?tail`` regex.
+    
+    The regex retries the wildcard from every occurrence of head, so a long
+    line full of heads and no tail costs quadratic time.  Only the first
+    head on a line matters (any tail after a later head also follows the
+    first), so each line is searched once.  Like ``.``, the gap never
+    crosses a newline.
+    """
+    __slots__ = ('head', 'tail')
+    
+    def __init__(self, head: str, tail: str):
+        self.head = head
+        self.tail = tail
+    
+    def search(self, text: str) -> bool:
+        start = text.find(self.head)
+        while start != -1:
+            start += len(self.head)
+            line_end = text.find('\n', start)
+            if line_end == -1:
+                return text.find(self.tail, start) != -1
+            if text.find(self.tail, start, line_end) != -1:
+                return True
+            start = text.find(self.head, line_end + 1)
+        return False
+
+
+# Scan table entry ids, unique across all tables of all engines
+_ENTRY_IDS = itertools.count()
+
+
+def _scan_table(patterns: Sequence[str], flags: int = re.IGNORECASE
+                ) -> Tuple[Tuple[int, Optional[Tuple[str, ...]], Any, str], ...]:
+    """
+    Turn patterns into substring checks where possible.
+    
+    Plain text and alternations of plain text need no regex; other patterns
+    use their leading text as literal, if they have any, so the regex only
+    runs on responses that can match.  ``head.*?tail`` patterns with plain
+    text on both sides are matched by a _LineSpan instead.  Case-insensitive
+    tables are matched against the lower-cased response, with lower-cased
+    literals and regexes compiled without IGNORECASE, so re never has to
+    fold case itself.
+    """
+    caseless = bool(flags & re.IGNORECASE)
+    fold = str.lower if caseless else str
+    table = []
+    for pattern in patterns:
+        alternatives = pattern.split('|')
+        if all(_is_plain(alternative) for alternative in alternatives):
+            literals = tuple(fold(_ESCAPED_PUNCTUATION.sub(r'\1', alternative)) for alternative in alternatives)
+            table.append((next(_ENTRY_IDS), literals, None, pattern))
+            continue
+        prefix = fold(_literal_prefix(pattern)) if len(alternatives) == 1 else ''
+        head, wildcard, tail = pattern.partition('.*?')
+        if wildcard and head and tail and _is_plain(head) and _is_plain(tail):
+            regex = _LineSpan(fold(_ESCAPED_PUNCTUATION.sub(r'\1', head)),
+                              fold(_ESCAPED_PUNCTUATION.sub(r'\1', tail)))
+        elif caseless:
+            regex = re.compile(_fold_case(pattern), flags & ~re.IGNORECASE)
+        else:
+            regex = re.compile(pattern, flags)
+        table.append((next(_ENTRY_IDS), (prefix,) if prefix else None, regex, pattern))
+    return tuple(table)
+
+
+def _text_table(texts: Sequence[str], caseless: bool = False) -> Tuple[Tuple[int, Tuple[str], None, str], ...]:
+    """Scan table for plain text (dots, brackets and backslashes included)."""
+    fold = str.lower if caseless else str
+    return tuple((next(_ENTRY_IDS), (fold(text),), None, text) for text in texts)
+
+
+def _matching(table: tuple, haystack: str, hits: Optional[Set[int]] = None) -> List[str]:
+    """
+    Patterns of the scan table entries found in the response, in table order.
+    
+    ``haystack`` is the lower-cased response for case-insensitive tables and
+    the response itself for case-sensitive ones.  ``hits`` holds the ids
+    Hyperscan matched, when it ran.
+    """
+    if hits is not None:
+        return [pattern for entry_id, _, _, pattern in table if entry_id in hits]
+    matched = []
+    for _, literals, regex, pattern in table:
+        if literals is not None:
+            for literal in literals:
+                if literal in haystack:
+                    break
+            else:
+                continue
+        if regex is None or regex.search(haystack):
+            matched.append(pattern)
+    return matched
+
+
+def _build_hyperscan_database(tables: Sequence[Tuple[tuple, bool, bool]]) -> Any:
+    """
+    Compile the entries of (table, caseless, text) triples into one
+    Hyperscan database scanning UTF-8 encoded responses.
+    
+    Entries of text tables are plain text and are escaped first.  Tables
+    relying on ``\\b`` must stay with re: Hyperscan has no Unicode ``\\b``.
+    """
+    # UCP gives \d and \s the same Unicode meaning they have in re
+    mode = hyperscan.HS_FLAG_SINGLEMATCH | hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP
+    expressions, ids, flags = [], [], []
+    for table, caseless, text in tables:
+        for entry_id, _, _, pattern in table:
+            expressions.append((re.escape(pattern) if text else pattern).encode())
+            ids.append(entry_id)
+            flags.append(mode | (hyperscan.HS_FLAG_CASELESS if caseless else 0))
+    
+    database = hyperscan.Database()
+    database.compile(expressions=expressions, ids=ids, elements=len(expressions), flags=flags)
+    return database
+
+
+def _hyperscan_hits(database: Any, response: str) -> Set[int]:
+    """Ids of every scan table entry Hyperscan finds in the response."""
+    hits: Set[int] = set()
+    
+    def on_match(entry_id, start, end, flags, context):
+        hits.add(entry_id)
+    
+    database.scan(response.encode('utf-8', 'replace'), match_event_handler=on_match)
+    return hits
@@ -7,12 +7,14 @@ for all template engine detection plugins.
 
 from __future__ import annotations
 
+import asyncio
 import re
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from enum import Enum
-from typing import Dict, List, Optional, Set, Pattern, Any
+from typing import Dict, Iterable, List, Optional, Set, Pattern, Any, Sequence, Tuple
 
+from ssti_scanner.core.config import DEFAULT_MAX_SCAN_BYTES
 from ssti_scanner.utils.http_client import HTTPResponse
 
 
@@ -50,6 +52,171 @@ class DetectionResult:
             self.metadata = {}
 
 
+@dataclass
+class Payload:
+    """A template injection payload and the context it targets."""
+    __slots__ = ('payload', 'type', 'context', 'description')
+    
+    payload: str
+    type: str
+    context: str
+    description: str
+
+
+@dataclass
+class EngineResult:
+    """Result of testing a single payload against a target."""
+    __slots__ = ('is_vulnerable', 'confidence', 'payload', 'response', 'evidence', 'engine')
+    
+    is_vulnerable: bool
+    confidence: ConfidenceLevel
+    payload: str
+    response: str
+    evidence: str
+    engine: str
+
+
+# Confidence is tracked as an integer rank while scanning and converted
+# back to a ConfidenceLevel once per result
+_RANK_LOW, _RANK_MEDIUM, _RANK_HIGH = range(3)
+_CONFIDENCE_BY_RANK = (ConfidenceLevel.LOW, ConfidenceLevel.MEDIUM, ConfidenceLevel.HIGH)
+
+# Number of evidence entries after which a HIGH verdict stops the scan.
+# Engines yield their indicators strongest-first, so the groups left
+# unscanned could not raise the verdict.
+_SUFFICIENT_EVIDENCE = 3
+
+# Default number of requests test_payloads keeps in flight
+_CONCURRENCY = 16
+
+# Single-pass translation tables used by encode_payload
+_HTML_ESCAPE_TABLE = str.maketrans({'<': '&lt;', '>': '&gt;', '"': '&quot;'})
+_ATTRIBUTE_ESCAPE_TABLE = str.maketrans({'"': '&quot;', "'": '&#x27;'})
+_JAVASCRIPT_ESCAPE_TABLE = str.maketrans({'\\': '\\\\', '"': '\\"', "'": "\\'"})
+
+
+def _index_payloads(payloads: Sequence[Payload], attribute: str) -> Dict[str, Tuple[Payload, ...]]:
+    """Group payloads by one of their attributes, keeping their order."""
+    index: Dict[str, List[Payload]] = {}
+    for payload in payloads:
+        index.setdefault(getattr(payload, attribute), []).append(payload)
+    return {key: tuple(group) for key, group in index.items()}
+
+
+def _build_get_url(url: str, payload: str) -> str:
+    """
+    Build the GET URL for one payload.
+    
+    The payload replaces an INJECT marker, else the value of the first
+    parameter (up to the next ``&``), else it is added as a ``test``
+    parameter.  The URL is sliced rather than substituted, so backslashes
+    in the payload are never read as regex backreferences.  Classifying
+    the URL takes a few ``str.find`` calls, so it is not cached per URL.
+    """
+    if '?' not in url:
+        return f"{url}?test={payload}"
+    if 'INJECT' in url:
+        return url.replace('INJECT', payload)
+    if '=' in url:
+        value_start = url.find('=') + 1
+        value_end = url.find('&', value_start)
+        return url[:value_start] + payload + (url[value_end:] if value_end != -1 else '')
+    return f"{url}&test={payload}"
+
+
+def _inject_fields(data: Dict[str, Any]) -> Tuple[str, ...]:
+    """Return the names of the form fields whose value holds an INJECT marker."""
+    return tuple(key for key, value in data.items() if isinstance(value, str) and 'INJECT' in value)
+
+
+def _build_post_data(data: Dict[str, Any], payload: str, inject_fields: Sequence[str]) -> Dict[str, Any]:
+    """
+    Build the POST body for one payload.
+    
+    Only the marked fields are rewritten; without markers the payload
+    replaces the first field, or a ``test`` field is created.
+    """
+    if not data:
+        return {'test': payload}
+    if inject_fields:
+        test_data = dict(data)
+        for key in inject_fields:
+            test_data[key] = data[key].replace('INJECT', payload)
+        return test_data
+    return {**data, next(iter(data)): payload}
+
+
+class BaseTemplateEngine:
+    """
+    Base class for payload-driven template engine detectors.
+    
+    Subclasses provide their payloads, send them with ``test_payload`` and
+    judge each response with ``analyze_response``.
+    """
+    
+    def __init__(self, config=None):
+        self.config = config
+        self.name = "base"
+        self.description = ""
+        self.payloads: Sequence[Payload] = ()
+        # Response characters analyze_response scans; see DEFAULT_MAX_SCAN_BYTES
+        scanning = getattr(config, 'scanning', None)
+        self.max_scan_bytes: int = getattr(scanning, 'max_scan_bytes', DEFAULT_MAX_SCAN_BYTES)
+    
+    async def test_payload(self, url: str, payload: str, **kwargs) -> EngineResult:
+        """Send a single payload to the target and analyze the response."""
+        raise NotImplementedError
+    
+    def analyze_response(self, original_response: str, payload: str, response: str) -> EngineResult:
+        """Judge a response for signs that the payload was evaluated."""
+        raise NotImplementedError
+    
+    async def test_payloads(self, url: str, payloads: Sequence[Payload],
+                            concurrency: int = _CONCURRENCY, **kwargs) -> List[EngineResult]:
+        """
+        Test several payloads against the target URL concurrently.
+        
+        At most ``concurrency`` requests are in flight at once.  The HTTP
+        client should be one shared, pooled session so connections are
+        reused across requests; its own request limit still applies.
+        
+        Args:
+            url: Target URL
+            payloads: Payloads to test
+            concurrency: Maximum number of payloads tested at the same time
+            **kwargs: Same arguments as test_payload, passed to every call
+        
+        Returns:
+            One EngineResult per payload, in input order
+        """
+        if kwargs.get('inject_fields') is None:
+            kwargs['inject_fields'] = _inject_fields(kwargs.get('data', {}))
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def test_one(payload: Payload) -> EngineResult:
+            async with semaphore:
+                return await self.test_payload(url, payload.payload, **kwargs)
+        
+        return list(await asyncio.gather(*(test_one(payload) for payload in payloads)))
+    
+    def analyze_responses(self, items: Iterable[Tuple[str, str]], original_response: str = "",
+                          **kwargs) -> List[EngineResult]:
+        """
+        Analyze many responses in one call.
+        
+        Args:
+            items: (payload, response) pairs, e.g. the replies collected
+                for a set of payloads
+            original_response: Original response (baseline)
+            **kwargs: Same arguments as analyze_response, passed to every call
+        
+        Returns:
+            One EngineResult per pair, in input order
+        """
+        analyze = self.analyze_response
+        return [analyze(original_response, payload, response, **kwargs) for payload, response in items]
+
+
 class TemplateEngine(ABC):
     """
     Abstract base class for template engine detection.
@@ -58,6 +225,15 @@ class TemplateEngine(ABC):
     the required methods for detection and exploitation.
     """
     
+    # Success probability adjustment per injection context
+    _context_adjustments: Dict[str, float] = {
+        'html': 0.1,
+        'attr': -0.1,
+        'js': -0.2,
+        'css': -0.3,
+        'url': 0.0
+    }
+    
     def __init__(self, name: str):
         self.name = name
         self.signatures: List[Pattern] = []
@@ -94,16 +270,17 @@ class TemplateEngine(ABC):
             DetectionResult if engine detected, None otherwise
         """
         # Check for error patterns first (high confidence)
-        for pattern in self.error_patterns:
-            if pattern.search(response.text):
-                return DetectionResult(
-                    engine_name=self.name,
-                    confidence=ConfidenceLevel.HIGH,
-                    vulnerability_type=VulnerabilityType.INFORMATION_DISCLOSURE,
-                    payload="error_based_detection",
-                    evidence=pattern.pattern,
-                    description=f"{self.name} template engine detected via error message"
-                )
+        error = self._find_error_pattern(response.text)
+        if error:
+            pattern, _ = error
+            return DetectionResult(
+                engine_name=self.name,
+                confidence=ConfidenceLevel.HIGH,
+                vulnerability_type=VulnerabilityType.INFORMATION_DISCLOSURE,
+                payload="error_based_detection",
+                evidence=pattern.pattern,
+                description=f"{self.name} template engine detected via error message"
+            )
         
         # Check for signature patterns (medium confidence)
         for pattern in self.signatures:
@@ -201,19 +378,36 @@ class TemplateEngine(ABC):
     
     def _check_template_errors(self, payload: str, response: HTTPResponse) -> Optional[DetectionResult]:
         """Check for template engine error messages."""
+        error = self._find_error_pattern(response.text)
+        if error:
+            _, matched = error
+            return DetectionResult(
+                engine_name=self.name,
+                confidence=ConfidenceLevel.HIGH,
+                vulnerability_type=VulnerabilityType.INFORMATION_DISCLOSURE,
+                payload=payload,
+                evidence=matched,
+                description=f"Template error indicates {self.name} vulnerability",
+                impact="Information disclosure and potential code execution",
+                remediation="Implement proper error handling and input validation"
+            )
+        
+        return None
+    
+    def _find_error_pattern(self, text: str) -> Optional[Tuple[Pattern, str]]:
+        """
+        Find the first error pattern, in list order, that matches the text.
+        
+        Engines with many error patterns may override this with a single
+        combined scan, as long as the same pattern and matched text result.
+        
+        Returns:
+            (pattern, matched text) tuple, or None if no pattern matches
+        """
         for pattern in self.error_patterns:
-            match = pattern.search(response.text)
+            match = pattern.search(text)
             if match:
-                return DetectionResult(
-                    engine_name=self.name,
-                    confidence=ConfidenceLevel.HIGH,
-                    vulnerability_type=VulnerabilityType.INFORMATION_DISCLOSURE,
-                    payload=payload,
-                    evidence=match.group(0),
-                    description=f"Template error indicates {self.name} vulnerability",
-                    impact="Information disclosure and potential code execution",
-                    remediation="Implement proper error handling and input validation"
-                )
+                return pattern, match.group(0)
         
         return None
     
@@ -258,15 +452,7 @@ class TemplateEngine(ABC):
             probability -= 0.3  # Complex payloads less likely
         
         # Adjust based on context
-        context_adjustments = {
-            'html': 0.1,
-            'attr': -0.1,
-            'js': -0.2,
-            'css': -0.3,
-            'url': 0.0
-        }
-        
-        probability += context_adjustments.get(context, 0.0)
+        probability += self._context_adjustments.get(context, 0.0)
         
         # Ensure probability is within bounds
         return max(0.0, min(1.0, probability))
